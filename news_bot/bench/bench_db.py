@@ -0,0 +1,79 @@
+"""Микро-бенчмарк БД: колбэков в секунду (ensure_user + update_*) — новое соединение на вызов против общего
+
+Запуск: python bench/bench_db.py [--calls 2000] [--concurrency 20]
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import aiosqlite
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import database  # noqa: E402
+
+
+async def legacy_callback(user_id: int):
+    """Старое поведение: ensure_user + update_enabled_topics, каждый шаг со своим aiosqlite.connect"""
+    async def get_user():
+        async with aiosqlite.connect(database.DB_PATH) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute("SELECT * FROM users WHERE user_id = ?", (user_id,)) as cursor:
+                row = await cursor.fetchone()
+                return dict(row) if row else None
+
+    user = await get_user()
+    if not user:
+        async with aiosqlite.connect(database.DB_PATH) as db:
+            await db.execute("INSERT OR IGNORE INTO users (user_id) VALUES (?)", (user_id,))
+            await db.commit()
+        user = await get_user()
+    async with aiosqlite.connect(database.DB_PATH) as db:
+        await db.execute(
+            "UPDATE users SET enabled_topics = ? WHERE user_id = ?",
+            (json.dumps(["ai", "it"]), user_id),
+        )
+        await db.commit()
+
+
+async def shared_callback(user_id: int):
+    await database.ensure_user(user_id)
+    await database.update_enabled_topics(user_id, ["ai", "it"])
+
+
+async def run(name: str, callback, calls: int, concurrency: int, users: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            await callback(i % users)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(calls)])
+    elapsed = time.perf_counter() - start
+    print(f"{name:8}: {calls / elapsed:8.1f} колбэков/с ({elapsed:.2f} с на {calls})")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--users", type=int, default=200)
+    args = parser.parse_args()
+
+    database.DB_PATH = Path(tempfile.mkdtemp()) / "bench.db"
+    await database.init_db()
+    try:
+        await run("legacy", legacy_callback, args.calls, args.concurrency, args.users)
+        await run("shared", shared_callback, args.calls, args.concurrency, args.users)
+    finally:
+        await database.close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
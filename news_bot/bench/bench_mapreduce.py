@@ -0,0 +1,73 @@
+"""Бенчмарк: один вызов LLM на все статьи против map-reduce (секции по темам + сводка)
+
+Запуск: python bench/bench_mapreduce.py [--topics 40] [--per-topic 5]
+LLM — локальный фейковый сервер (bench/fake_openai.py), сеть не нужна.
+Режим «только важное», потому что обычный дайджест и так собирается из секций.
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from openai import AsyncOpenAI  # noqa: E402
+
+import news_engine  # noqa: E402
+from bench.fake_openai import FakeOpenAI  # noqa: E402
+
+SENTENCE = "Правительство объявило о новых мерах поддержки экономики, эксперты оценивают последствия. "
+
+
+def make_articles(topics: int, per_topic: int) -> list[dict]:
+    return [
+        {
+            "topic": f"Тема {t}",
+            "title": f"Новость {i} по теме {t}",
+            "source": f"site{i}.example",
+            "url": f"https://site{i}.example/{t}/{i}",
+            "text": (SENTENCE * 40)[:3000],
+        }
+        for t in range(topics)
+        for i in range(per_topic)
+    ]
+
+
+async def run(articles: list[dict], map_reduce: bool, reading_time: int, warm: bool = False) -> dict:
+    fake = FakeOpenAI(output_tokens_per_second=60)
+    runner, base_url = await fake.start()
+    news_engine.client = AsyncOpenAI(api_key="fake", base_url=base_url)
+    if not warm:
+        news_engine.section_cache.clear()
+    news_engine.MAPREDUCE_MIN_ARTICLES = 1 if map_reduce else 10 ** 9
+    news_engine.MAPREDUCE_MIN_TOKENS = 10 ** 9
+    try:
+        start = time.perf_counter()
+        digest = await news_engine.generate_digest(
+            articles, "medium", reading_time, "ru", important_only=True, importance_level="medium"
+        )
+        elapsed = time.perf_counter() - start
+    finally:
+        await runner.cleanup()
+    return {"seconds": round(elapsed, 2), "items": digest.count("▸"), **fake.stats()}
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--topics", type=int, default=40)
+    parser.add_argument("--per-topic", type=int, default=5)
+    parser.add_argument("--reading-time", type=int, default=7)
+    args = parser.parse_args()
+
+    articles = make_articles(args.topics, args.per_topic)
+    print(f"{len(articles)} статей, {args.topics} тем, чтение {args.reading_time} мин")
+    print(f"один вызов: {await run(articles, False, args.reading_time)}")
+    print(f"map-reduce: {await run(articles, True, args.reading_time)}")
+    # Секции общие для всех пользователей с теми же статьями — у следующего они уже в кэше
+    print(f"map-reduce, секции из кэша: {await run(articles, True, args.reading_time, warm=True)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+"""Бенчмарк: задержка event loop (≈ отклик хэндлеров) при параллельном парсинге статей
+
+Запуск: python bench/bench_parse.py [--articles 200] [--workers 4]
+Сравнивает парсинг прямо в loop (workers=0) и в пуле процессов.
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from extractor import ExtractorPool  # noqa: E402
+
+
+def make_html(i: int, paragraphs: int = 400) -> str:
+    body = "".join(
+        f"<p>Абзац {j} статьи {i}: правительство объявило о новых мерах поддержки, "
+        f"эксперты оценивают последствия для рынка и отрасли в целом.</p>"
+        for j in range(paragraphs)
+    )
+    return (
+        '<html lang="ru"><head><meta http-equiv="Content-Language" content="ru">'
+        f"<title>Статья {i}</title></head><body>"
+        f"<nav>меню</nav><article><h1>Статья {i}</h1>{body}</article>"
+        f"<footer>подвал</footer></body></html>"
+    )
+
+
+async def measure_lag(stop: asyncio.Event, interval: float = 0.01) -> list[float]:
+    """Насколько позже запланированного просыпается корутина — это задержка ответа на кнопку"""
+    lags = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append((time.perf_counter() - start - interval) * 1000)
+    return lags
+
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def run(workers: int, method: str, pages: list[str]) -> None:
+    pool = ExtractorPool(workers=workers, max_pending=len(pages), cpu_timeout=10, method=method)
+    if workers:
+        # Прогреваем процессы, чтобы не мерить их запуск
+        await asyncio.gather(*[pool.extract("https://warmup.local/", pages[0]) for _ in range(workers)])
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_lag(stop))
+    start = time.perf_counter()
+    results = await asyncio.gather(*[
+        pool.extract(f"https://example.com/{i}", html) for i, html in enumerate(pages)
+    ], return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    lags = await lag_task
+    pool.shutdown()
+
+    ok = sum(1 for r in results if isinstance(r, dict))
+    print(
+        f"{method:9} workers={workers}: {len(pages) / elapsed:7.1f} статей/с, ok={ok}, "
+        f"lag p50={statistics.median(lags):.1f}мс p99={percentile(lags, 99):.1f}мс max={max(lags):.1f}мс"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--articles", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    pages = [make_html(i) for i in range(args.articles)]
+    for method in ("newspaper", "lxml"):
+        await run(0, method, pages)
+        await run(args.workers, method, pages)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,228 @@
+"""Бенчмарк всего пайплайна дайджеста без сети: поиск → загрузка → парсинг → промпт → LLM
+
+Запуск: python bench/bench_pipeline.py [--scenarios 1:5,50:3-8,500:1-10] [--save out.json]
+        python bench/bench_pipeline.py --compare out.json  # код выхода 1 при регрессии
+
+Поиск — FakeSearchBackend, статьи — локальный сервер фикстур (bench/fixtures.py),
+LLM — bench/fake_openai.py. Сценарий «50:3-8» — 50 пользователей одновременно
+запрашивают дайджест по 3–8 темам, через ту же очередь DigestQueue, что и бот.
+Задержка — от постановки в очередь до готового дайджеста, как её видит пользователь.
+Каждый сценарий стартует с пустыми кэшами и своей БД.
+
+Все страницы отдаёт один хост, поэтому лимиты на домен и на соединения к хосту сняты.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+os.environ.setdefault("SEARCH_BACKEND", "fake")
+os.environ.setdefault("ARTICLE_CACHE_DISK", "0")
+
+from openai import AsyncOpenAI  # noqa: E402
+
+import database  # noqa: E402
+import fetcher  # noqa: E402
+import news_engine  # noqa: E402
+from bench.fake_openai import FakeOpenAI  # noqa: E402
+from bench.fixtures import FixtureServer  # noqa: E402
+from config import PRESET_TOPICS, READING_TIMES, DIGEST_WORKERS  # noqa: E402
+from domains import DomainGuard  # noqa: E402
+from fetcher import percentile  # noqa: E402
+from jobs import DigestQueue  # noqa: E402
+from metrics import metrics  # noqa: E402
+from search import FakeSearchBackend  # noqa: E402
+
+STAGES = ("search", "fetch", "parse", "dedup", "collect", "prompt", "llm")
+CUSTOM_TOPICS = ["робототехника", "электромобили", "квантовые компьютеры", "биотех", "дроны"]
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def parse_scenario(spec: str) -> tuple[int, int, int]:
+    """«50:3-8» → (50 пользователей, от 3 до 8 тем)"""
+    users, topics = spec.split(":")
+    low, _, high = topics.partition("-")
+    return int(users), int(low), int(high or low)
+
+
+def rss_bytes() -> int:
+    """Текущий RSS процесса и воркеров парсинга; без /proc — пик самого процесса"""
+    executor = news_engine.extractor_pool._executor
+    pids = [os.getpid(), *(executor._processes if executor else ())]
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                total += int(f.read().split()[1]) * PAGE_SIZE
+        except (OSError, ValueError):
+            if pid == os.getpid():
+                return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return total
+
+
+async def sample_rss(stop: asyncio.Event, interval: float = 0.05) -> int:
+    peak = rss_bytes()
+    while not stop.is_set():
+        await asyncio.sleep(interval)
+        peak = max(peak, rss_bytes())
+    return peak
+
+
+def stage_totals() -> dict[str, tuple[int, float]]:
+    totals = {}
+    for stage in STAGES:
+        histogram = metrics.histogram("news_stage_seconds", stage=stage)
+        totals[stage] = (histogram.count, histogram.sum) if histogram else (0, 0.0)
+    return totals
+
+
+async def reset_state(db_dir: Path, name: str):
+    """Пустые кэши и своя БД на сценарий — сценарии не подогревают друг друга"""
+    await database.close_db()
+    database.DB_PATH = db_dir / f"{name}.db"
+    await database.init_db()
+    for cache in (
+        news_engine.search_cache, news_engine.article_cache.memory, news_engine.section_cache,
+        news_engine.validator_cache, news_engine.topic_fetch_times,
+    ):
+        cache.clear()
+    news_engine.domain_guard = DomainGuard(rate=10 ** 9, burst=10 ** 9)
+
+
+async def run_scenario(spec: str, workers: int, seed: int, db_dir: Path) -> dict:
+    users, low, high = parse_scenario(spec)
+    await reset_state(db_dir, spec.replace(":", "_"))
+    rng = random.Random(seed)
+    topic_ids = list(PRESET_TOPICS)
+
+    queue = DigestQueue(workers=workers, max_pending=users)
+    queue.start()
+    latencies: list[float] = []
+    loop = asyncio.get_running_loop()
+    finished = [loop.create_future() for _ in range(users)]
+
+    def make_job(user: int, args: dict, submitted: float):
+        async def run():
+            try:
+                await news_engine.get_news_digest(**args)
+                latencies.append(time.perf_counter() - submitted)
+            finally:
+                finished[user].set_result(None)
+        return run
+
+    stop = asyncio.Event()
+    rss_task = asyncio.create_task(sample_rss(stop))
+    stages_before = stage_totals()
+    start = time.perf_counter()
+    for user in range(users):
+        args = {
+            "enabled_topics": rng.sample(topic_ids, min(len(topic_ids), rng.randint(low, high))),
+            "custom_topics": [rng.choice(CUSTOM_TOPICS)] if rng.random() < 0.3 else [],
+            "reading_time": rng.choice(READING_TIMES),
+        }
+        await queue.submit(user, make_job(user, args, time.perf_counter()))
+    await asyncio.gather(*finished)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    peak_rss = await rss_task
+    await queue.stop()
+
+    stages_after = stage_totals()
+    return {
+        "scenario": spec,
+        "digests": len(latencies),
+        "failed": queue.failed,
+        "seconds": round(elapsed, 2),
+        "throughput": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000),
+        "peak_rss_mb": round(peak_rss / 2 ** 20, 1),
+        # Сумма по спанам: параллельные стадии дают больше, чем общее время
+        "stages_ms": {
+            stage: round((stages_after[stage][1] - stages_before[stage][1]) * 1000)
+            for stage in STAGES
+            if stages_after[stage][0] > stages_before[stage][0]
+        },
+    }
+
+
+def compare(results: list[dict], baseline: list[dict], tolerance: float) -> list[str]:
+    """Регрессии относительно сохранённого прогона: хуже на tolerance и больше"""
+    problems = []
+    previous = {row["scenario"]: row for row in baseline}
+    for row in results:
+        base = previous.get(row["scenario"])
+        if base is None:
+            continue
+        for key in ("p50_ms", "p95_ms", "p99_ms", "peak_rss_mb"):
+            if base[key] and row[key] > base[key] * (1 + tolerance):
+                problems.append(f"{row['scenario']}: {key} {base[key]} → {row[key]}")
+        if row["throughput"] < base["throughput"] * (1 - tolerance):
+            problems.append(f"{row['scenario']}: throughput {base['throughput']} → {row['throughput']}")
+    return problems
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", default="1:5,50:3-8,500:1-10", help="пользователи:темы через запятую")
+    parser.add_argument("--workers", type=int, default=DIGEST_WORKERS, help="дайджестов одновременно")
+    parser.add_argument("--search-latency", type=float, default=0.3)
+    parser.add_argument("--page-latency", type=float, default=0.05)
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", type=Path, help="сохранить результаты в JSON")
+    parser.add_argument("--compare", type=Path, help="сравнить с сохранённым прогоном")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    pages_runner, pages_url = await FixtureServer(latency=args.page_latency).start()
+    fake_llm = FakeOpenAI(latency=args.llm_latency, output_tokens_per_second=args.llm_tokens_per_second)
+    llm_runner, llm_url = await fake_llm.start()
+    news_engine.client = AsyncOpenAI(api_key="fake", base_url=llm_url)
+    news_engine.search_backend = FakeSearchBackend(pages_url, latency=args.search_latency)
+    fetcher.HTTP_LIMIT_PER_HOST = fetcher.HTTP_LIMIT
+    fetcher.init_http()
+
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as db_dir:
+            for spec in args.scenarios.split(","):
+                row = await run_scenario(spec.strip(), args.workers, args.seed, Path(db_dir))
+                results.append(row)
+                print(
+                    f"{row['scenario']:>10}: {row['throughput']:6.2f} дайдж/с, "
+                    f"p50={row['p50_ms']} p95={row['p95_ms']} p99={row['p99_ms']} мс, "
+                    f"пик RSS {row['peak_rss_mb']} МБ, ошибок {row['failed']}"
+                )
+                print(f"{'':>12}стадии, мс: {row['stages_ms']}")
+            await database.close_db()
+    finally:
+        await news_engine.article_cache.close()
+        news_engine.extractor_pool.shutdown()
+        await fetcher.close_http()
+        await llm_runner.cleanup()
+        await pages_runner.cleanup()
+
+    if args.save:
+        args.save.write_text(json.dumps(results, ensure_ascii=False, indent=2))
+    if args.compare:
+        problems = compare(results, json.loads(args.compare.read_text()), args.tolerance)
+        for problem in problems:
+            print(f"РЕГРЕССИЯ {problem}")
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,158 @@
+"""Локальный фейковый OpenAI-совместимый сервер для бенчмарков и ручных проверок
+
+Запуск отдельно: python bench/fake_openai.py [--port 8081]
+и DEEPSEEK_BASE_URL=http://127.0.0.1:8081 python bot.py
+
+Отвечает на /chat/completions (обычный и stream) дайджестом в формате бота:
+по пункту на каждую ссылку из промпта, пока укладывается в «ОБЪЁМ» промпта
+(как послушная модель) и в max_tokens (иначе ответ обрезан, finish_reason=length).
+Задержка — фиксированная плюс время «чтения» промпта и «печати» ответа.
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from packing import estimate_tokens  # noqa: E402
+
+_LINK_RE = re.compile(r'URL: (\S+)|href="([^"]+)"')
+_VOLUME_RE = re.compile(r"ОБЪЁМ: примерно (\d+) слов")
+
+
+class FakeOpenAI:
+    def __init__(
+        self,
+        latency: float = 0.3,
+        prompt_tokens_per_second: float = 50000,
+        output_tokens_per_second: float = 500,
+    ):
+        self.latency = latency
+        self.prompt_tokens_per_second = prompt_tokens_per_second
+        self.output_tokens_per_second = output_tokens_per_second
+        self.calls = 0
+        self.truncated = 0
+        self.prompt_tokens = 0
+        self.max_prompt_tokens = 0
+        self.active = 0
+        self.max_active = 0
+
+    def make_answer(self, prompt: str, max_tokens: int) -> tuple[str, bool]:
+        urls = list(dict.fromkeys(a or b for a, b in _LINK_RE.findall(prompt)))
+        volume = _VOLUME_RE.search(prompt)
+        max_words = int(volume.group(1)) if volume else None
+        items, used, words = [], 0, 0
+        for i, url in enumerate(urls, 1):
+            item = (
+                f"▸ <b>Новость {i}</b>\n"
+                f"Что произошло и почему это важно — коротко, в двух предложениях.\n"
+                f'🔗 <a href="{url}">Источник</a>'
+            )
+            if max_words is not None and words + len(item.split()) > max_words:
+                break
+            words += len(item.split())
+            tokens = estimate_tokens(item)
+            if used + tokens > max_tokens:
+                return "\n\n".join(items), True
+            items.append(item)
+            used += tokens
+        return "\n\n".join(items), False
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        prompt = "\n".join(m["content"] for m in body["messages"])
+        prompt_tokens = estimate_tokens(prompt)
+        answer, truncated = self.make_answer(prompt, body.get("max_tokens") or 4096)
+
+        self.calls += 1
+        self.truncated += truncated
+        self.prompt_tokens += prompt_tokens
+        self.max_prompt_tokens = max(self.max_prompt_tokens, prompt_tokens)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.latency + prompt_tokens / self.prompt_tokens_per_second)
+            delay = estimate_tokens(answer) / self.output_tokens_per_second
+            finish_reason = "length" if truncated else "stop"
+            if body.get("stream"):
+                return await self._stream(request, body, answer, delay, finish_reason)
+            await asyncio.sleep(delay)
+            return web.json_response({
+                "id": "fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": answer},
+                    "finish_reason": finish_reason,
+                }],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": estimate_tokens(answer)},
+            })
+        finally:
+            self.active -= 1
+
+    async def _stream(self, request, body, answer, delay, finish_reason) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        pieces = [answer[i:i + 40] for i in range(0, len(answer), 40)] or [""]
+
+        def event(delta: dict, reason: str | None = None) -> bytes:
+            chunk = {
+                "id": "fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": reason}],
+            }
+            return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode()
+
+        for piece in pieces:
+            await asyncio.sleep(delay / len(pieces))
+            await response.write(event({"content": piece}))
+        await response.write(event({}, finish_reason))
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "truncated": self.truncated,
+            "prompt_tokens": self.prompt_tokens,
+            "max_prompt_tokens": self.max_prompt_tokens,
+            "max_concurrent": self.max_active,
+        }
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/chat/completions", self.handle)
+        app.router.add_post("/v1/chat/completions", self.handle)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> tuple[web.AppRunner, str]:
+        """Запустить в текущем loop; возвращает runner и base_url для AsyncOpenAI"""
+        runner = web.AppRunner(self.app())
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return runner, f"http://{host}:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.3)
+    args = parser.parse_args()
+    web.run_app(FakeOpenAI(latency=args.latency).app(), host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""Фейковый Telegram Bot API и «пользователи» для локального прогона вебхука
+
+Сервер отвечает на методы, которые зовёт бот (sendMessage, editMessageText, ...),
+и запоминает сообщения в чатах. Пользователи шлют апдейты прямо в вебхук:
+/start, выбор тем и «Получить новости», — и ждут, пока дайджест появится в сообщении.
+
+Запуск вместе с webhook.py (поиск, статьи и LLM — тоже фейковые):
+    python bench/fake_telegram.py --users 20
+
+Сам скрипт поднимает фейковый API, сервер фикстур и фейковый LLM, запускает
+webhook.py с воркерами и печатает задержку дайджестов и ответов на кнопки.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.fake_openai import FakeOpenAI  # noqa: E402
+from bench.fixtures import FixtureServer  # noqa: E402
+from fetcher import percentile  # noqa: E402
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "News", "username": "fake_news_bot"}
+BOT_TOKEN = "1:fake"
+SECRET = "fake-secret"
+
+
+class FakeTelegram:
+    """Bot API в памяти: chat_id -> {message_id: (текст, кнопки)}"""
+
+    def __init__(self):
+        self.chats: dict[int, dict[int, tuple[str, dict | None]]] = {}
+        self.calls: dict[str, int] = {}
+        self.webhook_url: str | None = None
+        self._message_ids = itertools.count(1000)
+        self._changed: dict[int, asyncio.Condition] = {}
+
+    def _condition(self, chat_id: int) -> asyncio.Condition:
+        return self._changed.setdefault(chat_id, asyncio.Condition())
+
+    async def _store(self, chat_id: int, message_id: int, text: str, markup: dict | None):
+        self.chats.setdefault(chat_id, {})[message_id] = (text, markup)
+        async with self._condition(chat_id):
+            self._condition(chat_id).notify_all()
+
+    def _message(self, chat_id: int, message_id: int, text: str) -> dict:
+        return {
+            "message_id": message_id, "date": int(time.time()), "text": text,
+            "chat": {"id": chat_id, "type": "private"}, "from": BOT_USER,
+        }
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] = self.calls.get(method, 0) + 1
+        params = dict(await request.post()) if request.can_read_body else {}
+        markup = json.loads(params["reply_markup"]) if params.get("reply_markup") else None
+
+        if method == "getMe":
+            result = BOT_USER
+        elif method == "setWebhook":
+            self.webhook_url = params.get("url")
+            result = True
+        elif method == "sendMessage":
+            chat_id, message_id = int(params["chat_id"]), next(self._message_ids)
+            await self._store(chat_id, message_id, params["text"], markup)
+            result = self._message(chat_id, message_id, params["text"])
+        elif method in ("editMessageText", "editMessageReplyMarkup"):
+            chat_id, message_id = int(params["chat_id"]), int(params["message_id"])
+            params.setdefault("text", self.chats.get(chat_id, {}).get(message_id, ("", None))[0])
+            if self.chats.get(chat_id, {}).get(message_id) == (params["text"], markup):
+                return web.json_response({
+                    "ok": False, "error_code": 400,
+                    "description": "Bad Request: message is not modified",
+                })
+            await self._store(chat_id, message_id, params["text"], markup)
+            result = self._message(chat_id, message_id, params["text"])
+        elif method == "deleteMessage":
+            self.chats.get(int(params["chat_id"]), {}).pop(int(params["message_id"]), None)
+            result = True
+        else:
+            # setMyCommands, answerCallbackQuery, deleteWebhook, sendChatAction...
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def wait_for(self, chat_id: int, predicate, timeout: float) -> tuple[int, str, dict | None]:
+        """Дождаться сообщения в чате, подходящего под predicate(текст, кнопки)"""
+        condition = self._condition(chat_id)
+
+        def find():
+            for message_id, (text, markup) in self.chats.get(chat_id, {}).items():
+                if predicate(text, markup):
+                    return message_id, text, markup
+            return None
+
+        async with condition:
+            await asyncio.wait_for(condition.wait_for(find), timeout)
+            return find()
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=16 * 2 ** 20)
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> tuple[web.AppRunner, str]:
+        runner = web.AppRunner(self.app(), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return runner, f"http://{host}:{port}"
+
+
+def has_button(markup: dict | None, data: str) -> bool:
+    rows = (markup or {}).get("inline_keyboard", [])
+    return any(button.get("callback_data") == data for row in rows for button in row)
+
+
+def topic_enabled(markup: dict | None, topic_id: str) -> bool:
+    rows = (markup or {}).get("inline_keyboard", [])
+    return any(
+        button.get("callback_data") == f"toggle_topic:{topic_id}" and button["text"].startswith("✅")
+        for row in rows for button in row
+    )
+
+
+class FakeUser:
+    """Пользователь шлёт апдейты в вебхук так, как их прислал бы Telegram"""
+
+    _update_ids = itertools.count(1)
+
+    def __init__(self, session: aiohttp.ClientSession, webhook: str, user_id: int):
+        self.session = session
+        self.webhook = webhook
+        self.user = {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+        self.chat = {"id": user_id, "type": "private"}
+
+    async def _send(self, update: dict) -> float:
+        """Отправить апдейт; возвращает время ответа вебхука"""
+        start = time.perf_counter()
+        async with self.session.post(
+            self.webhook, json={"update_id": next(self._update_ids), **update},
+            headers={"X-Telegram-Bot-Api-Secret-Token": SECRET},
+        ) as resp:
+            resp.raise_for_status()
+        return time.perf_counter() - start
+
+    async def text(self, text: str) -> float:
+        entities = [{"type": "bot_command", "offset": 0, "length": len(text)}] if text.startswith("/") else []
+        return await self._send({"message": {
+            "message_id": next(FakeUser._update_ids), "date": int(time.time()), "chat": self.chat,
+            "from": self.user, "text": text, "entities": entities,
+        }})
+
+    async def press(self, message_id: int, data: str) -> float:
+        return await self._send({"callback_query": {
+            "id": str(next(FakeUser._update_ids)), "from": self.user, "chat_instance": "fake", "data": data,
+            "message": {
+                "message_id": message_id, "date": int(time.time()), "chat": self.chat,
+                "from": BOT_USER, "text": "меню",
+            },
+        }})
+
+
+async def run_user(telegram: FakeTelegram, user: FakeUser, topics: list[str], timeout: float) -> dict:
+    chat_id = user.chat["id"]
+    await user.text("/start")
+    menu_id, _, _ = await telegram.wait_for(chat_id, lambda text, markup: has_button(markup, "get_news"), timeout)
+
+    # Кнопки настроек: время ответа вебхука и до перерисовки сообщения
+    clicks = []
+    for topic in topics:
+        start = time.perf_counter()
+        await user.press(menu_id, f"toggle_topic:{topic}")
+        await telegram.wait_for(chat_id, lambda text, markup, t=topic: topic_enabled(markup, t), timeout)
+        clicks.append(time.perf_counter() - start)
+
+    before = list(telegram.chats.get(chat_id, {}).values())
+    start = time.perf_counter()
+    await user.press(menu_id, "get_news")
+
+    def finished(text: str, markup: dict | None) -> bool:
+        # Дайджест дописан, когда под новым текстом снова главное меню; ошибка — «❌»
+        if (text, markup) in before:
+            return False
+        return text.startswith("❌") or (has_button(markup, "get_news") and not text.startswith(("⏳", "🕐")))
+
+    _, text, _ = await telegram.wait_for(chat_id, finished, timeout)
+    return {"digest": time.perf_counter() - start, "clicks": clicks, "error": text.startswith("❌")}
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--topics", default="it,science", help="темы, которые включает каждый пользователь")
+    parser.add_argument("--workers", type=int, default=2, help="процессов-воркеров (WORKER_PROCESSES)")
+    parser.add_argument("--port", type=int, default=8090, help="порт вебхука")
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    telegram = FakeTelegram()
+    api_runner, api_url = await telegram.start()
+    pages_runner, _ = await FixtureServer(latency=0.05).start(port=8082)  # адрес FakeSearchBackend по умолчанию
+    llm_runner, llm_url = await FakeOpenAI(latency=0.3).start()
+
+    db_dir = tempfile.TemporaryDirectory()
+    env = dict(
+        os.environ,
+        BOT_TOKEN=BOT_TOKEN, TELEGRAM_API_URL=api_url, WEBHOOK_URL=f"http://127.0.0.1:{args.port}",
+        WEBHOOK_SECRET=SECRET, WEBHOOK_PORT=str(args.port), WORKER_PROCESSES=str(args.workers),
+        SEARCH_BACKEND="fake", DEEPSEEK_API_KEY="fake", DEEPSEEK_BASE_URL=llm_url,
+        DB_PATH=str(Path(db_dir.name) / "bot.db"), ARTICLE_CACHE_DISK="0", METRICS_PORT="0",
+        PREFETCH_ENABLED="0", FEEDS_ENABLED="0", PUSH_ENABLED="0",
+    )
+    bot_dir = Path(__file__).resolve().parent.parent
+    process = await asyncio.create_subprocess_exec(sys.executable, "webhook.py", cwd=bot_dir, env=env)
+
+    webhook = f"http://127.0.0.1:{args.port}/webhook"
+    results = []
+    try:
+        async with aiohttp.ClientSession() as session:
+            for _ in range(100):
+                if telegram.webhook_url:
+                    break
+                await asyncio.sleep(0.1)
+            # Прогрев: первый дайджест ждёт, пока воркеры импортируют модули и поднимут пулы
+            await run_user(telegram, FakeUser(session, webhook, 1), args.topics.split(","), args.timeout)
+            users = [FakeUser(session, webhook, 10_000 + i) for i in range(args.users)]
+            start = time.perf_counter()
+            results = await asyncio.gather(
+                *(run_user(telegram, user, args.topics.split(","), args.timeout) for user in users),
+                return_exceptions=True,
+            )
+            elapsed = time.perf_counter() - start
+    finally:
+        process.terminate()
+        await process.wait()
+        await llm_runner.cleanup()
+        await pages_runner.cleanup()
+        await api_runner.cleanup()
+        db_dir.cleanup()
+
+    done = [r for r in results if isinstance(r, dict)]
+    digests = [r["digest"] for r in done if not r["error"]]
+    clicks = [click for r in done for click in r["clicks"]]
+    print(f"Пользователей {args.users}, воркеров {args.workers}: {len(digests)} дайджестов за {elapsed:.1f} с")
+    print(f"  дайджест: p50={percentile(digests, 0.5):.2f} p95={percentile(digests, 0.95):.2f} с")
+    print(f"  кнопки:   p50={percentile(clicks, 0.5) * 1000:.0f} p95={percentile(clicks, 0.95) * 1000:.0f} мс")
+    failed = len(results) - len(digests)
+    if failed:
+        print(f"  неудачных: {failed}", [r for r in results if not isinstance(r, dict)][:3])
+    print(f"  вызовы API: {telegram.calls}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,116 @@
+"""Локальный сервер HTML-фикстур для бенчмарков: статьи без выхода в сеть
+
+Отдаёт /article/{n}?q=... — ровно те адреса, что выдаёт FakeSearchBackend.
+Страницы берутся из каталога записанных фикстур (bench/pages/*.html),
+а если он пуст — генерируются: у каждой ссылки свой текст, чтобы склейка
+дублей не схлопнула всю выдачу в одну статью.
+
+Записать настоящие страницы: python bench/fixtures.py record urls.txt [--dir bench/pages]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import random
+import sys
+from pathlib import Path
+
+import aiohttp
+from aiohttp import web
+
+PAGES_DIR = Path(__file__).resolve().parent / "pages"
+
+WORDS = (
+    "правительство рынок компания исследование запуск спутник модель сеть данные банк "
+    "реформа выборы санкции курс нефть энергия чип смартфон вирус вакцина учёные "
+    "регулятор сделка биржа стартап атака уязвимость обновление инфляция бюджет экспорт"
+).split()
+# Служебные слова нужны newspaper3k: без них он не признаёт текст статьёй
+STOPWORDS = "в на и что по с не это как для из о к за от его но".split()
+
+
+def make_page(key: str, paragraphs: int = 12) -> str:
+    """Детерминированная статья по ключу: одинаковый адрес — одинаковый текст"""
+    rng = random.Random(hashlib.sha1(key.encode()).digest())
+    title = " ".join(rng.choice(WORDS) for _ in range(6)).capitalize()
+    body = "".join(
+        "<p>" + " ".join(rng.choice(WORDS if i % 2 else STOPWORDS) for i in range(rng.randint(30, 60))).capitalize() + ".</p>"
+        for _ in range(paragraphs)
+    )
+    return (
+        f'<html lang="ru"><head><meta charset="utf-8"><title>{title}</title>'
+        f'<meta property="og:title" content="{title}"></head><body>'
+        f"<nav>меню</nav><article><h1>{title}</h1>{body}</article><footer>подвал</footer></body></html>"
+    )
+
+
+class FixtureServer:
+    """latency — задержка ответа страницы, как у живого сайта"""
+
+    def __init__(self, pages_dir: Path = PAGES_DIR, latency: float = 0.0):
+        self.latency = latency
+        self.pages = [path.read_bytes() for path in sorted(pages_dir.glob("*.html"))] if pages_dir.is_dir() else []
+        self.requests = 0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        n, q = request.match_info["n"], request.query.get("q", "")
+        if self.pages:
+            body = self.pages[(int(n) + int(q or 0)) % len(self.pages)]
+        else:
+            body = make_page(f"{n}:{q}").encode()
+        return web.Response(body=body, content_type="text/html", charset="utf-8")
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/article/{n:\\d+}", self.handle)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> tuple[web.AppRunner, str]:
+        """Запустить в текущем loop; возвращает runner и base_url для FakeSearchBackend"""
+        runner = web.AppRunner(self.app(), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return runner, f"http://{host}:{port}"
+
+
+async def record(urls: list[str], pages_dir: Path):
+    """Скачать страницы по списку ссылок в pages_dir/NNN.html"""
+    pages_dir.mkdir(parents=True, exist_ok=True)
+    async with aiohttp.ClientSession(headers={"User-Agent": "Mozilla/5.0"}) as session:
+        for i, url in enumerate(urls):
+            try:
+                async with session.get(url, timeout=aiohttp.ClientTimeout(total=15)) as resp:
+                    resp.raise_for_status()
+                    body = await resp.read()
+            except Exception as e:
+                print(f"пропускаю {url}: {e}", file=sys.stderr)
+                continue
+            (pages_dir / f"{i:03d}.html").write_bytes(body)
+            print(f"{url} → {i:03d}.html ({len(body)} байт)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+    rec = sub.add_parser("record", help="записать страницы по списку ссылок")
+    rec.add_argument("urls", type=Path, help="файл со ссылками, по одной на строку")
+    rec.add_argument("--dir", type=Path, default=PAGES_DIR)
+    serve = sub.add_parser("serve", help="отдавать фикстуры")
+    serve.add_argument("--port", type=int, default=8082)
+    serve.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    if args.command == "record":
+        urls = [line.strip() for line in args.urls.read_text().splitlines() if line.strip()]
+        asyncio.run(record(urls, args.dir))
+    else:
+        web.run_app(FixtureServer(latency=args.latency).app(), host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
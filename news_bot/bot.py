@@ -7,31 +7,56 @@
 
 import asyncio
 import logging
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
 from aiogram import Bot, Dispatcher, F, Router
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.types import (
     Message, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup,
     BotCommand,
 )
 from aiogram.filters import CommandStart, Command
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
 from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramBadRequest
 
 from config import (
-    BOT_TOKEN, PRESET_TOPICS, LANGUAGE_LEVELS, READING_TIMES,
+    BOT_TOKEN, PRESET_TOPICS, LANGUAGE_LEVELS, READING_TIMES, PREFETCH_ENABLED, FEEDS_ENABLED,
+    DIGEST_STREAMING, STREAM_EDIT_INTERVAL,
+    PUSH_ENABLED, PUSH_TIMES, PUSH_UTC_OFFSETS, PUSH_GLOBAL_RATE, PUSH_PER_CHAT_INTERVAL, METRICS_HOST, METRICS_PORT,
+    TELEGRAM_API_URL,
 )
 from database import (
-    init_db, ensure_user, update_enabled_topics, update_custom_topics,
+    init_db, close_db, ensure_user, update_enabled_topics, update_custom_topics,
     update_language_level, update_reading_time, update_digest_lang,
-    update_last_viewed, reset_last_viewed,
+    update_last_viewed, reset_last_viewed, update_delivery_time,
 )
-from news_engine import get_news_digest
+from news_engine import get_news_digest, stream_news_digest, article_cache, extractor_pool, search_backend
+from fetcher import init_http, close_http
+from metrics import metrics, start_metrics_server
+from prefetch import PrefetchScheduler
+from feeds import FeedPoller
+from fsm import SQLiteStorage
+from jobs import DigestQueue, SQLiteDigestQueue, QueueFull, AlreadyQueued
+from push import PushScheduler
+from ratelimit import SendRateLimiter
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger(__name__)
 
 router = Router()
 
-# Состояния для ввода текста (простой вариант без FSM)
-waiting_custom_topic: dict[int, bool] = {}
+# Очередь генерации дайджестов (воркеры запускаются в main)
+digest_queue = DigestQueue()
+# В режиме вебхука с процессами-воркерами дайджесты уходят в общую очередь в SQLite
+worker_queue: SQLiteDigestQueue | None = None
+
+
+class CustomTopicInput(StatesGroup):
+    """Ждём название новой темы; состояние хранится в SQLite (fsm.py) и истекает через FSM_STATE_TTL"""
+    waiting = State()
 
 
 # ===================== КЛАВИАТУРЫ =====================
@@ -53,6 +78,7 @@ def settings_kb() -> InlineKeyboardMarkup:
         [InlineKeyboardButton(text="📖 Уровень языка", callback_data="language_menu")],
         [InlineKeyboardButton(text="⏱ Время чтения", callback_data="reading_time_menu")],
         [InlineKeyboardButton(text="🌐 Язык дайджеста", callback_data="digest_lang_menu")],
+        [InlineKeyboardButton(text="🕗 Рассылка", callback_data="delivery_menu")],
         [InlineKeyboardButton(text="🔄 Сбросить историю", callback_data="reset_history")],
         [InlineKeyboardButton(text="◀️ Назад", callback_data="back_main")],
     ])
@@ -152,6 +178,61 @@ def digest_lang_kb(current: str) -> InlineKeyboardMarkup:
     ])
 
 
+def utc_offset_name(utc_offset: int) -> str:
+    """Часовой пояс для кнопок и текста: «Москва (UTC+3)»"""
+    if utc_offset == 0:
+        return "UTC"
+    hours, minutes = divmod(abs(utc_offset), 60)
+    name = f"UTC{'+' if utc_offset > 0 else '-'}{hours}" + (f":{minutes:02d}" if minutes else "")
+    city = PUSH_UTC_OFFSETS.get(utc_offset)
+    return f"{city} ({name})" if city else name
+
+
+def delivery_kb(current: str | None, utc_offset: int) -> InlineKeyboardMarkup:
+    """Выбор времени ежедневной рассылки"""
+    buttons = []
+    row = []
+    for t in PUSH_TIMES:
+        row.append(InlineKeyboardButton(
+            text=f"{'▸ ' if t == current else ''}{t}",
+            callback_data=f"set_delivery:{t}",
+        ))
+        if len(row) == 3:
+            buttons.append(row)
+            row = []
+    if row:
+        buttons.append(row)
+
+    buttons.append([InlineKeyboardButton(
+        text=f"{'▸ ' if current is None else ''}🔕 Выключить",
+        callback_data="set_delivery:off",
+    )])
+    buttons.append([InlineKeyboardButton(
+        text=f"🌍 Часовой пояс: {utc_offset_name(utc_offset)}", callback_data="utc_offset_menu",
+    )])
+    buttons.append([InlineKeyboardButton(text="◀️ Назад", callback_data="settings")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+def utc_offset_kb(current: int) -> InlineKeyboardMarkup:
+    """Выбор часового пояса рассылки"""
+    buttons = []
+    row = []
+    for offset in PUSH_UTC_OFFSETS:
+        row.append(InlineKeyboardButton(
+            text=f"{'▸ ' if offset == current else ''}{utc_offset_name(offset)}",
+            callback_data=f"set_utc_offset:{offset}",
+        ))
+        if len(row) == 2:
+            buttons.append(row)
+            row = []
+    if row:
+        buttons.append(row)
+
+    buttons.append([InlineKeyboardButton(text="◀️ Назад", callback_data="delivery_menu")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
 def importance_level_kb() -> InlineKeyboardMarkup:
     """Выбор уровня фильтрации важности"""
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -216,26 +297,16 @@ async def get_news(callback: CallbackQuery):
         status_text += f"📅 Последний просмотр: {last_viewed}\n🔍 Ищу только свежие новости!\n\n"
     status_text += "Это займёт 30-60 секунд."
 
-    await callback.message.edit_text(status_text, parse_mode=ParseMode.HTML)
-
-    try:
-        digest = await get_news_digest(
-            enabled_topics=topics,
-            custom_topics=custom,
-            language_level=user["language_level"],
-            reading_time=user["reading_time"],
-            digest_lang=user["digest_lang"],
-            last_viewed_at=last_viewed,
-        )
-
-        # Обновляем время последнего просмотра
-        await update_last_viewed(callback.from_user.id)
-
-        # Telegram ограничивает сообщения 4096 символами — разбиваем если нужно
-        await send_long_message(callback.message, digest)
-    except Exception as e:
-        logger.error(f"Ошибка получения новостей: {e}")
-        await callback.message.edit_text(f"❌ Произошла ошибка: {e}")
+    digest_args = dict(
+        enabled_topics=topics,
+        custom_topics=custom,
+        language_level=user["language_level"],
+        reading_time=user["reading_time"],
+        digest_lang=user["digest_lang"],
+        last_viewed_at=last_viewed,
+        user_id=callback.from_user.id,
+    )
+    await enqueue_digest(callback, status_text, digest_args)
 
 
 # --- Только важное ---
@@ -268,27 +339,18 @@ async def important_with_level(callback: CallbackQuery):
         status_text += f"📅 Последний просмотр: {last_viewed}\n"
     status_text += "Фильтрую шум, оставляю только главное."
 
-    await callback.message.edit_text(status_text, parse_mode=ParseMode.HTML)
-
-    try:
-        digest = await get_news_digest(
-            enabled_topics=user["enabled_topics"],
-            custom_topics=user["custom_topics"],
-            language_level=user["language_level"],
-            reading_time=user["reading_time"],
-            digest_lang=user["digest_lang"],
-            important_only=True,
-            importance_level=level,
-            last_viewed_at=last_viewed,
-        )
-
-        # Обновляем время последнего просмотра
-        await update_last_viewed(callback.from_user.id)
-
-        await send_long_message(callback.message, digest)
-    except Exception as e:
-        logger.error(f"Ошибка: {e}")
-        await callback.message.edit_text(f"❌ Ошибка: {e}")
+    digest_args = dict(
+        enabled_topics=user["enabled_topics"],
+        custom_topics=user["custom_topics"],
+        language_level=user["language_level"],
+        reading_time=user["reading_time"],
+        digest_lang=user["digest_lang"],
+        important_only=True,
+        importance_level=level,
+        last_viewed_at=last_viewed,
+        user_id=callback.from_user.id,
+    )
+    await enqueue_digest(callback, status_text, digest_args)
 
 
 # --- Настройки ---
@@ -298,13 +360,17 @@ async def settings_menu(callback: CallbackQuery):
     user = await ensure_user(callback.from_user.id)
     topics_count = len(user["enabled_topics"]) + len(user["custom_topics"])
     level_name = LANGUAGE_LEVELS.get(user["language_level"], {}).get("name_ru", "?")
+    delivery = "выключена"
+    if user["delivery_time"]:
+        delivery = f"{user['delivery_time']}, {utc_offset_name(user['utc_offset'])}"
 
     text = (
         f"⚙️ <b>Настройки</b>\n\n"
         f"📋 Тем выбрано: <b>{topics_count}</b>\n"
         f"📖 Язык: <b>{level_name}</b>\n"
         f"⏱ Чтение: <b>{user['reading_time']} мин</b>\n"
-        f"🌐 Дайджест: <b>{'Русский' if user['digest_lang'] == 'ru' else 'English'}</b>"
+        f"🌐 Дайджест: <b>{'Русский' if user['digest_lang'] == 'ru' else 'English'}</b>\n"
+        f"🕗 Рассылка: <b>{delivery}</b>"
     )
 
     await callback.message.edit_text(text, reply_markup=settings_kb(), parse_mode=ParseMode.HTML)
@@ -379,8 +445,8 @@ async def custom_topics_menu(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "add_custom_topic")
-async def add_custom_topic_prompt(callback: CallbackQuery):
-    waiting_custom_topic[callback.from_user.id] = True
+async def add_custom_topic_prompt(callback: CallbackQuery, state: FSMContext):
+    await state.set_state(CustomTopicInput.waiting)
     await callback.message.edit_text(
         "✏️ <b>Напиши тему</b>\n\n"
         "Например: <i>Flipper Zero</i>, <i>эмиграция в Германию</i>, <i>Unreal Engine</i>\n\n"
@@ -390,23 +456,16 @@ async def add_custom_topic_prompt(callback: CallbackQuery):
 
 
 @router.message(Command("cancel"))
-async def cancel_input(message: Message):
-    if message.from_user.id in waiting_custom_topic:
-        del waiting_custom_topic[message.from_user.id]
+async def cancel_input(message: Message, state: FSMContext):
+    await state.clear()
     await message.answer("❌ Отменено", reply_markup=main_menu_kb())
 
 
-@router.message(F.text & ~F.text.startswith("/"))
-async def handle_text_input(message: Message):
-    """Обработка текстового ввода (для добавления кастомных тем)"""
+@router.message(CustomTopicInput.waiting, F.text & ~F.text.startswith("/"))
+async def handle_custom_topic_input(message: Message, state: FSMContext):
+    """Название новой кастомной темы"""
     user_id = message.from_user.id
-
-    if user_id not in waiting_custom_topic:
-        # Если пользователь просто пишет текст — показываем меню
-        await message.answer("Используй кнопки меню 👇", reply_markup=main_menu_kb())
-        return
-
-    del waiting_custom_topic[user_id]
+    await state.clear()
     topic_text = message.text.strip()
 
     if len(topic_text) > 100:
@@ -433,6 +492,12 @@ async def handle_text_input(message: Message):
     )
 
 
+@router.message(F.text & ~F.text.startswith("/"))
+async def handle_text_input(message: Message):
+    """Текст вне диалога — показываем меню"""
+    await message.answer("Используй кнопки меню 👇", reply_markup=main_menu_kb())
+
+
 @router.callback_query(F.data.startswith("del_custom:"))
 async def delete_custom_topic(callback: CallbackQuery):
     idx = int(callback.data.split(":")[1])
@@ -513,6 +578,50 @@ async def set_digest_lang(callback: CallbackQuery):
     await callback.message.edit_reply_markup(reply_markup=digest_lang_kb(lang))
 
 
+# --- Рассылка по расписанию ---
+
+@router.callback_query(F.data == "delivery_menu")
+async def delivery_menu(callback: CallbackQuery):
+    user = await ensure_user(callback.from_user.id)
+    await callback.message.edit_text(
+        "🕗 <b>Ежедневная рассылка</b>\n\n"
+        "Выбери время — дайджест по твоим темам придёт сам.\n"
+        f"Часовой пояс: <b>{utc_offset_name(user['utc_offset'])}</b>",
+        reply_markup=delivery_kb(user["delivery_time"], user["utc_offset"]),
+        parse_mode=ParseMode.HTML,
+    )
+
+
+@router.callback_query(F.data.startswith("set_delivery:"))
+async def set_delivery(callback: CallbackQuery):
+    value = callback.data.split(":", 1)[1]
+    user = await ensure_user(callback.from_user.id)
+    delivery_time = None if value == "off" else value
+    await update_delivery_time(callback.from_user.id, delivery_time, user["utc_offset"])
+    await callback.answer(f"✅ Рассылка: {delivery_time}" if delivery_time else "🔕 Рассылка выключена")
+    await callback.message.edit_reply_markup(reply_markup=delivery_kb(delivery_time, user["utc_offset"]))
+
+
+@router.callback_query(F.data == "utc_offset_menu")
+async def utc_offset_menu(callback: CallbackQuery):
+    user = await ensure_user(callback.from_user.id)
+    await callback.message.edit_text(
+        "🌍 <b>Часовой пояс рассылки</b>\n\nВремя рассылки считается по нему.",
+        reply_markup=utc_offset_kb(user["utc_offset"]),
+        parse_mode=ParseMode.HTML,
+    )
+
+
+@router.callback_query(F.data.startswith("set_utc_offset:"))
+async def set_utc_offset(callback: CallbackQuery):
+    utc_offset = int(callback.data.split(":", 1)[1])
+    user = await ensure_user(callback.from_user.id)
+    # Время рассылки остаётся тем же по местным часам, пересчитывается только минута UTC
+    await update_delivery_time(callback.from_user.id, user["delivery_time"], utc_offset)
+    await callback.answer(f"✅ Часовой пояс: {utc_offset_name(utc_offset)}")
+    await delivery_menu(callback)
+
+
 # --- Сброс истории ---
 
 @router.callback_query(F.data == "reset_history")
@@ -530,24 +639,57 @@ async def noop(callback: CallbackQuery):
 
 # ===================== УТИЛИТЫ =====================
 
-async def send_long_message(message: Message, text: str):
-    """Отправка длинного сообщения с разбивкой"""
-    # Удаляем сообщение "ожидание"
+async def deliver_digest(message: Message, user_id: int, status_text: str, digest_args: dict):
+    """Собрать дайджест и вывести его в сообщение статуса (в этом процессе или в воркере)"""
+    await message.edit_text(status_text, parse_mode=ParseMode.HTML)
     try:
-        await message.delete()
-    except Exception:
-        pass
+        if DIGEST_STREAMING:
+            # Дайджест появляется в сообщении статуса по мере генерации
+            await send_streaming_message(message, stream_news_digest(**digest_args))
+        else:
+            digest = await get_news_digest(**digest_args)
+            # Telegram ограничивает сообщения 4096 символами — разбиваем если нужно
+            await send_long_message(message, digest)
 
-    max_len = 4096
-    if len(text) <= max_len:
-        try:
-            await message.answer(text, parse_mode=ParseMode.HTML, reply_markup=main_menu_kb())
-        except Exception:
-            # Если HTML невалидный — отправляем без форматирования
-            await message.answer(text, reply_markup=main_menu_kb())
+        # Обновляем время последнего просмотра
+        await update_last_viewed(user_id)
+    except Exception as e:
+        logger.error(f"Ошибка получения новостей: {e}")
+        await message.edit_text(f"❌ Произошла ошибка: {e}")
+
+
+async def enqueue_digest(callback: CallbackQuery, status_text: str, digest_args: dict):
+    """Поставить генерацию дайджеста в очередь и показать место в ней"""
+    user_id = callback.from_user.id
+    message = callback.message
+
+    async def run():
+        await deliver_digest(message, user_id, status_text, digest_args)
+
+    async def show_position(position: int):
+        if position:
+            await message.edit_text(
+                f"🕐 <b>Ты в очереди: {position}</b>\n\nДайджест начнёт собираться, как только освободится место.",
+                parse_mode=ParseMode.HTML,
+            )
+
+    try:
+        if worker_queue is not None:
+            # Время просмотра воркер перечитает из БД сам: кэш этого процесса его не видит
+            payload = {"status_text": status_text, "digest_args": dict(digest_args, last_viewed_at=None)}
+            await worker_queue.submit(user_id, message.chat.id, message.message_id, payload, show_position)
+        else:
+            # Место в очереди покажет сама очередь — до того, как задачу возьмёт воркер
+            await digest_queue.submit(user_id, run, show_position)
+    except AlreadyQueued:
+        await callback.answer("⏳ Дайджест уже готовится, подожди немного")
         return
+    except QueueFull:
+        await callback.answer("⚠️ Сейчас слишком много запросов. Попробуй через минуту.", show_alert=True)
+
 
-    # Разбиваем по абзацам
+def split_message(text: str, max_len: int = 4096) -> list[str]:
+    """Разбить текст на части по абзацам (лимит Telegram — 4096 символов)"""
     parts = []
     current = ""
     for line in text.split("\n"):
@@ -558,7 +700,26 @@ async def send_long_message(message: Message, text: str):
             current += ("\n" if current else "") + line
     if current:
         parts.append(current)
+    return parts
+
+
+async def send_long_message(message: Message, text: str):
+    """Отправка длинного сообщения с разбивкой"""
+    # Удаляем сообщение "ожидание"
+    try:
+        await message.delete()
+    except Exception:
+        pass
+
+    if len(text) <= 4096:
+        try:
+            await message.answer(text, parse_mode=ParseMode.HTML, reply_markup=main_menu_kb())
+        except Exception:
+            # Если HTML невалидный — отправляем без форматирования
+            await message.answer(text, reply_markup=main_menu_kb())
+        return
 
+    parts = split_message(text)
     for i, part in enumerate(parts):
         try:
             if i == len(parts) - 1:
@@ -573,24 +734,165 @@ async def send_long_message(message: Message, text: str):
         await asyncio.sleep(0.3)
 
 
+async def edit_html(message: Message, text: str, reply_markup: InlineKeyboardMarkup = None) -> bool:
+    """Отредактировать сообщение как HTML; False — если Telegram не принял разметку"""
+    try:
+        await message.edit_text(text, parse_mode=ParseMode.HTML, reply_markup=reply_markup)
+        return True
+    except TelegramBadRequest as e:
+        return "message is not modified" in str(e)
+
+
+async def finish_message(message: Message, text: str, reply_markup: InlineKeyboardMarkup = None):
+    """Финальный текст сообщения; если HTML невалидный — без форматирования"""
+    if not await edit_html(message, text, reply_markup):
+        try:
+            await message.edit_text(text, reply_markup=reply_markup)
+        except TelegramBadRequest as e:
+            logger.warning(f"Не удалось обновить сообщение: {e}")
+
+
+async def send_streaming_message(message: Message, chunks: AsyncIterator[str]):
+    """Постепенный вывод дайджеста правками сообщения статуса.
+
+    Правки не чаще STREAM_EDIT_INTERVAL (лимиты Telegram на редактирование),
+    показываем только целые строки — так незакрытые HTML-теги не ломают разметку.
+    При переполнении 4096 символов текущее сообщение закрывается и начинается новое.
+    """
+    max_len = 4096
+    current = message
+    text = ""
+    shown = ""
+    last_edit = 0.0
+
+    async for chunk in chunks:
+        text += chunk
+
+        while len(text) > max_len:
+            cut = text.rfind("\n", 0, max_len)
+            if cut <= 0:
+                cut = max_len
+            head, text = text[:cut], text[cut:].lstrip("\n")
+            await finish_message(current, head)
+            current = await current.answer("⏳")
+            shown = ""
+
+        visible = text[:text.rfind("\n") + 1].rstrip()
+        if visible and visible != shown and time.monotonic() - last_edit >= STREAM_EDIT_INTERVAL:
+            if await edit_html(current, visible + "\n\n⏳"):
+                shown = visible
+            last_edit = time.monotonic()
+
+    await finish_message(current, text.strip() or "😕 Пустой ответ", reply_markup=main_menu_kb())
+
+
 # ===================== ЗАПУСК =====================
 
+BOT_COMMANDS = [
+    BotCommand(command="start", description="Запустить бота"),
+    BotCommand(command="menu", description="Главное меню"),
+    BotCommand(command="cancel", description="Отмена ввода"),
+]
+
+
+def create_bot() -> Bot:
+    """Бот с API из TELEGRAM_API_URL (локальный Bot API или фейковый сервер), иначе — api.telegram.org"""
+    if TELEGRAM_API_URL:
+        return Bot(token=BOT_TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)))
+    return Bot(token=BOT_TOKEN)
+
+
+def create_dispatcher() -> Dispatcher:
+    # Состояния диалогов в SQLite: переживают перезапуск и не копятся в памяти
+    storage = SQLiteStorage()
+    metrics.register_gauges("news_fsm", storage.stats)
+    dp = Dispatcher(storage=storage)
+    dp.include_router(router)
+    return dp
+
+
+async def start_background(bot: Bot) -> Callable[[], Awaitable[None]]:
+    """Прогрев тем, опрос лент и рассылка по расписанию; возвращает функцию остановки"""
+    # Фоновый прогрев тем — первый пользователь дня не ждёт поиск и парсинг
+    prefetcher = PrefetchScheduler()
+    if PREFETCH_ENABLED:
+        prefetcher.start()
+    # Чистка старых статей, показанных статей и кэша — и без прогрева, иначе таблицы растут без предела
+    prefetcher.start_maintenance()
+    # Ленты дают пресетным темам свежие статьи с точными датами без поиска
+    feed_poller = FeedPoller()
+    if FEEDS_ENABLED:
+        feed_poller.start()
+
+    # Рассылка по расписанию: общий лимит Telegram на бота и не чаще раза в секунду в чат
+    push_limiter = SendRateLimiter(PUSH_GLOBAL_RATE, PUSH_PER_CHAT_INTERVAL)
+
+    async def push_digest(chat_id: int, text: str):
+        parts = split_message("🕗 <b>Твой дайджест</b>\n\n" + text)
+        for i, part in enumerate(parts):
+            markup = main_menu_kb() if i == len(parts) - 1 else None
+            await push_limiter.acquire(chat_id)
+            try:
+                await bot.send_message(chat_id, part, parse_mode=ParseMode.HTML, reply_markup=markup)
+            except TelegramBadRequest:
+                await bot.send_message(chat_id, part, reply_markup=markup)
+
+    pusher = PushScheduler(push_digest)
+    if PUSH_ENABLED:
+        pusher.start()
+
+    metrics.register_gauges("news_prefetch", prefetcher.stats)
+    metrics.register_gauges("news_feeds", feed_poller.stats)
+    metrics.register_gauges("news_push", pusher.stats)
+
+    async def stop():
+        await pusher.stop()
+        await prefetcher.stop()
+        await feed_poller.stop()
+
+    return stop
+
+
+async def start_metrics(port_offset: int = 0):
+    """/metrics процесса; у каждого процесса-воркера свой порт: METRICS_PORT + номер"""
+    if not METRICS_PORT:
+        return None
+    return await start_metrics_server(METRICS_HOST, METRICS_PORT + port_offset)
+
+
+async def close_resources():
+    """Закрыть то, что открыли init_db/init_http и движок новостей"""
+    await article_cache.close()
+    extractor_pool.shutdown()
+    await search_backend.close()
+    await close_http()
+    await close_db()
+
+
 async def main():
     await init_db()
+    init_http()
 
-    bot = Bot(token=BOT_TOKEN)
-    dp = Dispatcher()
-    dp.include_router(router)
+    bot = create_bot()
+    dp = create_dispatcher()
 
     # Устанавливаем команды
-    await bot.set_my_commands([
-        BotCommand(command="start", description="Запустить бота"),
-        BotCommand(command="menu", description="Главное меню"),
-        BotCommand(command="cancel", description="Отмена ввода"),
-    ])
+    await bot.set_my_commands(BOT_COMMANDS)
+
+    digest_queue.start()
+    stop_background = await start_background(bot)
+    metrics.register_gauges("news_queue", digest_queue.stats)
+    metrics_runner = await start_metrics()
 
     logger.info("🚀 Бот запущен!")
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await stop_background()
+        await digest_queue.stop()
+        await close_resources()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,221 @@
+"""Общие кэши: статьи по URL (память + SQLite), результаты с TTL и LRU-вытеснением, single-flight"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+
+async def run_closed(result) -> None:
+    """Выполнить запрос aiosqlite без результата и сразу закрыть курсор в потоке соединения.
+
+    Брошенный курсор добивает GC в потоке event loop, и тот сбрасывает общий
+    закэшированный statement, пока поток aiosqlite им пользуется — отсюда редкие
+    «sqlite3.InterfaceError: bad parameter or other API misuse» под нагрузкой.
+    """
+    async with result:
+        pass
+
+
+class TTLCache:
+    """LRU-кэш в памяти с ограничением по размеру и временем жизни записей"""
+
+    def __init__(self, max_items: int, ttl: float | None = None):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+
+        expires_at, value = item
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl: float | None = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_items:
+            self._data.popitem(last=False)
+
+    def peek(self, key, default=None):
+        """Значение без учёта в статистике и без продвижения в LRU"""
+        item = self._data.get(key)
+        if item is None or (item[0] is not None and item[0] < time.monotonic()):
+            return default
+        return item[1]
+
+    def pop(self, key, default=None):
+        item = self._data.pop(key, None)
+        return item[1] if item else default
+
+    def clear(self):
+        self._data.clear()
+
+    def items(self) -> list[tuple]:
+        """Живые записи (без учёта в статистике)"""
+        now = time.monotonic()
+        return [
+            (key, value) for key, (expires_at, value) in self._data.items()
+            if expires_at is None or expires_at >= now
+        ]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key) -> bool:
+        return key in self._data
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_items": self.max_items,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+class SingleFlight:
+    """Склейка одновременных одинаковых запросов в одну задачу"""
+
+    def __init__(self):
+        self._inflight: dict = {}
+        self.shared = 0  # сколько вызовов дождались чужого запроса
+
+    async def do(self, key, factory):
+        """Выполнить factory() для key, либо дождаться уже запущенного вызова"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.shared += 1
+        # shield: отмена одного ожидающего не отменяет запрос для остальных
+        return await asyncio.shield(task)
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+
+class ArticleCache:
+    """Кэш распарсенных статей по URL: горячий слой в памяти + опциональный слой в SQLite"""
+
+    def __init__(self, max_items: int, ttl: float, db_path: Path | None = None):
+        self.ttl = ttl
+        self.memory = TTLCache(max_items, ttl)
+        self.db_path = db_path
+        self._db: aiosqlite.Connection | None = None
+        self._open_lock = asyncio.Lock()
+        self.disk_hits = 0
+        self.disk_misses = 0
+
+    async def _get_db(self) -> aiosqlite.Connection:
+        if self._db is not None:
+            return self._db
+        # Первые get() дайджеста идут пачкой: без блокировки каждый открыл бы своё соединение
+        async with self._open_lock:
+            if self._db is None:
+                self.db_path.parent.mkdir(parents=True, exist_ok=True)
+                db = await aiosqlite.connect(self.db_path)
+                # Файл общий для процессов-воркеров: как в database.py — WAL и ожидание блокировки
+                await run_closed(db.execute("PRAGMA journal_mode=WAL"))
+                await run_closed(db.execute("PRAGMA synchronous=NORMAL"))
+                await run_closed(db.execute("PRAGMA busy_timeout=5000"))
+                await run_closed(db.execute("""
+                    CREATE TABLE IF NOT EXISTS article_cache (
+                        url TEXT PRIMARY KEY,
+                        data TEXT NOT NULL,
+                        expires_at REAL NOT NULL
+                    )
+                """))
+                await db.commit()
+                self._db = db
+        return self._db
+
+    async def get(self, url: str) -> dict | None:
+        """Статья из кэша (копия) или None"""
+        article = self.memory.get(url)
+        if article is not None:
+            return dict(article)
+
+        if self.db_path is None:
+            return None
+
+        try:
+            db = await self._get_db()
+            async with db.execute(
+                "SELECT data, expires_at FROM article_cache WHERE url = ?", (url,)
+            ) as cursor:
+                row = await cursor.fetchone()
+        except Exception as e:
+            logger.warning(f"Ошибка чтения кэша статей: {e}")
+            return None
+
+        # time.time(), а не monotonic — запись переживает перезапуск
+        if not row or row[1] < time.time():
+            self.disk_misses += 1
+            return None
+
+        self.disk_hits += 1
+        article = json.loads(row[0])
+        self.memory.set(url, article, ttl=row[1] - time.time())
+        return dict(article)
+
+    async def set(self, url: str, article: dict):
+        """Положить статью в кэш (поле topic не сохраняем — оно зависит от запроса)"""
+        article = {k: v for k, v in article.items() if k != "topic"}
+        self.memory.set(url, article)
+
+        if self.db_path is None:
+            return
+
+        try:
+            db = await self._get_db()
+            await run_closed(db.execute(
+                "INSERT OR REPLACE INTO article_cache (url, data, expires_at) VALUES (?, ?, ?)",
+                (url, json.dumps(article, ensure_ascii=False), time.time() + self.ttl),
+            ))
+            await db.commit()
+        except Exception as e:
+            logger.warning(f"Ошибка записи кэша статей: {e}")
+
+    async def purge_expired(self):
+        """Удалить просроченные записи из SQLite"""
+        if self.db_path is None:
+            return
+        db = await self._get_db()
+        await run_closed(db.execute("DELETE FROM article_cache WHERE expires_at < ?", (time.time(),)))
+        await db.commit()
+
+    async def close(self):
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    def stats(self) -> dict:
+        stats = self.memory.stats()
+        stats["disk_hits"] = self.disk_hits
+        stats["disk_misses"] = self.disk_misses
+        return stats
@@ -70,3 +70,178 @@ WORDS_PER_MINUTE = 200
 MAX_SEARCH_RESULTS_PER_TOPIC = 5
 MAX_ARTICLE_LENGTH = 3000  # символов на статью для отправки в LLM
 REQUEST_TIMEOUT = 10  # секунд
+
+# === КЭШ СТАТЕЙ ===
+ARTICLE_CACHE_TTL = 6 * 60 * 60  # секунд
+ARTICLE_CACHE_MAX_ITEMS = 5000  # статей в памяти
+ARTICLE_CACHE_DISK = os.getenv("ARTICLE_CACHE_DISK", "1") == "1"  # второй слой в data/cache.db
+
+# === ПОИСК ===
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "ddg-thread")  # ddg-thread | ddg-async | fake
+SEARCH_THREADS = 4  # потоков у синхронного DDG (свой пул, не общий с aiosqlite)
+SEARCH_CONCURRENCY = 4  # одновременных поисковых запросов — отдельно от загрузки статей
+
+# === КЭШ ПОИСКА ===
+SEARCH_CACHE_TTL = 10 * 60  # секунд
+SEARCH_CACHE_MAX_ITEMS = 1000  # запросов
+
+# === ПАРСИНГ HTML (пул процессов) ===
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "2"))  # 0 — парсить прямо в event loop
+PARSE_MAX_PENDING = 200  # статей в очереди пула, остальные отбрасываются
+PARSE_CPU_TIMEOUT = 5  # секунд процессорного времени на статью
+PARSE_EXTRACTOR = os.getenv("PARSE_EXTRACTOR", "newspaper")  # newspaper | lxml (быстрый путь)
+
+# === ФОНОВЫЙ ПРОГРЕВ ТЕМ ===
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "1") == "1"
+PREFETCH_INTERVAL = 30 * 60  # секунд между обновлениями темы по умолчанию
+PREFETCH_INTERVALS = {  # свои интервалы для быстро меняющихся тем
+    "geopolitics": 15 * 60,
+    "economy": 15 * 60,
+    "crypto": 15 * 60,
+    "sport": 20 * 60,
+}
+PREFETCH_JITTER = 0.2  # ±20% к интервалу, чтобы темы не обновлялись разом
+PREFETCH_CONCURRENCY = 3  # тем обновляется одновременно
+PREFETCH_LANGS = ["ru"]  # для каких языков дайджеста греть темы
+PREFETCH_CUSTOM_LIMIT = 20  # сколько популярных кастомных тем греть
+PREFETCH_CUSTOM_MIN_USERS = 3  # тема популярна, если она есть у стольких пользователей
+WARM_TOPIC_TTL = 60 * 60  # сколько прогретые статьи считаются свежими
+STORED_MATCH_WINDOW = 24 * 60 * 60  # кастомные темы ищем в статьях, загруженных за это время
+ARTICLE_STORE_DAYS = 7  # сколько дней хранить статьи в БД
+
+# === КЭШ НАСТРОЕК ПОЛЬЗОВАТЕЛЕЙ ===
+USER_CACHE_MAX_ITEMS = 10000  # пользователей в памяти
+
+# === СОСТОЯНИЯ ДИАЛОГОВ (FSM) ===
+FSM_STATE_TTL = 30 * 60  # брошенный ввод (например, новой темы) сбрасывается через 30 минут
+FSM_CACHE_MAX_ITEMS = 10000  # состояний в памяти; остальные читаются из SQLite
+FSM_PRUNE_INTERVAL = 10 * 60  # секунд между чистками просроченных состояний в БД
+
+# === ВЫВОД ДАЙДЖЕСТА ===
+DIGEST_STREAMING = True  # показывать дайджест по мере генерации
+STREAM_EDIT_INTERVAL = 1.5  # секунд между правками сообщения (лимиты Telegram)
+
+# === КЭШ СЕКЦИЙ ДАЙДЖЕСТА ===
+SECTION_CACHE_ENABLED = True  # дайджест собирается из секций по темам, общих для пользователей
+SECTION_CACHE_TTL = 2 * 60 * 60  # секунд
+SECTION_CACHE_MAX_ITEMS = 2000  # секций в памяти
+SECTION_CONCURRENCY = 4  # одновременных запросов к LLM за секциями
+SECTION_MAX_TOKENS = 1500  # длина одной секции
+
+# === ОЧЕРЕДЬ ДАЙДЖЕСТОВ ===
+DIGEST_WORKERS = 4  # дайджестов генерируется одновременно
+DIGEST_QUEUE_MAX = 100  # ожидающих в очереди; дальше — просим подождать
+
+# === РАССЫЛКА ПО РАСПИСАНИЮ ===
+PUSH_ENABLED = os.getenv("PUSH_ENABLED", "1") == "1"
+PUSH_TIMES = ["07:00", "08:00", "09:00", "12:00", "18:00", "21:00"]  # варианты в настройках
+PUSH_DEFAULT_UTC_OFFSET = 180  # минут, по умолчанию московское время
+PUSH_UTC_OFFSETS = {  # часовые пояса в настройках рассылки: смещение от UTC в минутах -> город
+    120: "Калининград", 180: "Москва", 240: "Самара", 300: "Екатеринбург",
+    360: "Омск", 420: "Красноярск", 480: "Иркутск", 540: "Якутск",
+    600: "Владивосток", 660: "Магадан", 720: "Камчатка", 0: "UTC",
+}
+PUSH_BUCKET_MINUTES = 5  # пользователи одного интервала получают общий дайджест
+PUSH_CONCURRENCY = 4  # уникальных дайджестов генерируется одновременно
+PUSH_GLOBAL_RATE = 25  # сообщений в секунду на бота (лимит Telegram — 30)
+PUSH_PER_CHAT_INTERVAL = 1.0  # секунд между сообщениями в один чат
+
+# === УЖЕ ПОКАЗАННЫЕ СТАТЬИ ===
+# Статьи из прошлых дайджестов пользователя не попадают в новые (хранятся ARTICLE_STORE_DAYS)
+SEEN_ARTICLES_ENABLED = True
+
+# === СКЛЕЙКА ДУБЛЕЙ ===
+DEDUP_ENABLED = True  # одна новость из разных изданий уходит в LLM один раз
+DEDUP_THRESHOLD = 0.5  # оценка сходства по Жаккару, выше которой статьи — дубли
+DEDUP_NUM_PERM = 64  # длина MinHash-сигнатуры
+DEDUP_BANDS = 16  # полос LSH (DEDUP_NUM_PERM должно делиться на DEDUP_BANDS)
+DEDUP_SHINGLE_SIZE = 2  # слов в шингле
+DEDUP_TEXT_CHARS = 1500  # сколько текста статьи сравнивать
+
+# === БЮДЖЕТ ПРОМПТА ===
+PROMPT_TOKENS_PER_MINUTE = 3000  # токенов статей в промпте на минуту чтения
+PROMPT_MAX_TOKENS = 40000  # потолок токенов статей в одном промпте
+PROMPT_MIN_ARTICLE_TOKENS = 80  # статью, от которой остаётся меньше, не включаем
+DIGEST_TOKENS_PER_WORD = 3  # токенов ответа на слово дайджеста (с HTML и ссылками)
+DIGEST_MIN_TOKENS = 1000  # границы max_tokens ответа модели
+DIGEST_MAX_TOKENS = 8000
+
+# === MAP-REDUCE ДАЙДЖЕСТ ===
+MAPREDUCE_MIN_ARTICLES = 40  # с этого числа статей — сначала секции по темам, потом сводка
+MAPREDUCE_MIN_TOKENS = 30000  # или если статьи целиком больше стольких токенов
+
+# === HTTP (общая сессия загрузки статей) ===
+HTTP_LIMIT = 100  # соединений всего
+HTTP_LIMIT_PER_HOST = 4  # соединений к одному сайту
+HTTP_DNS_TTL = 5 * 60  # секунд держать DNS-ответы в кэше
+HTTP_KEEPALIVE_TIMEOUT = 30  # секунд держать простаивающее соединение
+HTTP_MAX_BODY_BYTES = 2 * 1024 * 1024  # дальше страницу не читаем — текст статьи обычно в начале
+HTTP_VALIDATORS_TTL = 24 * 60 * 60  # сколько помнить ETag/Last-Modified статьи для условных запросов
+HTTP_VALIDATORS_MAX_ITEMS = 5000
+
+# === ЗДОРОВЬЕ ИСТОЧНИКОВ (по доменам) ===
+DOMAIN_RATE = 2  # запросов в секунду к одному сайту
+DOMAIN_BURST = 4  # всплеск запросов к одному сайту
+DOMAIN_WINDOW = 10  # по скольким последним запросам судим о домене
+DOMAIN_MIN_REQUESTS = 3  # раньше стольких запросов домен не отключаем
+DOMAIN_FAILURE_RATIO = 0.6  # доля ошибок/таймаутов/пейволов, при которой домен отключается
+DOMAIN_COOLDOWN = 15 * 60  # секунд паузы, удваивается при повторных срабатываниях
+DOMAIN_MAX_COOLDOWN = 6 * 60 * 60
+DOMAIN_MAX_TRACKED = 5000  # доменов в памяти
+
+# === ЗАГРУЗКА СТАТЕЙ ТЕМЫ ===
+FETCH_FIRST_N = True  # качать с запасом и брать первые MAX_SEARCH_RESULTS_PER_TOPIC удачных
+FETCH_OVERFETCH = 2  # во сколько раз больше кандидатов, чем нужно статей
+FETCH_TOPIC_DEADLINE = 6  # секунд на загрузку статей одной темы; что не успело — отменяется
+
+# === RSS/ATOM-ЛЕНТЫ ===
+FEEDS_ENABLED = os.getenv("FEEDS_ENABLED", "1") == "1"
+FEEDS = {  # ленты пресетных тем по языкам; темы с лентами не ищутся через поиск при прогреве
+    "geopolitics": {
+        "ru": ["https://ria.ru/export/rss2/world/index.xml"],
+        "en": ["https://feeds.bbci.co.uk/news/world/rss.xml"],
+    },
+    "economy": {
+        "ru": ["https://ria.ru/export/rss2/economy/index.xml"],
+        "en": ["https://feeds.bbci.co.uk/news/business/rss.xml"],
+    },
+    "it": {
+        "ru": ["https://habr.com/ru/rss/news/", "https://3dnews.ru/news/rss/"],
+        "en": ["https://feeds.arstechnica.com/arstechnica/index", "https://www.theverge.com/rss/index.xml"],
+    },
+    "science": {
+        "ru": ["https://ria.ru/export/rss2/science/index.xml"],
+        "en": ["https://feeds.bbci.co.uk/news/science_and_environment/rss.xml"],
+    },
+    "space": {
+        "en": ["https://www.space.com/feeds/all"],
+    },
+    "cybersecurity": {
+        "en": ["https://krebsonsecurity.com/feed/", "https://feeds.feedburner.com/TheHackersNews"],
+    },
+    "crypto": {
+        "ru": ["https://forklog.com/feed"],
+        "en": ["https://www.coindesk.com/arc/outboundfeeds/rss/"],
+    },
+}
+FEED_POLL_INTERVAL = 10 * 60  # секунд между опросами лент темы
+FEED_CONCURRENCY = 4  # лент опрашивается одновременно
+FEED_MAX_NEW_ENTRIES = 20  # новых записей ленты за один опрос
+FEED_MIN_SUMMARY_CHARS = 600  # текст из ленты длиннее этого используем без загрузки страницы
+
+# === МЕТРИКИ ===
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))  # /metrics в формате Prometheus; 0 — не поднимать
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_MAX_SERIES = 300  # разных наборов меток на метрику (домены и т.п.), дальше — label="other"
+
+# === WEBHOOK И ПРОЦЕССЫ-ВОРКЕРЫ (python webhook.py) ===
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")  # пусто — api.telegram.org; иначе, например, фейковый API
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # внешний адрес бота, куда Telegram шлёт апдейты
+WEBHOOK_PATH = "/webhook"
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")  # проверяется в заголовке X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "2"))  # 0 — дайджесты в процессе вебхука
+WORKER_POLL_INTERVAL = 0.5  # секунд между проверками очереди, когда она пуста
+WORKER_JOB_TIMEOUT = 10 * 60  # задача «в работе» дольше — воркер считается упавшим
+WORKER_MAX_ATTEMPTS = 2  # сколько раз задача упавшего воркера возвращается в очередь
@@ -2,51 +2,245 @@
 
 import aiosqlite
 import json
+import os
+from datetime import datetime, timezone
 from pathlib import Path
 
-DB_PATH = Path(__file__).parent / "data" / "bot.db"
+from cache import TTLCache, run_closed
+from config import USER_CACHE_MAX_ITEMS, PUSH_DEFAULT_UTC_OFFSET
+
+# Вебхук и воркеры работают с одним файлом; DB_PATH из окружения — для локальных прогонов
+DB_PATH = Path(os.getenv("DB_PATH") or Path(__file__).parent / "data" / "bot.db")
+
+# Одно соединение на процесс: открывается в init_db, закрывается в close_db.
+# sqlite3 кэширует подготовленные запросы на соединении, поэтому одинаковый SQL не компилируется заново
+_db: aiosqlite.Connection | None = None
+
+
+# Настройки пользователей в памяти; update_* пишут в SQLite и сразу обновляют кэш
+_users = TTLCache(max_items=USER_CACHE_MAX_ITEMS)
+
+
+def _get_db() -> aiosqlite.Connection:
+    if _db is None:
+        raise RuntimeError("База данных не открыта — сначала вызови init_db()")
+    return _db
 
 
 async def init_db():
-    """Инициализация базы данных"""
+    """Инициализация базы данных и открытие общего соединения"""
+    global _db
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                enabled_topics TEXT DEFAULT '[]',
-                custom_topics TEXT DEFAULT '[]',
-                language_level TEXT DEFAULT 'medium',
-                reading_time INTEGER DEFAULT 7,
-                digest_lang TEXT DEFAULT 'ru',
-                last_viewed_at TIMESTAMP,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        # Миграция: добавляем колонку если её нет
+    if _db is None:
+        _db = await aiosqlite.connect(DB_PATH)
+        _db.row_factory = aiosqlite.Row
+        # WAL: чтения не блокируются записью; NORMAL в WAL-режиме безопасен и не делает fsync на каждый commit
+        await run_closed(_db.execute("PRAGMA journal_mode=WAL"))
+        await run_closed(_db.execute("PRAGMA synchronous=NORMAL"))
+        await run_closed(_db.execute("PRAGMA busy_timeout=5000"))
+    db = _db
+    await run_closed(db.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            enabled_topics TEXT DEFAULT '[]',
+            custom_topics TEXT DEFAULT '[]',
+            language_level TEXT DEFAULT 'medium',
+            reading_time INTEGER DEFAULT 7,
+            digest_lang TEXT DEFAULT 'ru',
+            last_viewed_at TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """))
+    # Миграция: добавляем колонку если её нет
+    try:
+        await run_closed(db.execute("ALTER TABLE users ADD COLUMN last_viewed_at TIMESTAMP"))
+    except Exception:
+        pass  # Колонка уже существует
+
+    # Расписание рассылки: локальное время HH:MM, смещение от UTC в минутах,
+    # минута суток по UTC (для выборки по индексу) и время последней рассылки
+    for column in (
+        "delivery_time TEXT",
+        f"utc_offset INTEGER DEFAULT {PUSH_DEFAULT_UTC_OFFSET}",
+        "delivery_minute INTEGER",
+        "last_push_at TIMESTAMP",
+    ):
         try:
-            await db.execute("ALTER TABLE users ADD COLUMN last_viewed_at TIMESTAMP")
+            await run_closed(db.execute(f"ALTER TABLE users ADD COLUMN {column}"))
         except Exception:
             pass  # Колонка уже существует
-        await db.commit()
+    await run_closed(db.execute("CREATE INDEX IF NOT EXISTS idx_users_delivery ON users(delivery_minute)"))
+
+    # Хранилище статей: общее для всех пользователей, с полнотекстовым индексом
+    await run_closed(db.execute("""
+        CREATE TABLE IF NOT EXISTS articles (
+            id INTEGER PRIMARY KEY,
+            url TEXT UNIQUE NOT NULL,
+            title TEXT,
+            text TEXT,
+            source TEXT,
+            topic TEXT,
+            lang TEXT,
+            published_at TIMESTAMP,
+            fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """))
+    await run_closed(db.execute("CREATE INDEX IF NOT EXISTS idx_articles_published ON articles(published_at)"))
+    await run_closed(db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_articles_topic ON articles(topic, lang, published_at)"
+    ))
+    await run_closed(db.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+            title, text, content='articles', content_rowid='id'
+        )
+    """))
+    # Триггеры держат FTS-индекс в синхронизации с таблицей
+    await run_closed(db.executescript("""
+        CREATE TRIGGER IF NOT EXISTS articles_ai AFTER INSERT ON articles BEGIN
+            INSERT INTO articles_fts(rowid, title, text) VALUES (new.id, new.title, new.text);
+        END;
+        CREATE TRIGGER IF NOT EXISTS articles_ad AFTER DELETE ON articles BEGIN
+            INSERT INTO articles_fts(articles_fts, rowid, title, text)
+            VALUES ('delete', old.id, old.title, old.text);
+        END;
+        CREATE TRIGGER IF NOT EXISTS articles_au AFTER UPDATE ON articles BEGIN
+            INSERT INTO articles_fts(articles_fts, rowid, title, text)
+            VALUES ('delete', old.id, old.title, old.text);
+            INSERT INTO articles_fts(rowid, title, text) VALUES (new.id, new.title, new.text);
+        END;
+    """))
+    # Когда тема последний раз полностью обновлялась фоновым прогревом
+    await run_closed(db.execute("""
+        CREATE TABLE IF NOT EXISTS topic_refreshes (
+            topic TEXT NOT NULL,
+            lang TEXT NOT NULL,
+            refreshed_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (topic, lang)
+        )
+    """))
+
+    # RSS/Atom: валидаторы для условных запросов и уже виденные записи лент
+    await run_closed(db.execute("""
+        CREATE TABLE IF NOT EXISTS feeds (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            polled_at TIMESTAMP
+        )
+    """))
+    await run_closed(db.execute("""
+        CREATE TABLE IF NOT EXISTS feed_entries (
+            feed_url TEXT NOT NULL,
+            guid TEXT NOT NULL,
+            seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (feed_url, guid)
+        )
+    """))
+
+    # Очередь дайджестов между процессом вебхука и процессами-воркерами
+    await run_closed(db.execute("""
+        CREATE TABLE IF NOT EXISTS digest_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            chat_id INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            worker TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP
+        )
+    """))
+    await run_closed(db.execute("CREATE INDEX IF NOT EXISTS idx_digest_jobs_status ON digest_jobs(status, id)"))
+    # Один дайджест на пользователя в очереди или в работе
+    await run_closed(db.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_digest_jobs_user ON digest_jobs(user_id) "
+        "WHERE status IN ('queued', 'running')"
+    ))
+
+    # Статьи, уже показанные пользователю: 64-битный хэш URL, чистятся вместе со старыми статьями
+    await run_closed(db.execute("""
+        CREATE TABLE IF NOT EXISTS seen_articles (
+            user_id INTEGER NOT NULL,
+            hash INTEGER NOT NULL,
+            seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, hash)
+        ) WITHOUT ROWID
+    """))
+    await run_closed(db.execute("CREATE INDEX IF NOT EXISTS idx_seen_articles_seen_at ON seen_articles(seen_at)"))
+
+    # Состояния диалогов aiogram FSM (fsm.py): переживают перезапуск, просроченные чистятся
+    await run_closed(db.execute("""
+        CREATE TABLE IF NOT EXISTS fsm_states (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT NOT NULL DEFAULT '{}',
+            expires_at TIMESTAMP NOT NULL
+        )
+    """))
+    await run_closed(db.execute("CREATE INDEX IF NOT EXISTS idx_fsm_states_expires ON fsm_states(expires_at)"))
+    await db.commit()
+
+
+async def close_db():
+    """Закрыть общее соединение"""
+    global _db
+    if _db is not None:
+        await _db.close()
+        _db = None
+
+
+def to_db_timestamp(value: datetime) -> str:
+    """datetime → строка в формате CURRENT_TIMESTAMP (UTC), чтобы сравнения в SQL были корректны"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _copy_user(user: dict) -> dict:
+    # Хэндлеры меняют списки тем на месте — кэш от этого защищаем копией
+    return dict(user, enabled_topics=list(user["enabled_topics"]), custom_topics=list(user["custom_topics"]))
+
+
+def _update_cached(user_id: int, **fields):
+    user = _users.peek(user_id)
+    if user is not None:
+        user.update(fields)
+
+
+def user_cache_stats() -> dict:
+    """Размер и hit ratio кэша настроек пользователей"""
+    return _users.stats()
+
+
+def _user_from_row(row: aiosqlite.Row) -> dict:
+    return {
+        "user_id": row["user_id"],
+        "enabled_topics": json.loads(row["enabled_topics"]),
+        "custom_topics": json.loads(row["custom_topics"]),
+        "language_level": row["language_level"],
+        "reading_time": row["reading_time"],
+        "digest_lang": row["digest_lang"],
+        "last_viewed_at": row["last_viewed_at"],
+        "delivery_time": row["delivery_time"],
+        "utc_offset": row["utc_offset"],
+    }
 
 
 async def get_user(user_id: int) -> dict | None:
     """Получить настройки пользователя"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute("SELECT * FROM users WHERE user_id = ?", (user_id,)) as cursor:
-            row = await cursor.fetchone()
-            if row:
-                return {
-                    "user_id": row["user_id"],
-                    "enabled_topics": json.loads(row["enabled_topics"]),
-                    "custom_topics": json.loads(row["custom_topics"]),
-                    "language_level": row["language_level"],
-                    "reading_time": row["reading_time"],
-                    "digest_lang": row["digest_lang"],
-                    "last_viewed_at": row["last_viewed_at"],
-                }
+    user = _users.get(user_id)
+    if user is not None:
+        return _copy_user(user)
+
+    db = _get_db()
+    async with db.execute("SELECT * FROM users WHERE user_id = ?", (user_id,)) as cursor:
+        row = await cursor.fetchone()
+        if row:
+            user = _user_from_row(row)
+            _users.set(user_id, user)
+            return _copy_user(user)
     return None
 
 
@@ -55,80 +249,432 @@ async def ensure_user(user_id: int) -> dict:
     user = await get_user(user_id)
     if user:
         return user
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "INSERT OR IGNORE INTO users (user_id) VALUES (?)",
-            (user_id,)
-        )
-        await db.commit()
+    db = _get_db()
+    await run_closed(db.execute(
+        "INSERT OR IGNORE INTO users (user_id) VALUES (?)",
+        (user_id,)
+    ))
+    await db.commit()
     return await get_user(user_id)
 
 
 async def update_enabled_topics(user_id: int, topics: list):
     """Обновить список включённых тем"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "UPDATE users SET enabled_topics = ? WHERE user_id = ?",
-            (json.dumps(topics, ensure_ascii=False), user_id)
-        )
-        await db.commit()
+    db = _get_db()
+    await run_closed(db.execute(
+        "UPDATE users SET enabled_topics = ? WHERE user_id = ?",
+        (json.dumps(topics, ensure_ascii=False), user_id)
+    ))
+    await db.commit()
+    _update_cached(user_id, enabled_topics=list(topics))
 
 
 async def update_custom_topics(user_id: int, topics: list):
     """Обновить кастомные темы"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "UPDATE users SET custom_topics = ? WHERE user_id = ?",
-            (json.dumps(topics, ensure_ascii=False), user_id)
-        )
-        await db.commit()
+    db = _get_db()
+    await run_closed(db.execute(
+        "UPDATE users SET custom_topics = ? WHERE user_id = ?",
+        (json.dumps(topics, ensure_ascii=False), user_id)
+    ))
+    await db.commit()
+    _update_cached(user_id, custom_topics=list(topics))
 
 
 async def update_language_level(user_id: int, level: str):
     """Обновить уровень сложности языка"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "UPDATE users SET language_level = ? WHERE user_id = ?",
-            (level, user_id)
-        )
-        await db.commit()
+    db = _get_db()
+    await run_closed(db.execute(
+        "UPDATE users SET language_level = ? WHERE user_id = ?",
+        (level, user_id)
+    ))
+    await db.commit()
+    _update_cached(user_id, language_level=level)
 
 
 async def update_reading_time(user_id: int, minutes: int):
     """Обновить время чтения"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "UPDATE users SET reading_time = ? WHERE user_id = ?",
-            (minutes, user_id)
-        )
-        await db.commit()
+    db = _get_db()
+    await run_closed(db.execute(
+        "UPDATE users SET reading_time = ? WHERE user_id = ?",
+        (minutes, user_id)
+    ))
+    await db.commit()
+    _update_cached(user_id, reading_time=minutes)
 
 
 async def update_digest_lang(user_id: int, lang: str):
     """Обновить язык дайджеста"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "UPDATE users SET digest_lang = ? WHERE user_id = ?",
-            (lang, user_id)
-        )
-        await db.commit()
+    db = _get_db()
+    await run_closed(db.execute(
+        "UPDATE users SET digest_lang = ? WHERE user_id = ?",
+        (lang, user_id)
+    ))
+    await db.commit()
+    _update_cached(user_id, digest_lang=lang)
 
 
 async def update_last_viewed(user_id: int):
     """Обновить время последнего просмотра новостей"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "UPDATE users SET last_viewed_at = CURRENT_TIMESTAMP WHERE user_id = ?",
-            (user_id,)
-        )
-        await db.commit()
+    # Время считаем здесь, а не CURRENT_TIMESTAMP в SQL — чтобы то же значение попало в кэш
+    now = to_db_timestamp(datetime.now(timezone.utc))
+    db = _get_db()
+    await run_closed(db.execute(
+        "UPDATE users SET last_viewed_at = ? WHERE user_id = ?",
+        (now, user_id)
+    ))
+    await db.commit()
+    _update_cached(user_id, last_viewed_at=now)
+
+
+async def get_last_viewed(user_id: int) -> str | None:
+    """Время последнего просмотра прямо из БД, мимо кэша: его пишут и другие процессы"""
+    db = _get_db()
+    async with db.execute("SELECT last_viewed_at FROM users WHERE user_id = ?", (user_id,)) as cursor:
+        row = await cursor.fetchone()
+    return row[0] if row else None
 
 
 async def reset_last_viewed(user_id: int):
-    """Сбросить время последнего просмотра (получать все новости)"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "UPDATE users SET last_viewed_at = NULL WHERE user_id = ?",
-            (user_id,)
+    """Сбросить время последнего просмотра и список показанных статей (получать все новости)"""
+    db = _get_db()
+    await run_closed(db.execute(
+        "UPDATE users SET last_viewed_at = NULL WHERE user_id = ?",
+        (user_id,)
+    ))
+    await run_closed(db.execute("DELETE FROM seen_articles WHERE user_id = ?", (user_id,)))
+    await db.commit()
+    _update_cached(user_id, last_viewed_at=None)
+
+
+async def update_delivery_time(user_id: int, delivery_time: str | None, utc_offset: int):
+    """Обновить время ежедневной рассылки (HH:MM по местному времени, None — выключить)"""
+    delivery_minute = None
+    if delivery_time:
+        hours, minutes = map(int, delivery_time.split(":"))
+        delivery_minute = (hours * 60 + minutes - utc_offset) % (24 * 60)
+    db = _get_db()
+    await run_closed(db.execute(
+        "UPDATE users SET delivery_time = ?, utc_offset = ?, delivery_minute = ? WHERE user_id = ?",
+        (delivery_time, utc_offset, delivery_minute, user_id)
+    ))
+    await db.commit()
+    _update_cached(user_id, delivery_time=delivery_time, utc_offset=utc_offset)
+
+
+async def get_due_users(start_minute: int, end_minute: int, pushed_before: str) -> list[dict]:
+    """Пользователи с рассылкой в [start_minute, end_minute) минут суток UTC, ещё не получившие её"""
+    db = _get_db()
+    async with db.execute("""
+        SELECT * FROM users
+        WHERE delivery_minute >= ? AND delivery_minute < ?
+          AND (last_push_at IS NULL OR last_push_at < ?)
+    """, (start_minute, end_minute, pushed_before)) as cursor:
+        return [_user_from_row(row) for row in await cursor.fetchall()]
+
+
+async def mark_pushed(user_ids: list[int], pushed_at: str):
+    """Отметить, что рассылка отправлена"""
+    db = _get_db()
+    await run_closed(db.executemany(
+        "UPDATE users SET last_push_at = ?, last_viewed_at = ? WHERE user_id = ?",
+        [(pushed_at, pushed_at, user_id) for user_id in user_ids]
+    ))
+    await db.commit()
+    for user_id in user_ids:
+        _update_cached(user_id, last_viewed_at=pushed_at)
+
+
+async def get_popular_custom_topics(limit: int, min_users: int = 2) -> list[str]:
+    """Кастомные темы, которые есть у многих пользователей (для фонового прогрева)"""
+    db = _get_db()
+    async with db.execute("""
+        SELECT MIN(t.value), COUNT(*) AS cnt
+        FROM users, json_each(users.custom_topics) AS t
+        GROUP BY lower(t.value)  -- lower() в SQLite сворачивает только латиницу
+        HAVING cnt >= ?
+        ORDER BY cnt DESC
+        LIMIT ?
+    """, (min_users, limit)) as cursor:
+        return [row[0] for row in await cursor.fetchall()]
+
+
+def _article_from_row(row: aiosqlite.Row) -> dict:
+    return {
+        "title": row["title"],
+        "text": row["text"],
+        "url": row["url"],
+        "source": row["source"],
+        "topic": row["topic"],
+        "published_at": row["published_at"],
+    }
+
+
+async def save_articles(articles: list[dict], topic: str, lang: str):
+    """Сохранить статьи темы в хранилище (published_at — строка в формате to_db_timestamp или None)"""
+    if not articles:
+        return
+    now = to_db_timestamp(datetime.now(timezone.utc))
+    db = _get_db()
+    # Без даты публикации считаем статью опубликованной в момент загрузки,
+    # иначе она выпадает из индекса по published_at.
+    # Тема и язык остаются первыми: статья, найденная и по другой теме, не уходит из своей
+    await run_closed(db.executemany("""
+        INSERT INTO articles (url, title, text, source, topic, lang, published_at, fetched_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(url) DO UPDATE SET
+            title = excluded.title, text = excluded.text, fetched_at = excluded.fetched_at
+    """, [
+        (
+            art["url"], art["title"], art["text"], art["source"], topic.lower(), lang,
+            art.get("published_at") or now, now,
         )
-        await db.commit()
+        for art in articles
+    ]))
+    await db.commit()
+
+
+async def mark_topic_refreshed(topic: str, lang: str):
+    """Отметить, что тема только что полностью обновлена"""
+    db = _get_db()
+    await run_closed(db.execute(
+        "INSERT OR REPLACE INTO topic_refreshes (topic, lang, refreshed_at) VALUES (?, ?, CURRENT_TIMESTAMP)",
+        (topic.lower(), lang),
+    ))
+    await db.commit()
+
+
+async def get_topic_refreshed_at(topic: str, lang: str) -> str | None:
+    """Время последнего полного обновления темы"""
+    db = _get_db()
+    async with db.execute(
+        "SELECT refreshed_at FROM topic_refreshes WHERE topic = ? AND lang = ?",
+        (topic.lower(), lang),
+    ) as cursor:
+        row = await cursor.fetchone()
+        return row[0] if row else None
+
+
+async def get_recent_articles(topic: str, lang: str, since: str | None, limit: int) -> list[dict]:
+    """Свежие статьи темы, опубликованные после since (одним запросом по индексу)"""
+    db = _get_db()
+    async with db.execute("""
+        SELECT * FROM articles
+        WHERE topic = ? AND lang = ? AND published_at > ?
+        ORDER BY published_at DESC
+        LIMIT ?
+    """, (topic.lower(), lang, since or "", limit)) as cursor:
+        return [_article_from_row(row) for row in await cursor.fetchall()]
+
+
+async def search_articles(query: str, since: str, limit: int) -> list[dict]:
+    """Полнотекстовый поиск по уже загруженным статьям (FTS5)"""
+    # Каждое слово — в кавычках: пользовательский текст не должен ломать синтаксис FTS
+    terms = " ".join('"' + word.replace('"', '""') + '"' for word in query.split())
+    if not terms:
+        return []
+    db = _get_db()
+    async with db.execute("""
+        SELECT articles.* FROM articles_fts
+        JOIN articles ON articles.id = articles_fts.rowid
+        WHERE articles_fts MATCH ? AND articles.published_at > ?
+        ORDER BY articles_fts.rank
+        LIMIT ?
+    """, (terms, since, limit)) as cursor:
+        return [_article_from_row(row) for row in await cursor.fetchall()]
+
+
+async def prune_articles(older_than: str):
+    """Удалить статьи, загруженные раньше older_than, и такие же старые записи лент и показанных статей"""
+    db = _get_db()
+    await run_closed(db.execute("DELETE FROM articles WHERE fetched_at < ?", (older_than,)))
+    await run_closed(db.execute("DELETE FROM feed_entries WHERE seen_at < ?", (older_than,)))
+    await run_closed(db.execute("DELETE FROM seen_articles WHERE seen_at < ?", (older_than,)))
+    await db.commit()
+
+
+async def get_feed_validators(url: str) -> tuple[str | None, str | None]:
+    """ETag и Last-Modified последнего ответа ленты"""
+    db = _get_db()
+    async with db.execute("SELECT etag, last_modified FROM feeds WHERE url = ?", (url,)) as cursor:
+        row = await cursor.fetchone()
+    return (row["etag"], row["last_modified"]) if row else (None, None)
+
+
+async def save_feed_validators(url: str, etag: str | None, last_modified: str | None):
+    db = _get_db()
+    await run_closed(db.execute(
+        "INSERT OR REPLACE INTO feeds (url, etag, last_modified, polled_at) VALUES (?, ?, ?, CURRENT_TIMESTAMP)",
+        (url, etag, last_modified),
+    ))
+    await db.commit()
+
+
+async def filter_new_entries(feed_url: str, guids: list[str]) -> set[str]:
+    """GUID записей ленты, которых ещё не было"""
+    if not guids:
+        return set()
+    db = _get_db()
+    placeholders = ",".join("?" * len(guids))
+    async with db.execute(
+        f"SELECT guid FROM feed_entries WHERE feed_url = ? AND guid IN ({placeholders})",
+        (feed_url, *guids),
+    ) as cursor:
+        seen = {row["guid"] for row in await cursor.fetchall()}
+    return set(guids) - seen
+
+
+async def get_seen_articles(user_id: int, hashes: list[int]) -> set[int]:
+    """Какие из хэшей статей пользователь уже видел в дайджестах"""
+    if not hashes:
+        return set()
+    db = _get_db()
+    placeholders = ",".join("?" * len(hashes))
+    async with db.execute(
+        f"SELECT hash FROM seen_articles WHERE user_id = ? AND hash IN ({placeholders})",
+        (user_id, *hashes),
+    ) as cursor:
+        return {row["hash"] for row in await cursor.fetchall()}
+
+
+async def mark_articles_seen(user_id: int, hashes: list[int]):
+    """Запомнить показанные статьи; повторный показ продлевает срок хранения"""
+    if not hashes:
+        return
+    db = _get_db()
+    await run_closed(db.executemany(
+        "INSERT INTO seen_articles (user_id, hash) VALUES (?, ?) "
+        "ON CONFLICT(user_id, hash) DO UPDATE SET seen_at = CURRENT_TIMESTAMP",
+        [(user_id, h) for h in hashes],
+    ))
+    await db.commit()
+
+
+async def mark_entries_seen(feed_url: str, guids: list[str]):
+    if not guids:
+        return
+    db = _get_db()
+    await run_closed(db.executemany(
+        "INSERT OR IGNORE INTO feed_entries (feed_url, guid) VALUES (?, ?)",
+        [(feed_url, guid) for guid in guids],
+    ))
+    await db.commit()
+
+
+async def enqueue_job(user_id: int, chat_id: int, message_id: int, payload: dict) -> int | None:
+    """Поставить дайджест в общую очередь; None — у пользователя уже есть задача"""
+    db = _get_db()
+    # Дубль не бросает IntegrityError: rollback общего соединения снёс бы чужие незакоммиченные записи
+    async with db.execute(
+        "INSERT INTO digest_jobs (user_id, chat_id, message_id, payload) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT DO NOTHING",
+        (user_id, chat_id, message_id, json.dumps(payload, ensure_ascii=False)),
+    ) as cursor:
+        job_id = cursor.lastrowid if cursor.rowcount else None
+    await db.commit()
+    return job_id
+
+
+async def count_jobs() -> dict[str, int]:
+    """Задач в очереди и в работе"""
+    db = _get_db()
+    async with db.execute("SELECT status, COUNT(*) FROM digest_jobs GROUP BY status") as cursor:
+        counts = {row[0]: row[1] for row in await cursor.fetchall()}
+    return {"queued": counts.get("queued", 0), "running": counts.get("running", 0)}
+
+
+async def has_job(user_id: int) -> bool:
+    """Есть ли у пользователя задача в очереди или в работе"""
+    db = _get_db()
+    async with db.execute(
+        "SELECT 1 FROM digest_jobs WHERE user_id = ? AND status IN ('queued', 'running')", (user_id,)
+    ) as cursor:
+        return await cursor.fetchone() is not None
+
+
+async def claim_job(worker: str) -> dict | None:
+    """Забрать самую старую задачу из очереди (атомарно: один UPDATE ... RETURNING)"""
+    db = _get_db()
+    # execute_fetchall — за один заход в поток: незакрытый UPDATE ... RETURNING
+    # не даст другим корутинам сделать commit на этом соединении
+    rows = await db.execute_fetchall("""
+        UPDATE digest_jobs
+        SET status = 'running', worker = ?, started_at = CURRENT_TIMESTAMP, attempts = attempts + 1
+        WHERE id = (SELECT id FROM digest_jobs WHERE status = 'queued' ORDER BY id LIMIT 1)
+        RETURNING id, user_id, chat_id, message_id, payload, attempts
+    """, (worker,))
+    await db.commit()
+    if not rows:
+        return None
+    job = dict(rows[0])
+    job["payload"] = json.loads(job["payload"])
+    return job
+
+
+async def finish_job(job_id: int):
+    db = _get_db()
+    await run_closed(db.execute("DELETE FROM digest_jobs WHERE id = ?", (job_id,)))
+    await db.commit()
+
+
+async def release_jobs(worker: str):
+    """Вернуть в очередь незаконченные задачи воркера (он останавливается)"""
+    db = _get_db()
+    await run_closed(db.execute(
+        "UPDATE digest_jobs SET status = 'queued', worker = NULL WHERE status = 'running' AND worker = ?",
+        (worker,),
+    ))
+    await db.commit()
+
+
+async def recover_stale_jobs(started_before: str, max_attempts: int) -> int:
+    """Задачи упавших воркеров: вернуть в очередь, а исчерпавшие попытки — удалить.
+
+    Возвращает число удалённых задач.
+    """
+    db = _get_db()
+    await run_closed(db.execute("""
+        UPDATE digest_jobs SET status = 'queued', worker = NULL
+        WHERE status = 'running' AND started_at < ? AND attempts < ?
+    """, (started_before, max_attempts)))
+    async with db.execute(
+        "DELETE FROM digest_jobs WHERE status = 'running' AND started_at < ?", (started_before,)
+    ) as cursor:
+        dropped = cursor.rowcount
+    await db.commit()
+    return dropped
+
+
+async def get_fsm(key: str) -> tuple[str | None, dict, float] | None:
+    """Состояние, данные и сколько секунд им осталось жить; None — нет или просрочено"""
+    db = _get_db()
+    async with db.execute(
+        "SELECT state, data, (julianday(expires_at) - julianday('now')) * 86400 FROM fsm_states "
+        "WHERE key = ? AND expires_at > CURRENT_TIMESTAMP",
+        (key,),
+    ) as cursor:
+        row = await cursor.fetchone()
+    return (row[0], json.loads(row[1]), row[2]) if row else None
+
+
+async def set_fsm(key: str, state: str | None, data: dict, expires_at: str):
+    """Записать состояние целиком; пустое состояние без данных удаляется"""
+    db = _get_db()
+    if state is None and not data:
+        await run_closed(db.execute("DELETE FROM fsm_states WHERE key = ?", (key,)))
+    else:
+        await run_closed(db.execute(
+            "INSERT INTO fsm_states (key, state, data, expires_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET state = excluded.state, data = excluded.data, "
+            "expires_at = excluded.expires_at",
+            (key, state, json.dumps(data, ensure_ascii=False), expires_at),
+        ))
+    await db.commit()
+
+
+async def prune_fsm() -> int:
+    """Удалить просроченные состояния; возвращает их число"""
+    db = _get_db()
+    async with db.execute("DELETE FROM fsm_states WHERE expires_at <= CURRENT_TIMESTAMP") as cursor:
+        deleted = cursor.rowcount
+    await db.commit()
+    return deleted
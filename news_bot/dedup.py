@@ -0,0 +1,101 @@
+"""Кластеризация почти одинаковых статей (MinHash + LSH на NumPy)
+
+Одна и та же новость из десяти изданий превращается в одну статью-представителя,
+а остальные источники прикрепляются к ней списком URL.
+"""
+
+import re
+
+import numpy as np
+
+from config import DEDUP_THRESHOLD, DEDUP_NUM_PERM, DEDUP_BANDS, DEDUP_SHINGLE_SIZE, DEDUP_TEXT_CHARS
+
+_MASK = np.uint64((1 << 32) - 1)
+_WORD_RE = re.compile(r"\w+")
+
+# Каждая «перестановка» MinHash — перемешивание splitmix64 со своим сидом
+_SEEDS = np.random.default_rng(42).integers(0, 1 << 63, size=DEDUP_NUM_PERM, dtype=np.uint64)
+
+
+def _mix64(x: np.ndarray) -> np.ndarray:
+    """splitmix64: равномерно перемешивает все 64 бита (переполнение uint64 здесь — часть алгоритма)"""
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def shingle_hashes(text: str, size: int = DEDUP_SHINGLE_SIZE) -> np.ndarray:
+    """32-битные хэши словесных n-грамм текста"""
+    words = _WORD_RE.findall(text.lower())
+    if not words:
+        return np.zeros(1, dtype=np.uint64)
+    # hash() случаен между процессами, но внутри одного запуска стабилен — этого достаточно
+    ids = np.fromiter((hash(w) & 0xFFFFFFFF for w in words), dtype=np.uint64, count=len(words))
+    if len(ids) < size:
+        return np.unique(ids)
+    shingles = np.zeros(len(ids) - size + 1, dtype=np.uint64)
+    for offset in range(size):
+        shingles = (shingles * np.uint64(1000003) + ids[offset:len(ids) - size + 1 + offset]) & _MASK
+    return np.unique(shingles)
+
+
+def minhash_signatures(texts: list[str]) -> np.ndarray:
+    """Матрица MinHash-сигнатур (статьи × перестановки)"""
+    signatures = np.empty((len(texts), DEDUP_NUM_PERM), dtype=np.uint64)
+    for i, text in enumerate(texts):
+        shingles = shingle_hashes(text)
+        # Все перестановки сразу: матрица (перестановки × шинглы), минимум по строкам
+        signatures[i] = _mix64(_SEEDS[:, None] ^ shingles[None, :]).min(axis=1)
+    return signatures
+
+
+def find_clusters(signatures: np.ndarray, threshold: float = DEDUP_THRESHOLD, bands: int = DEDUP_BANDS) -> list[int]:
+    """Номер кластера для каждой статьи: LSH по полосам сигнатуры + проверка оценки Жаккара"""
+    n = len(signatures)
+    parent = list(range(n))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    rows = signatures.shape[1] // bands
+    for band in range(bands):
+        buckets: dict[bytes, list[int]] = {}
+        chunk = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+        for i in range(n):
+            buckets.setdefault(chunk[i].tobytes(), []).append(i)
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            first = members[0]
+            # Кандидатов сверяем векторно: доля совпавших хэшей ≈ сходство по Жаккару
+            similarity = (signatures[members[1:]] == signatures[first]).mean(axis=1)
+            for other, sim in zip(members[1:], similarity):
+                if sim >= threshold:
+                    parent[find(other)] = find(first)
+
+    return [find(i) for i in range(n)]
+
+
+def cluster_articles(articles: list[dict]) -> list[dict]:
+    """Оставить по одной статье на кластер; URL остальных — в extra_sources представителя"""
+    if len(articles) < 2:
+        return articles
+
+    texts = [f"{art['title']} {art['text'][:DEDUP_TEXT_CHARS]}" for art in articles]
+    labels = find_clusters(minhash_signatures(texts))
+
+    representatives: dict[int, dict] = {}
+    result = []
+    for art, label in zip(articles, labels):
+        rep = representatives.get(label)
+        if rep is None:
+            # Первая статья кластера — представитель: порядок тем сохраняется
+            rep = dict(art)
+            representatives[label] = rep
+            result.append(rep)
+        else:
+            rep.setdefault("extra_sources", []).append(art["url"])
+    return result
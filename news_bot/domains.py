@@ -0,0 +1,158 @@
+"""Здоровье сайтов-источников: token bucket и circuit breaker на домен
+
+Домен, который раз за разом отвечает ошибкой, таймаутом или пейволом, на время
+выключается, и слоты загрузки достаются живым источникам.
+"""
+
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from urllib.parse import urlparse
+
+from cache import TTLCache
+from config import (
+    DOMAIN_RATE, DOMAIN_BURST, DOMAIN_WINDOW, DOMAIN_MIN_REQUESTS, DOMAIN_FAILURE_RATIO,
+    DOMAIN_COOLDOWN, DOMAIN_MAX_COOLDOWN, DOMAIN_MAX_TRACKED,
+)
+from ratelimit import Clock, TokenBucket
+
+logger = logging.getLogger(__name__)
+
+OUTCOMES = ("ok", "error", "timeout", "paywall", "empty")
+
+
+def domain_of(url: str) -> str:
+    host = (urlparse(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+@dataclass
+class DomainState:
+    bucket: TokenBucket
+    recent: deque = field(default_factory=lambda: deque(maxlen=DOMAIN_WINDOW))  # True — успех
+    counts: dict = field(default_factory=lambda: dict.fromkeys(OUTCOMES, 0))
+    skipped: int = 0
+    trips: int = 0  # сколько раз подряд размыкался
+    open_until: float | None = None
+    probing: bool = False  # после паузы пропускаем один пробный запрос
+    total_seconds: float = 0.0
+
+
+class DomainGuard:
+    """Лимит запросов и автомат-выключатель для каждого домена.
+
+    Перед загрузкой — allow() и acquire(), после — record() с исходом
+    (или release(), если запрос отменили).
+    """
+
+    def __init__(
+        self,
+        rate: float = DOMAIN_RATE,
+        burst: float = DOMAIN_BURST,
+        min_requests: int = DOMAIN_MIN_REQUESTS,
+        failure_ratio: float = DOMAIN_FAILURE_RATIO,
+        cooldown: float = DOMAIN_COOLDOWN,
+        max_cooldown: float = DOMAIN_MAX_COOLDOWN,
+        clock: Clock | None = None,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.min_requests = min_requests
+        self.failure_ratio = failure_ratio
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.clock = clock or Clock()
+        self._domains = TTLCache(max_items=DOMAIN_MAX_TRACKED)
+        self.opened = 0
+
+    def _state(self, domain: str) -> DomainState:
+        state = self._domains.peek(domain)
+        if state is None:
+            state = DomainState(TokenBucket(self.rate, self.burst, self.clock))
+            self._domains.set(domain, state)
+        return state
+
+    def available(self, domain: str) -> bool:
+        """Можно ли сейчас отдавать домену слот (без побочных эффектов)"""
+        state = self._domains.peek(domain)
+        if state is None or state.open_until is None:
+            return True
+        return state.open_until <= self.clock.monotonic() and not state.probing
+
+    def allow(self, domain: str) -> bool:
+        """Пропустить запрос к домену; после паузы пропускается ровно один пробный"""
+        state = self._state(domain)
+        if state.open_until is None:
+            return True
+        if state.open_until <= self.clock.monotonic() and not state.probing:
+            state.probing = True
+            return True
+        state.skipped += 1
+        return False
+
+    async def acquire(self, domain: str):
+        await self._state(domain).bucket.acquire()
+
+    def record(self, domain: str, outcome: str, seconds: float = 0.0):
+        state = self._state(domain)
+        state.counts[outcome] += 1
+        state.total_seconds += seconds
+        ok = outcome == "ok"
+        state.recent.append(ok)
+
+        if state.probing:
+            state.probing = False
+            if ok:
+                state.open_until, state.trips = None, 0
+                state.recent.clear()
+                logger.info(f"Домен {domain} снова доступен")
+            else:
+                self._open(domain, state)
+            return
+
+        failures = state.recent.count(False)
+        if (not ok and len(state.recent) >= self.min_requests
+                and failures / len(state.recent) >= self.failure_ratio):
+            self._open(domain, state)
+
+    def release(self, domain: str):
+        """Запрос отменён, исхода нет: пробный слот снова свободен"""
+        state = self._domains.peek(domain)
+        if state is not None:
+            state.probing = False
+
+    def _open(self, domain: str, state: DomainState):
+        state.trips += 1
+        pause = min(self.cooldown * 2 ** (state.trips - 1), self.max_cooldown)
+        state.open_until = self.clock.monotonic() + pause
+        state.recent.clear()
+        self.opened += 1
+        logger.info(f"Домен {domain} отключён на {pause:.0f} с (срабатывание {state.trips})")
+
+    def domain_stats(self, domain: str) -> dict:
+        state = self._domains.peek(domain)
+        if state is None:
+            return {}
+        requests = sum(state.counts.values())
+        return {
+            **state.counts,
+            "skipped": state.skipped,
+            "open": not self.available(domain),
+            "avg_ms": round(state.total_seconds / requests * 1000) if requests else 0,
+        }
+
+    def stats(self, top: int = 10) -> dict:
+        """Сводка и домены с наибольшим числом неудач"""
+        states = self._domains.items()
+        now = self.clock.monotonic()
+
+        def failures(state: DomainState) -> int:
+            return sum(state.counts.values()) - state.counts["ok"]
+
+        worst = sorted(states, key=lambda item: -failures(item[1]))[:top]
+        return {
+            "tracked": len(states),
+            "open": sum(1 for _, s in states if s.open_until is not None and s.open_until > now),
+            "opened_total": self.opened,
+            "worst": {domain: self.domain_stats(domain) for domain, state in worst if failures(state)},
+        }
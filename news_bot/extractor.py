@@ -0,0 +1,212 @@
+"""Извлечение текста статей из HTML в пуле процессов (вне event loop бота)"""
+
+import asyncio
+import logging
+import multiprocessing
+import signal
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from lxml import html as lxml_html
+from newspaper import Article
+
+from config import MAX_ARTICLE_LENGTH
+
+logger = logging.getLogger(__name__)
+
+MIN_TEXT_LENGTH = 100
+# Блоки, внутри которых обычно нет текста статьи
+SKIP_TAGS = ("script", "style", "noscript", "nav", "header", "footer", "aside", "form")
+
+
+def extract_newspaper(url: str, html: str) -> tuple[str, str]:
+    """Заголовок и текст через newspaper3k (точнее, но медленнее)"""
+    article = Article(url)
+    article.download(input_html=html)
+    article.parse()
+    return article.title, article.text
+
+
+def extract_lxml(url: str, html: str) -> tuple[str, str]:
+    """Быстрый путь на чистом lxml: og:title/<title> + абзацы из <article> или <body>"""
+    tree = lxml_html.fromstring(html)
+    for bad in tree.iter(*SKIP_TAGS):
+        bad.drop_tree()
+
+    title = tree.xpath("string(//meta[@property='og:title']/@content)") or tree.findtext(".//title") or ""
+
+    root = tree.find(".//article")
+    if root is None:
+        root = tree.find(".//body")
+    if root is None:
+        root = tree
+
+    paragraphs = []
+    for p in root.iter("p"):
+        text = " ".join(p.text_content().split())
+        if len(text) >= 40:
+            paragraphs.append(text)
+    return title.strip(), "\n\n".join(paragraphs)
+
+
+EXTRACTORS = {
+    "newspaper": extract_newspaper,
+    "lxml": extract_lxml,
+}
+
+
+def _cpu_timeout(signum, frame):
+    raise TimeoutError("превышен лимит CPU на статью")
+
+
+def extract_article(url: str, html: str, method: str = "newspaper", cpu_timeout: float = 0) -> dict | None:
+    """Распарсить статью (выполняется в процессе пула)"""
+    # SIGPROF считает именно процессорное время, а не ожидание в очереди
+    use_timer = cpu_timeout > 0 and hasattr(signal, "setitimer")
+    if use_timer:
+        signal.signal(signal.SIGPROF, _cpu_timeout)
+        signal.setitimer(signal.ITIMER_PROF, cpu_timeout)
+    try:
+        title, text = EXTRACTORS[method](url, html)
+    finally:
+        if use_timer:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+
+    text = text.strip()
+    if len(text) < MIN_TEXT_LENGTH:
+        return None
+
+    return {
+        "title": title or "Без заголовка",
+        "text": text[:MAX_ARTICLE_LENGTH],
+        "url": url,
+        "source": url.split("/")[2] if "/" in url else url,
+    }
+
+
+def extract_article_timed(
+    url: str, html: str, method: str = "newspaper", cpu_timeout: float = 0
+) -> tuple[dict | None, float]:
+    """extract_article и потраченное на неё процессорное время (секунды)"""
+    start = time.thread_time()
+    article = extract_article(url, html, method, cpu_timeout)
+    return article, time.thread_time() - start
+
+
+class ExtractorRejected(Exception):
+    """Статью не разобрали по нашей причине: очередь пула переполнена или превышен лимит CPU"""
+
+
+class ExtractorPool:
+    """Ограниченный пул процессов для парсинга HTML.
+
+    workers=0 — парсинг прямо в event loop (как раньше, удобно для отладки).
+    Если в очереди уже max_pending статей, новые отбрасываются, а не копятся в памяти:
+    extract бросает ExtractorRejected (как и при превышении лимита CPU), чтобы это
+    не считалось ошибкой сайта.
+    Если процесс пула умер (OOM, сегфолт в lxml), extract пробрасывает BrokenProcessPool,
+    а следующий вызов поднимает новый пул.
+    on_cpu получает процессорное время каждого разбора (для метрик).
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        max_pending: int,
+        cpu_timeout: float,
+        method: str = "newspaper",
+        on_cpu: Callable[[float], None] | None = None,
+    ):
+        if method not in EXTRACTORS:
+            raise ValueError(f"Неизвестный экстрактор: {method}")
+        self.workers = workers
+        self.max_pending = max_pending
+        self.cpu_timeout = cpu_timeout
+        self.method = method
+        self.on_cpu = on_cpu
+        self._executor: ProcessPoolExecutor | None = None
+        self.pending = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.broken = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: форк процесса с запущенным event loop и потоками aiosqlite небезопасен
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def extract(self, url: str, html: str) -> dict | None:
+        if self.workers <= 0:
+            article, cpu = extract_article_timed(url, html, self.method)
+            return self._done(article, cpu)
+
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            logger.warning(f"Очередь парсинга переполнена, пропускаю {url}")
+            raise ExtractorRejected("очередь парсинга переполнена")
+
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            executor = self._get_executor()
+            future = loop.run_in_executor(
+                executor, extract_article_timed, url, html, self.method, self.cpu_timeout
+            )
+            try:
+                return self._done(*await future)
+            except TimeoutError:
+                self.timeouts += 1
+                logger.debug(f"Парсинг {url} превысил {self.cpu_timeout} с CPU")
+                raise ExtractorRejected(f"превышен лимит CPU {self.cpu_timeout} с")
+            except BrokenProcessPool:
+                self._drop_broken(executor)
+                raise
+        finally:
+            self.pending -= 1
+
+    async def warm_up(self):
+        """Поднять процессы пула заранее: spawn и импорт newspaper занимают секунды,
+        и без прогрева их ждал бы первый дайджест процесса"""
+        if self.workers <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        await asyncio.gather(*(
+            loop.run_in_executor(executor, extract_article_timed, "", "<p>-</p>", "lxml") for _ in range(self.workers)
+        ))
+
+    def _done(self, article: dict | None, cpu: float) -> dict | None:
+        if self.on_cpu is not None:
+            self.on_cpu(cpu)
+        return article
+
+    def _drop_broken(self, executor: ProcessPoolExecutor):
+        # Сломанный пул отклоняет все задачи: выбрасываем его, _get_executor поднимет новый.
+        # Ошибку получат все статьи, ждавшие в нём, — пересоздаёт пул только первая
+        if self._executor is not executor:
+            return
+        self.broken += 1
+        logger.warning("Пул парсинга сломан (процесс умер), пересоздаю")
+        executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "method": self.method,
+            "pending": self.pending,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "broken": self.broken,
+        }
@@ -0,0 +1,245 @@
+"""RSS/Atom-ленты пресетных тем: инкрементальный опрос вместо поиска
+
+Каждая лента опрашивается условным запросом (ETag/Last-Modified), новые записи
+определяются по GUID. Статьи уходят в то же хранилище, что и у прогрева, поэтому
+collect_all_news берёт их как прогретую тему — без обращения к поиску.
+"""
+
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+
+import lxml.html
+from dateutil import parser as date_parser
+from lxml import etree
+
+from config import (
+    PRESET_TOPICS, FEEDS, FEED_POLL_INTERVAL, FEED_CONCURRENCY, FEED_MAX_NEW_ENTRIES,
+    FEED_MIN_SUMMARY_CHARS, PREFETCH_JITTER, PREFETCH_LANGS, ARTICLE_STORE_DAYS, MAX_ARTICLE_LENGTH,
+)
+from database import (
+    to_db_timestamp, save_articles, mark_topic_refreshed,
+    get_feed_validators, save_feed_validators, filter_new_entries, mark_entries_seen,
+)
+from domains import domain_of
+from fetcher import fetch_page, get_session
+from news_engine import get_article
+
+logger = logging.getLogger(__name__)
+
+FEED_TYPES = ("application/rss+xml", "application/atom+xml", "application/rdf+xml", "application/xml", "text/xml")
+_PARSER = etree.XMLParser(recover=True, resolve_entities=False, no_network=True)
+
+
+def has_feeds(topic_id: str, lang: str) -> bool:
+    return bool(FEEDS.get(topic_id, {}).get(lang))
+
+
+def _parse_date(value: str | None) -> datetime | None:
+    """RFC 822 у RSS, ISO 8601 у Atom; без пояса считаем UTC"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        try:
+            parsed = date_parser.isoparse(value)
+        except ValueError:
+            return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _html_to_text(value: str) -> str:
+    if not value or not value.strip():
+        return ""
+    try:
+        return " ".join(lxml.html.fromstring(value).text_content().split())
+    except (etree.ParserError, ValueError):
+        return " ".join(value.split())
+
+
+def parse_feed(body: bytes) -> list[dict]:
+    """Записи RSS 2.0 / RSS 1.0 / Atom: guid, url, title, summary, published"""
+    root = etree.fromstring(body, parser=_PARSER)
+    if root is None:
+        return []
+
+    entries = []
+    for node in root.iter("{*}item", "{*}entry"):
+        fields: dict[str, str] = {}
+        link = None
+        for child in node:
+            if not isinstance(child.tag, str):
+                continue
+            name = etree.QName(child).localname
+            if name == "link":
+                # Atom: <link rel="alternate" href="..."/>, RSS: <link>...</link>
+                href = child.get("href")
+                if href and child.get("rel", "alternate") == "alternate":
+                    link = link or href
+                elif child.text and child.text.strip():
+                    link = link or child.text.strip()
+            elif name not in fields:
+                fields[name] = child.text or ""
+
+        if not link:
+            continue
+        summary = fields.get("encoded") or fields.get("content") or fields.get("description") or fields.get("summary")
+        entries.append({
+            "guid": (fields.get("guid") or fields.get("id") or link).strip(),
+            "url": link,
+            "title": _html_to_text(fields.get("title", "")),
+            "summary": _html_to_text(summary or ""),
+            "published": _parse_date(
+                fields.get("pubDate") or fields.get("published") or fields.get("updated") or fields.get("date")
+            ),
+        })
+    return entries
+
+
+class FeedPoller:
+    """Опрашивает ленты пресетных тем и складывает новые статьи в хранилище.
+
+    Тема с лентами отмечается обновлённой, только если все её ленты ответили (200 или 304).
+    ETag ленты сохраняется, только когда все её новые записи сохранены в хранилище.
+    """
+
+    def __init__(
+        self,
+        feeds: dict[str, dict[str, list[str]]] = FEEDS,
+        interval: float = FEED_POLL_INTERVAL,
+        concurrency: int = FEED_CONCURRENCY,
+        langs: list[str] = PREFETCH_LANGS,
+    ):
+        self.feeds = feeds
+        self.interval = interval
+        self.langs = langs
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks: list[asyncio.Task] = []
+        self.polls = 0
+        self.not_modified = 0
+        self.failed = 0
+        self.new_entries = 0
+        self.from_summary = 0
+
+    async def poll_feed(self, feed_url: str) -> tuple[list[dict], tuple[str | None, str | None] | None] | None:
+        """Новые записи ленты (самые свежие — первыми) и её ETag/Last-Modified; None — лента не ответила.
+
+        Валидаторы None, если лента не изменилась или новых записей больше, чем берём за раз:
+        после сохранения валидаторов 304 спрятал бы оставшиеся записи.
+        """
+        etag, last_modified = await get_feed_validators(feed_url)
+        try:
+            async with self._semaphore:
+                page = await fetch_page(
+                    get_session(), feed_url, etag, last_modified, content_types=FEED_TYPES, decode=False
+                )
+        except Exception as e:
+            self.failed += 1
+            logger.warning(f"Лента {feed_url} не ответила: {e}")
+            return None
+        self.polls += 1
+        if page is None:
+            self.failed += 1
+            logger.warning(f"Лента {feed_url} отдала не XML")
+            return None
+        if page.not_modified:
+            self.not_modified += 1
+            return [], None
+
+        entries = parse_feed(page.body)
+
+        cutoff = datetime.now(timezone.utc) - timedelta(days=ARTICLE_STORE_DAYS)
+        entries = [e for e in entries if e["published"] is None or e["published"] > cutoff]
+        new = await filter_new_entries(feed_url, [e["guid"] for e in entries])
+        fresh = [e for e in entries if e["guid"] in new]
+        fresh.sort(key=lambda e: e["published"] or datetime.min.replace(tzinfo=timezone.utc), reverse=True)
+        validators = (page.etag, page.last_modified) if len(fresh) <= FEED_MAX_NEW_ENTRIES else None
+        return fresh[:FEED_MAX_NEW_ENTRIES], validators
+
+    async def _entry_article(self, entry: dict) -> dict | None:
+        """Полный текст в ленте — берём его, иначе качаем страницу как обычную статью"""
+        if len(entry["summary"]) >= FEED_MIN_SUMMARY_CHARS:
+            self.from_summary += 1
+            article = {
+                "title": entry["title"],
+                "text": entry["summary"][:MAX_ARTICLE_LENGTH],
+                "url": entry["url"],
+                "source": domain_of(entry["url"]),
+            }
+        else:
+            article = await get_article(get_session(), entry["url"])
+            if article is None:
+                return None
+            article = dict(article, title=entry["title"] or article["title"])
+        published = entry["published"]
+        article["published_at"] = to_db_timestamp(published) if published else None
+        return article
+
+    async def poll_topic(self, topic_id: str, lang: str) -> int:
+        """Опросить ленты темы; возвращает число новых статей"""
+        topic = PRESET_TOPICS[topic_id]
+        topic_name = topic["name_ru"] if lang == "ru" else topic["name_en"]
+
+        ok = True
+        count = 0
+        for feed_url in self.feeds.get(topic_id, {}).get(lang, []):
+            polled = await self.poll_feed(feed_url)
+            if polled is None:
+                ok = False
+                continue
+            entries, validators = polled
+            results = await asyncio.gather(*map(self._entry_article, entries))
+            saved = [(entry, article) for entry, article in zip(entries, results) if article]
+            articles = [article for _, article in saved]
+            for article in articles:
+                article["topic"] = topic_name
+            await save_articles(articles, topic_name, lang)
+            # Записи, чью статью не удалось скачать, не отмечаем: их повторит следующий опрос
+            await mark_entries_seen(feed_url, [entry["guid"] for entry, _ in saved])
+            if validators is not None and len(saved) == len(entries):
+                await save_feed_validators(feed_url, *validators)
+            self.new_entries += len(saved)
+            count += len(articles)
+
+        if ok:
+            await mark_topic_refreshed(topic_name, lang)
+        return count
+
+    async def _topic_loop(self, topic_id: str, lang: str):
+        await asyncio.sleep(random.uniform(0, self.interval * PREFETCH_JITTER))
+        while True:
+            try:
+                count = await self.poll_topic(topic_id, lang)
+                logger.debug(f"Ленты «{topic_id}» ({lang}): {count} новых статей")
+            except Exception as e:
+                logger.warning(f"Ошибка опроса лент «{topic_id}»: {e}")
+            await asyncio.sleep(self.interval * (1 + random.uniform(-PREFETCH_JITTER, PREFETCH_JITTER)))
+
+    def start(self):
+        if self._tasks:
+            return
+        for lang in self.langs:
+            for topic_id in PRESET_TOPICS:
+                if has_feeds(topic_id, lang):
+                    self._tasks.append(asyncio.create_task(self._topic_loop(topic_id, lang)))
+        logger.info(f"Опрос лент запущен: {len(self._tasks)} тем")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def stats(self) -> dict:
+        return {
+            "topics": len(self._tasks),
+            "polls": self.polls,
+            "not_modified": self.not_modified,
+            "failed": self.failed,
+            "new_entries": self.new_entries,
+            "from_summary": self.from_summary,
+        }
@@ -0,0 +1,209 @@
+"""Общая HTTP-сессия для загрузки статей и её метрики
+
+Одна сессия на процесс: открывается в init_http, закрывается в close_http.
+Так между дайджестами переживают DNS-кэш и keep-alive соединения.
+"""
+
+import logging
+import re
+import time
+from collections import deque
+from dataclasses import dataclass
+from types import SimpleNamespace
+
+import aiohttp
+
+from config import (
+    HTTP_LIMIT, HTTP_LIMIT_PER_HOST, HTTP_DNS_TTL, HTTP_KEEPALIVE_TIMEOUT, HTTP_MAX_BODY_BYTES, REQUEST_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+HTML_TYPES = ("text/html", "application/xhtml+xml")
+_META_CHARSET_RE = re.compile(rb"""<meta[^>]+charset=["']?([\w-]+)""", re.IGNORECASE)
+
+
+def percentile(values, q: float) -> float:
+    """Перцентиль q (0..1) по ближайшему рангу; 0 для пустой выборки"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class FetchStats:
+    """Счётчики HTTP-запросов, собираемые через aiohttp TraceConfig"""
+
+    def __init__(self, window: int = 1000):
+        self.requests = 0
+        self.errors = 0
+        self.bytes = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+        self.dns_hits = 0
+        self.dns_misses = 0
+        self.not_modified = 0  # 304 на условный запрос
+        self.rejected = 0  # не HTML — тело не качали
+        self.truncated = 0  # тело длиннее HTTP_MAX_BODY_BYTES
+        self._latencies: deque[float] = deque(maxlen=window)  # последние запросы, секунды
+
+    async def _on_request_start(self, session, ctx: SimpleNamespace, params):
+        ctx.start = time.perf_counter()
+
+    async def _on_request_end(self, session, ctx: SimpleNamespace, params):
+        self.requests += 1
+        self._latencies.append(time.perf_counter() - ctx.start)
+
+    async def _on_request_exception(self, session, ctx: SimpleNamespace, params):
+        self.errors += 1
+
+    async def _on_chunk(self, session, ctx, params):
+        self.bytes += len(params.chunk)
+
+    async def _on_connection_create(self, session, ctx, params):
+        self.new_connections += 1
+
+    async def _on_connection_reuse(self, session, ctx, params):
+        self.reused_connections += 1
+
+    async def _on_dns_hit(self, session, ctx, params):
+        self.dns_hits += 1
+
+    async def _on_dns_miss(self, session, ctx, params):
+        self.dns_misses += 1
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig()
+        trace.on_request_start.append(self._on_request_start)
+        trace.on_request_end.append(self._on_request_end)
+        trace.on_request_exception.append(self._on_request_exception)
+        trace.on_response_chunk_received.append(self._on_chunk)
+        trace.on_connection_create_end.append(self._on_connection_create)
+        trace.on_connection_reuseconn.append(self._on_connection_reuse)
+        trace.on_dns_cache_hit.append(self._on_dns_hit)
+        trace.on_dns_cache_miss.append(self._on_dns_miss)
+        return trace
+
+    def stats(self) -> dict:
+        connections = self.new_connections + self.reused_connections
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "bytes": self.bytes,
+            "p50_ms": round(percentile(self._latencies, 0.5) * 1000),
+            "p95_ms": round(percentile(self._latencies, 0.95) * 1000),
+            "reuse_ratio": round(self.reused_connections / connections, 3) if connections else 0.0,
+            "dns_hits": self.dns_hits,
+            "dns_misses": self.dns_misses,
+            "not_modified": self.not_modified,
+            "rejected": self.rejected,
+            "truncated": self.truncated,
+        }
+
+
+fetch_stats = FetchStats()
+_session: aiohttp.ClientSession | None = None
+
+
+@dataclass
+class Page:
+    html: str | None = None  # None, если сервер ответил 304 или decode=False
+    etag: str | None = None
+    last_modified: str | None = None
+    not_modified: bool = False
+    body: bytes | None = None  # сырое тело при decode=False (XML разбираем из байтов)
+
+
+def decode_body(body: bytes, charset: str | None) -> str:
+    """Кодировка из заголовка, иначе из <meta charset>, иначе UTF-8 — без угадывания по всему телу"""
+    if not charset:
+        match = _META_CHARSET_RE.search(body[:4096])
+        charset = match.group(1).decode() if match else "utf-8"
+    try:
+        return body.decode(charset, errors="replace")
+    except LookupError:
+        return body.decode("utf-8", errors="replace")
+
+
+async def fetch_page(
+    session: aiohttp.ClientSession,
+    url: str,
+    etag: str | None = None,
+    last_modified: str | None = None,
+    max_bytes: int = HTTP_MAX_BODY_BYTES,
+    content_types: tuple[str, ...] = HTML_TYPES,
+    decode: bool = True,
+) -> Page | None:
+    """Загрузить HTML-страницу: условный запрос по валидаторам, чужой Content-Type отбрасывается
+    до чтения тела, тело читается потоком не больше max_bytes.
+    None — не тот тип; ошибка HTTP — ClientResponseError."""
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)) as resp:
+        if resp.status == 304:
+            fetch_stats.not_modified += 1
+            return Page(etag=etag, last_modified=last_modified, not_modified=True)
+        resp.raise_for_status()
+        if resp.content_type not in content_types and resp.content_type != "application/octet-stream":
+            fetch_stats.rejected += 1
+            return None
+
+        chunks, size = [], 0
+        async for chunk in resp.content.iter_chunked(64 * 1024):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= max_bytes:
+                # Недочитанное соединение aiohttp закроет — это дешевле, чем качать мегабайты
+                fetch_stats.truncated += 1
+                break
+        # Трассировка aiohttp видит только resp.read(), потоковое чтение считаем сами
+        fetch_stats.bytes += size
+
+        body = b"".join(chunks)[:max_bytes]
+        page = Page(etag=resp.headers.get("ETag"), last_modified=resp.headers.get("Last-Modified"))
+        if decode:
+            page.html = decode_body(body, resp.charset)
+        else:
+            page.body = body
+        return page
+
+
+def create_session(stats: FetchStats | None = None) -> aiohttp.ClientSession:
+    """HTTP-сессия для загрузки статей: общий лимит, лимит на хост и DNS-кэш"""
+    connector = aiohttp.TCPConnector(
+        limit=HTTP_LIMIT,
+        limit_per_host=HTTP_LIMIT_PER_HOST,
+        ttl_dns_cache=HTTP_DNS_TTL,
+        keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+        ssl=False,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        headers={"User-Agent": USER_AGENT},
+        trace_configs=[(stats or fetch_stats).trace_config()],
+    )
+
+
+def init_http():
+    """Открыть общую сессию (вызывается из main, внутри event loop)"""
+    global _session
+    if _session is None:
+        _session = create_session()
+
+
+def get_session() -> aiohttp.ClientSession:
+    if _session is None:
+        raise RuntimeError("HTTP-сессия не открыта — сначала вызови init_http()")
+    return _session
+
+
+async def close_http():
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
@@ -0,0 +1,96 @@
+"""Хранилище состояний диалогов aiogram FSM: SQLite (тот же файл, что у database.py) + кэш в памяти
+
+Состояние живёт FSM_STATE_TTL с последней записи: брошенный ввод сам сбрасывается,
+а таблица не копит пользователей, которые ушли посреди диалога. В памяти — не больше
+FSM_CACHE_MAX_ITEMS записей (LRU), включая «состояния нет»: обычное сообщение
+не идёт в БД. Апдейты обрабатывает один процесс (bot.py или webhook.py), поэтому
+кэш не расходится с БД; воркеры состояния не трогают.
+"""
+
+import logging
+import time
+from collections.abc import Mapping
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+
+from cache import TTLCache
+from config import FSM_STATE_TTL, FSM_CACHE_MAX_ITEMS, FSM_PRUNE_INTERVAL
+from database import get_fsm, set_fsm, prune_fsm, to_db_timestamp
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteStorage(BaseStorage):
+    def __init__(
+        self,
+        ttl: float = FSM_STATE_TTL,
+        max_items: int = FSM_CACHE_MAX_ITEMS,
+        prune_interval: float = FSM_PRUNE_INTERVAL,
+    ):
+        self.ttl = ttl
+        self.prune_interval = prune_interval
+        self._memory = TTLCache(max_items=max_items, ttl=ttl)  # ключ -> (состояние, данные)
+        self._key_builder = DefaultKeyBuilder(with_bot_id=True, with_business_connection_id=True, with_destiny=True)
+        self._last_prune = time.monotonic()
+        self.db_reads = 0
+        self.pruned = 0
+
+    async def _load(self, key: StorageKey) -> tuple[str | None, dict]:
+        db_key = self._key_builder.build(key)
+        record = self._memory.get(db_key)
+        if record is not None:
+            return record
+        self.db_reads += 1
+        row = await get_fsm(db_key)
+        if row is None:
+            record, ttl = (None, {}), self.ttl
+        else:
+            state, data, ttl = row
+            record = (state, data)
+        self._memory.set(db_key, record, ttl=ttl)
+        return record
+
+    async def _save(self, key: StorageKey, state: str | None, data: dict):
+        db_key = self._key_builder.build(key)
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.ttl)
+        await set_fsm(db_key, state, data, to_db_timestamp(expires_at))
+        self._memory.set(db_key, (state, data))
+        await self._maybe_prune()
+
+    async def _maybe_prune(self):
+        if time.monotonic() - self._last_prune < self.prune_interval:
+            return
+        self._last_prune = time.monotonic()
+        try:
+            self.pruned += await prune_fsm()
+        except Exception as e:
+            logger.warning(f"Не удалось почистить состояния FSM: {e}")
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        _, data = await self._load(key)
+        await self._save(key, state.state if isinstance(state, State) else state, data)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        state, _ = await self._load(key)
+        return state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(f"Data must be a dict or dict-like object, got {type(data).__name__}")
+        state, _ = await self._load(key)
+        await self._save(key, state, data.copy())
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        _, data = await self._load(key)
+        return data.copy()
+
+    async def close(self) -> None:
+        # Соединение общее с database.py — его закрывает close_db()
+        pass
+
+    def stats(self) -> dict:
+        return {**self._memory.stats(), "db_reads": self.db_reads, "pruned": self.pruned}
@@ -0,0 +1,206 @@
+"""Очередь генерации дайджестов с ограниченным числом воркеров"""
+
+import asyncio
+import logging
+from collections import deque
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+from config import DIGEST_WORKERS, DIGEST_QUEUE_MAX, WORKER_PROCESSES
+from database import enqueue_job, count_jobs, has_job
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """Очередь переполнена — новых задач не принимаем"""
+
+
+class AlreadyQueued(Exception):
+    """У пользователя уже есть дайджест в работе или в очереди"""
+
+
+@dataclass
+class DigestJob:
+    user_id: int
+    run: Callable[[], Awaitable[None]]
+    on_position: Callable[[int], Awaitable[None]] | None = None
+    position: int = 0
+    started: bool = False
+    notify_task: asyncio.Task | None = None  # последнее обновление места в очереди
+
+
+class DigestQueue:
+    """Не больше workers дайджестов одновременно, один дайджест на пользователя.
+
+    Задача — любая корутина без аргументов, так что очередь можно проверять с фейковым движком.
+    Обновления места в очереди идут по порядку, и воркер дожидается их перед запуском задачи:
+    устаревшее «ты в очереди» не перезапишет уже начавшийся дайджест.
+    """
+
+    def __init__(self, workers: int = DIGEST_WORKERS, max_pending: int = DIGEST_QUEUE_MAX):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._pending: deque[DigestJob] = deque()
+        self._users: set[int] = set()
+        self._cond = asyncio.Condition()
+        self._tasks: list[asyncio.Task] = []
+        self._notify_tasks: set[asyncio.Task] = set()
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def _effective_position(self, index: int) -> int:
+        """Место в очереди с учётом свободных воркеров: 0 — задача стартует сразу"""
+        idle = self.workers - self.running
+        return max(0, index + 1 - idle)
+
+    async def submit(
+        self,
+        user_id: int,
+        run: Callable[[], Awaitable[None]],
+        on_position: Callable[[int], Awaitable[None]] | None = None,
+    ) -> int:
+        """Поставить задачу в очередь; возвращает место в очереди (0 — начнётся сразу)"""
+        if user_id in self._users:
+            raise AlreadyQueued(user_id)
+        if len(self._pending) >= self.max_pending:
+            self.rejected += 1
+            raise QueueFull()
+
+        job = DigestJob(user_id, run, on_position)
+        async with self._cond:
+            self._pending.append(job)
+            self._users.add(user_id)
+            job.position = self._effective_position(len(self._pending) - 1)
+            if job.position and on_position:
+                self._notify(job, job.position)
+            self._cond.notify()
+        return job.position
+
+    def position(self, user_id: int) -> int | None:
+        for index, job in enumerate(self._pending):
+            if job.user_id == user_id:
+                return self._effective_position(index)
+        return None
+
+    def _report_positions(self):
+        """Сообщить ожидающим, что очередь продвинулась"""
+        for index, job in enumerate(self._pending):
+            position = self._effective_position(index)
+            if job.on_position and position != job.position:
+                job.position = position
+                self._notify(job, position)
+
+    def _notify(self, job: DigestJob, position: int):
+        """Обновление места идёт после предыдущего обновления той же задачи"""
+        task = asyncio.create_task(self._safe_notify(job, position, job.notify_task))
+        job.notify_task = task
+        # Ссылка нужна, иначе задачу может собрать сборщик мусора посреди правки
+        self._notify_tasks.add(task)
+        task.add_done_callback(self._notify_tasks.discard)
+
+    @staticmethod
+    async def _safe_notify(job: DigestJob, position: int, previous: asyncio.Task | None):
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        if job.started:
+            return  # задача уже выполняется — место в очереди устарело
+        try:
+            await job.on_position(position)
+        except Exception as e:
+            logger.debug(f"Не удалось обновить позицию в очереди для {job.user_id}: {e}")
+
+    async def _worker(self):
+        while True:
+            async with self._cond:
+                await self._cond.wait_for(lambda: self._pending)
+                job = self._pending.popleft()
+                job.started = True
+                self.running += 1
+            self._report_positions()
+            try:
+                if job.notify_task is not None:
+                    # Правка «ты в очереди», которая уже ушла, должна закончиться до вывода дайджеста
+                    await asyncio.gather(job.notify_task, return_exceptions=True)
+                await job.run()
+                self.completed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Ошибка задачи дайджеста для {job.user_id}: {e}")
+            finally:
+                self.running -= 1
+                self._users.discard(job.user_id)
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        tasks = [*self._tasks, *self._notify_tasks]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "pending": len(self._pending),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+
+class SQLiteDigestQueue:
+    """Очередь дайджестов для процессов-воркеров (worker.py) в общей SQLite.
+
+    Процесс вебхука только ставит задачи: что показать и какое сообщение править.
+    Те же правила, что у DigestQueue: один дайджест на пользователя, не больше max_pending в очереди.
+    """
+
+    def __init__(
+        self,
+        processes: int = WORKER_PROCESSES,
+        workers: int = DIGEST_WORKERS,
+        max_pending: int = DIGEST_QUEUE_MAX,
+    ):
+        self.capacity = processes * workers
+        self.max_pending = max_pending
+        self.submitted = 0
+        self.rejected = 0
+
+    async def submit(
+        self,
+        user_id: int,
+        chat_id: int,
+        message_id: int,
+        payload: dict,
+        on_position: Callable[[int], Awaitable[None]] | None = None,
+    ) -> int:
+        """Поставить задачу; возвращает место в очереди (0 — начнётся сразу).
+
+        Место показывается через on_position до вставки: после неё задачу может сразу взять воркер,
+        и правка «ты в очереди» не должна лечь поверх его дайджеста.
+        """
+        counts = await count_jobs()
+        if counts["queued"] >= self.max_pending:
+            self.rejected += 1
+            raise QueueFull()
+        if await has_job(user_id):
+            raise AlreadyQueued(user_id)
+        # Новая задача встаёт в конец: перед ней все ожидающие
+        position = max(0, counts["queued"] + counts["running"] + 1 - self.capacity)
+        if position and on_position is not None:
+            await on_position(position)
+        job_id = await enqueue_job(user_id, chat_id, message_id, payload)
+        if job_id is None:
+            raise AlreadyQueued(user_id)
+        self.submitted += 1
+        return position
+
+    def stats(self) -> dict:
+        return {"capacity": self.capacity, "submitted": self.submitted, "rejected": self.rejected}
@@ -0,0 +1,231 @@
+"""Метрики пайплайна: счётчики, гистограммы и спаны стадий дайджеста
+
+Всё хранится в памяти процесса. /metrics отдаёт текст в формате Prometheus,
+а по каждому дайджесту в лог «digest» пишется одна JSON-строка со временем стадий.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from bisect import bisect_left
+from collections import Counter
+from collections.abc import Callable
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from aiohttp import web
+
+from config import METRICS_MAX_SERIES
+
+logger = logging.getLogger(__name__)
+digest_logger = logging.getLogger("digest")
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # последний — +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Реестр счётчиков и гистограмм с метками.
+
+    Число наборов меток на метрику ограничено max_series: домены и темы
+    сверх лимита сливаются в значение "other", чтобы /metrics не разрастался.
+    """
+
+    def __init__(self, max_series: int = METRICS_MAX_SERIES):
+        self.max_series = max_series
+        self._counters: dict[str, dict[tuple, float]] = {}
+        self._histograms: dict[str, dict[tuple, Histogram]] = {}
+        self._gauges: list[tuple[str, Callable[[], dict]]] = []
+
+    def _key(self, series: dict, labels: dict) -> tuple:
+        key = tuple(sorted(labels.items()))
+        if key in series or len(series) < self.max_series:
+            return key
+        return tuple((name, "other") for name, _ in key)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        series = self._counters.setdefault(name, {})
+        key = self._key(series, labels)
+        series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets: tuple[float, ...] = SECONDS_BUCKETS, **labels):
+        series = self._histograms.setdefault(name, {})
+        key = self._key(series, labels)
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram(buckets)
+        histogram.observe(value)
+
+    def register_gauges(self, prefix: str, collect: Callable[[], dict]):
+        """Числовые поля collect() отдаются как gauge prefix_<поле> (stats() кэшей, очередей и т.п.)"""
+        self._gauges.append((prefix, collect))
+
+    def counter_value(self, name: str, **labels) -> float:
+        return self._counters.get(name, {}).get(tuple(sorted(labels.items())), 0)
+
+    def histogram(self, name: str, **labels) -> Histogram | None:
+        return self._histograms.get(name, {}).get(tuple(sorted(labels.items())))
+
+    def render(self) -> str:
+        """Текстовый формат Prometheus"""
+        lines = []
+        for name, series in sorted(self._counters.items()):
+            lines.append(f"# TYPE {name} counter")
+            lines += [f"{name}{_labels(key)} {_number(value)}" for key, value in series.items()]
+        for name, series in sorted(self._histograms.items()):
+            lines.append(f"# TYPE {name} histogram")
+            for key, histogram in series.items():
+                cumulative = 0
+                for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(key + (('le', _number(bound)),))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(key)} {_number(histogram.sum)}")
+                lines.append(f"{name}_count{_labels(key)} {histogram.count}")
+        for prefix, collect in self._gauges:
+            try:
+                values = collect()
+            except Exception as e:
+                logger.warning(f"Метрики {prefix} недоступны: {e}")
+                continue
+            for field_name, value in values.items():
+                if isinstance(value, (int, float)):
+                    lines.append(f"# TYPE {prefix}_{field_name} gauge")
+                    lines.append(f"{prefix}_{field_name} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _number(value) -> str:
+    if isinstance(value, str):
+        return value
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def _labels(key: tuple) -> str:
+    if not key:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ") for _, value in key)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(key, escaped)) + "}"
+
+
+metrics = Metrics()
+
+
+# --- Спаны дайджеста ---
+
+@dataclass
+class DigestTrace:
+    """Сводка одного дайджеста: время по стадиям и счётчики.
+
+    Время стадии — сумма по всем её спанам; параллельные загрузки
+    дают сумму больше общего времени, зато видно, где работа.
+    """
+
+    start: float = field(default_factory=time.perf_counter)
+    stages: dict[str, list] = field(default_factory=dict)  # стадия -> [число спанов, секунды]
+    counts: Counter = field(default_factory=Counter)
+
+    def add(self, stage: str, seconds: float):
+        entry = self.stages.setdefault(stage, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+    def summary(self) -> dict:
+        return {
+            "total_ms": round((time.perf_counter() - self.start) * 1000),
+            "stages": {stage: {"n": n, "ms": round(seconds * 1000)} for stage, (n, seconds) in self.stages.items()},
+            **self.counts,
+        }
+
+
+_trace: ContextVar[DigestTrace | None] = ContextVar("digest_trace", default=None)
+
+
+@contextmanager
+def span(stage: str):
+    """Замер стадии: гистограмма news_stage_seconds и, если идёт дайджест, его сводка.
+
+    Задачи, созданные внутри дайджеста, наследуют его контекст и пишут в ту же сводку.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        metrics.observe("news_stage_seconds", seconds, stage=stage)
+        trace = _trace.get()
+        if trace is not None:
+            trace.add(stage, seconds)
+
+
+def note(name: str, value: int = 1):
+    """Добавить к счётчику текущего дайджеста (статьи, токены...)"""
+    trace = _trace.get()
+    if trace is not None:
+        trace.counts[name] += value
+
+
+def record_llm(kind: str, seconds: float, prompt_tokens: int, completion_tokens: int):
+    metrics.observe("news_llm_seconds", seconds, kind=kind)
+    metrics.observe("news_llm_prompt_tokens", prompt_tokens, TOKEN_BUCKETS, kind=kind)
+    metrics.observe("news_llm_completion_tokens", completion_tokens, TOKEN_BUCKETS, kind=kind)
+    note("llm_calls")
+    note("prompt_tokens", prompt_tokens)
+    note("completion_tokens", completion_tokens)
+
+
+@contextmanager
+def digest_trace(**fields):
+    """Сводка дайджеста: на выходе — гистограмма полного времени и JSON-строка в лог"""
+    trace = DigestTrace()
+    token = _trace.set(trace)
+    status = "ok"
+    try:
+        yield trace
+    except (GeneratorExit, asyncio.CancelledError):
+        status = "cancelled"
+        raise
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        try:
+            _trace.reset(token)
+        except ValueError:
+            # Стрим-генератор закрыли из другого контекста — там нашей сводки и не было
+            pass
+        summary = trace.summary()
+        metrics.observe("news_digest_seconds", summary["total_ms"] / 1000)
+        metrics.inc("news_digests_total", status=status)
+        digest_logger.info(json.dumps({"event": "digest", "status": status, **fields, **summary}, ensure_ascii=False))
+
+
+# --- HTTP ---
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8")
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Поднять /metrics в текущем event loop; остановка — runner.cleanup()"""
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Метрики: http://{host}:{port}/metrics")
+    return runner
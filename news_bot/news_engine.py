@@ -1,18 +1,41 @@
 """Движок новостей: поиск, парсинг статей, суммаризация через DeepSeek"""
 
 import asyncio
+import hashlib
+import html
 import logging
-from datetime import datetime, timezone
+import re
+import time
+from collections import Counter, deque
+from collections.abc import AsyncIterator
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
 from dateutil import parser as date_parser
 from openai import AsyncOpenAI
-from duckduckgo_search import DDGS
 import aiohttp
-from newspaper import Article
 
+from cache import ArticleCache, TTLCache, SingleFlight
+from dedup import cluster_articles
+from domains import DomainGuard, domain_of
+from extractor import ExtractorPool, ExtractorRejected
+from fetcher import fetch_page, fetch_stats, get_session, percentile
+from metrics import metrics, span, note, record_llm, digest_trace
+from search import create_backend
+from packing import allocate, estimate_tokens, pack_articles, prompt_budget, output_budget
 from config import (
     DEEPSEEK_API_KEY, DEEPSEEK_BASE_URL, DEEPSEEK_MODEL,
     PRESET_TOPICS, LANGUAGE_LEVELS, WORDS_PER_MINUTE,
-    MAX_SEARCH_RESULTS_PER_TOPIC, MAX_ARTICLE_LENGTH, REQUEST_TIMEOUT,
+    MAX_SEARCH_RESULTS_PER_TOPIC, HTTP_VALIDATORS_TTL, HTTP_VALIDATORS_MAX_ITEMS,
+    ARTICLE_CACHE_TTL, ARTICLE_CACHE_MAX_ITEMS, ARTICLE_CACHE_DISK,
+    SEARCH_CACHE_TTL, SEARCH_CACHE_MAX_ITEMS, SEARCH_CONCURRENCY,
+    PARSE_WORKERS, PARSE_MAX_PENDING, PARSE_CPU_TIMEOUT, PARSE_EXTRACTOR,
+    WARM_TOPIC_TTL, STORED_MATCH_WINDOW, FETCH_FIRST_N, FETCH_OVERFETCH, FETCH_TOPIC_DEADLINE,
+    DEDUP_ENABLED, SEEN_ARTICLES_ENABLED, MAPREDUCE_MIN_ARTICLES, MAPREDUCE_MIN_TOKENS,
+    SECTION_CACHE_ENABLED, SECTION_CACHE_TTL, SECTION_CACHE_MAX_ITEMS, SECTION_CONCURRENCY, SECTION_MAX_TOKENS,
+)
+from database import (
+    DB_PATH, to_db_timestamp, save_articles, mark_topic_refreshed, get_topic_refreshed_at,
+    get_recent_articles, search_articles, get_seen_articles, mark_articles_seen, user_cache_stats,
 )
 
 logger = logging.getLogger(__name__)
@@ -23,60 +46,243 @@ client = AsyncOpenAI(
     base_url=DEEPSEEK_BASE_URL,
 )
 
+# Общий для всех пользователей кэш распарсенных статей
+article_cache = ArticleCache(
+    max_items=ARTICLE_CACHE_MAX_ITEMS,
+    ttl=ARTICLE_CACHE_TTL,
+    db_path=DB_PATH.parent / "cache.db" if ARTICLE_CACHE_DISK else None,
+)
 
-def search_news(query: str, max_results: int = MAX_SEARCH_RESULTS_PER_TOPIC, since: datetime = None) -> list[dict]:
-    """Поиск новостей через DuckDuckGo с фильтрацией по дате"""
-    try:
-        with DDGS() as ddgs:
-            results = list(ddgs.news(query, max_results=max_results * 2, region="wt-wt"))
-
-            if since:
-                filtered = []
-                for r in results:
-                    try:
-                        news_date = date_parser.parse(r.get("date", ""))
-                        if news_date.tzinfo is None:
-                            news_date = news_date.replace(tzinfo=timezone.utc)
-                        if since.tzinfo is None:
-                            since = since.replace(tzinfo=timezone.utc)
-                        if news_date > since:
-                            filtered.append(r)
-                    except Exception:
-                        # Если не можем распарсить дату — включаем новость
-                        filtered.append(r)
-                return filtered[:max_results]
-
-            return results[:max_results]
-    except Exception as e:
-        logger.error(f"Ошибка поиска по '{query}': {e}")
-        return []
+# Кэш результатов поиска по (query, region, lang) и склейка одинаковых запросов
+search_cache = TTLCache(max_items=SEARCH_CACHE_MAX_ITEMS, ttl=SEARCH_CACHE_TTL)
+search_flight = SingleFlight()
 
+# Поисковый бэкенд (см. search.py) и его собственный лимит параллельности
+search_backend = create_backend()
+search_semaphore = asyncio.Semaphore(SEARCH_CONCURRENCY)
 
-async def parse_article(session: aiohttp.ClientSession, url: str) -> dict | None:
-    """Парсинг одной статьи"""
+# Откуда брались статьи тем: warm — прогретое хранилище, stored — FTS по хранилищу, live — живой поиск
+topic_sources = Counter()
+
+# Готовые секции дайджеста по темам: (тема, хэш набора статей, уровень, язык) -> HTML
+section_cache = TTLCache(max_items=SECTION_CACHE_MAX_ITEMS, ttl=SECTION_CACHE_TTL)
+section_flight = SingleFlight()
+section_semaphore = asyncio.Semaphore(SECTION_CONCURRENCY)
+
+# ETag/Last-Modified и разобранная статья: после истечения кэша статьи страницу перепроверяем
+# условным запросом, и на 304 разбирать её заново не нужно
+validator_cache = TTLCache(max_items=HTTP_VALIDATORS_MAX_ITEMS, ttl=HTTP_VALIDATORS_TTL)
+
+# Лимиты и отключение сбоящих сайтов-источников
+domain_guard = DomainGuard()
+PAYWALL_STATUSES = {401, 402, 403, 451}
+
+# Время загрузки статей по темам (секунды, последние запросы) и отменённые хвосты
+topic_fetch_times = TTLCache(max_items=1000)
+fetch_cancelled = Counter()
+
+# Разбор HTML — CPU-тяжёлая работа, держим её вне event loop
+extractor_pool = ExtractorPool(
+    workers=PARSE_WORKERS,
+    max_pending=PARSE_MAX_PENDING,
+    cpu_timeout=PARSE_CPU_TIMEOUT,
+    method=PARSE_EXTRACTOR,
+    on_cpu=lambda seconds: metrics.observe("news_parse_cpu_seconds", seconds),
+)
+
+metrics.register_gauges("news_article_cache", article_cache.stats)
+metrics.register_gauges("news_search_cache", search_cache.stats)
+metrics.register_gauges("news_section_cache", section_cache.stats)
+metrics.register_gauges("news_user_cache", user_cache_stats)
+metrics.register_gauges("news_http", fetch_stats.stats)
+metrics.register_gauges("news_extractor", extractor_pool.stats)
+metrics.register_gauges("news_topic_source", lambda: dict(topic_sources))
+metrics.register_gauges("news_fetch_cancelled", lambda: dict(fetch_cancelled))
+metrics.register_gauges("news_domains", lambda: domain_guard.stats(top=0))
+
+
+async def search_news(query: str, max_results: int = MAX_SEARCH_RESULTS_PER_TOPIC, region: str = "wt-wt") -> list[dict]:
+    """Поиск новостей (без фильтрации по дате, ошибки пробрасываются)"""
+    async with search_semaphore:
+        with span("search"):
+            return await search_backend.news(query, max_results * 2, region)
+
+
+def parse_date(value: str | None) -> datetime | None:
+    """Разобрать дату из результатов поиска (в UTC, если пояс не указан)"""
+    if not value:
+        return None
     try:
-        async with session.get(url, timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)) as resp:
-            if resp.status != 200:
-                return None
-            html = await resp.text()
+        parsed = date_parser.parse(value)
+    except Exception:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def filter_since(results: list[dict], since: datetime = None, max_results: int = MAX_SEARCH_RESULTS_PER_TOPIC) -> list[dict]:
+    """Отфильтровать результаты поиска по дате публикации"""
+    if not since:
+        return results[:max_results]
+
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+
+    filtered = []
+    for r in results:
+        news_date = parse_date(r.get("date"))
+        # Если не можем распарсить дату — включаем новость
+        if news_date is None or news_date > since:
+            filtered.append(r)
+    return filtered[:max_results]
+
 
-        article = Article(url)
-        article.download(input_html=html)
-        article.parse()
+async def cached_search(query: str, region: str = "wt-wt", lang: str = "ru") -> list[dict]:
+    """Поиск с общим кэшем и склейкой одинаковых одновременных запросов"""
+    key = (query, region, lang)
+    results = search_cache.get(key)
+    if results is not None:
+        return results
 
-        text = article.text.strip()
-        if len(text) < 100:
+    async def do_search():
+        try:
+            found = await search_news(query, MAX_SEARCH_RESULTS_PER_TOPIC * FETCH_OVERFETCH, region)
+        except Exception as e:
+            metrics.inc("news_search_errors_total", backend=search_backend.name)
+            logger.error(f"Ошибка поиска по '{query}': {e}")
+            return []  # ошибки не кэшируем
+        search_cache.set(key, found)
+        return found
+
+    return await search_flight.do(key, do_search)
+
+
+async def parse_article(session: aiohttp.ClientSession, url: str) -> dict | None:
+    """Парсинг одной статьи (загрузка здесь, разбор HTML — в пуле процессов)"""
+    domain = domain_of(url)
+    if not domain_guard.allow(domain):
+        return None
+
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        # Ждём токен домена внутри try: отмена во время ожидания тоже освобождает пробный слот
+        await domain_guard.acquire(domain)
+        start = time.perf_counter()
+        known = validator_cache.get(url)
+        if known:
+            page = await fetch_page(session, url, known["etag"], known["last_modified"])
+        else:
+            page = await fetch_page(session, url)
+        if page is None:
+            outcome = "empty"
             return None
+        if page.not_modified:
+            outcome = "ok"
+            return dict(known["article"])
 
-        return {
-            "title": article.title or "Без заголовка",
-            "text": text[:MAX_ARTICLE_LENGTH],
-            "url": url,
-            "source": url.split("/")[2] if "/" in url else url,
-        }
+        with span("parse"):
+            article = await extractor_pool.extract(url, page.html)
+        # Страница без текста статьи — обычно пейвол или заглушка
+        outcome = "ok" if article else "empty"
+        if article and (page.etag or page.last_modified):
+            # Копия: вызывающий дописывает в статью topic и published_at своей темы
+            validator_cache.set(url, {
+                "etag": page.etag, "last_modified": page.last_modified, "article": dict(article),
+            })
+        return article
+    except asyncio.CancelledError:
+        outcome = None
+        raise
+    except aiohttp.ClientResponseError as e:
+        outcome = "paywall" if e.status in PAYWALL_STATUSES else "error"
+        logger.debug(f"Не удалось спарсить {url}: HTTP {e.status}")
+        return None
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+        logger.debug(f"Не удалось спарсить {url}: таймаут")
+        return None
+    except (BrokenProcessPool, ExtractorRejected) as e:
+        # Не справился наш пул парсинга, а не сайт: домен не штрафуем
+        outcome = None
+        logger.debug(f"Не удалось спарсить {url}: {e}")
+        return None
     except Exception as e:
         logger.debug(f"Не удалось спарсить {url}: {e}")
         return None
+    finally:
+        if outcome is None:
+            domain_guard.release(domain)
+        else:
+            seconds = time.perf_counter() - start
+            domain_guard.record(domain, outcome, seconds)
+            metrics.observe("news_fetch_seconds", seconds, domain=domain)
+            metrics.inc("news_fetch_total", outcome=outcome)
+
+
+async def get_article(session: aiohttp.ClientSession, url: str) -> dict | None:
+    """Статья из кэша, а при промахе — загрузка и парсинг"""
+    article = await article_cache.get(url)
+    if article is not None:
+        return article
+
+    article = await parse_article(session, url)
+    if article:
+        await article_cache.set(url, article)
+    return article
+
+
+async def fetch_first(session: aiohttp.ClientSession, urls: list[str], need: int, deadline: float) -> list[dict]:
+    """Качаем все urls сразу и берём первые need удачных; остальное отменяем.
+
+    Через deadline секунд возвращаем то, что успело. Порядок — как в выдаче поиска.
+    """
+    tasks = {asyncio.ensure_future(get_article(session, url)): i for i, url in enumerate(urls)}
+    pending = set(tasks)
+    done_ok: list[tuple[int, dict]] = []
+    loop = asyncio.get_running_loop()
+    stop_at = loop.time() + deadline
+    try:
+        while pending and len(done_ok) < need:
+            timeout = stop_at - loop.time()
+            if timeout <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and task.exception() is None and task.result():
+                    done_ok.append((tasks[task], task.result()))
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            fetch_cancelled["deadline" if len(done_ok) < need else "surplus"] += len(pending)
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    return [art for _, art in sorted(done_ok, key=lambda item: item[0])[:need]]
+
+
+def record_topic_fetch(topic_name: str, seconds: float):
+    times = topic_fetch_times.peek(topic_name)
+    if times is None:
+        times = deque(maxlen=200)
+        topic_fetch_times.set(topic_name, times)
+    times.append(seconds)
+
+
+def topic_fetch_stats(top: int = 5) -> dict:
+    """Перцентили времени загрузки статей по темам; самые медленные темы — первыми"""
+    stats = {
+        topic: {
+            "n": len(times),
+            "p50_ms": round(percentile(times, 0.5) * 1000),
+            "p95_ms": round(percentile(times, 0.95) * 1000),
+            "p99_ms": round(percentile(times, 0.99) * 1000),
+        }
+        for topic, times in topic_fetch_times.items()
+    }
+    slowest = sorted(stats, key=lambda topic: -stats[topic]["p95_ms"])[:top]
+    return {topic: stats[topic] for topic in slowest}
 
 
 async def fetch_articles_for_topic(
@@ -84,31 +290,87 @@ async def fetch_articles_for_topic(
     topic_name: str,
     search_query: str,
     since: datetime = None,
+    lang: str = "ru",
 ) -> list[dict]:
     """Собрать статьи по одной теме"""
-    # Поиск в отдельном потоке (duckduckgo_search синхронная)
-    loop = asyncio.get_event_loop()
-    search_results = await loop.run_in_executor(
-        None, lambda: search_news(search_query, MAX_SEARCH_RESULTS_PER_TOPIC, since)
-    )
+    # Кэш общий для всех пользователей, фильтр по дате — свой у каждого
+    wanted = MAX_SEARCH_RESULTS_PER_TOPIC * (FETCH_OVERFETCH if FETCH_FIRST_N else 1)
+    search_results = filter_since(await cached_search(search_query, lang=lang), since, wanted)
 
     if not search_results:
         return []
 
-    # Парсим все найденные статьи параллельно
-    urls = [r.get("url") or r.get("href", "") for r in search_results if r.get("url") or r.get("href")]
-    tasks = [parse_article(session, url) for url in urls[:MAX_SEARCH_RESULTS_PER_TOPIC]]
-    articles = await asyncio.gather(*tasks)
+    # Парсим найденные статьи параллельно
+    dates = {}
+    for r in search_results:
+        url = r.get("url") or r.get("href")
+        if url:
+            published = parse_date(r.get("date"))
+            dates[url] = to_db_timestamp(published) if published else None
+    # Слоты отдаём доступным сайтам; отключённые пропускаем (если статьи нет в кэше)
+    urls = [url for url in dates if url in article_cache.memory or domain_guard.available(domain_of(url))]
+    start = time.perf_counter()
+    with span("fetch"):
+        if FETCH_FIRST_N:
+            articles = await fetch_first(session, urls, MAX_SEARCH_RESULTS_PER_TOPIC, FETCH_TOPIC_DEADLINE)
+        else:
+            articles = await asyncio.gather(
+                *[get_article(session, url) for url in urls[:MAX_SEARCH_RESULTS_PER_TOPIC]]
+            )
+    record_topic_fetch(topic_name, time.perf_counter() - start)
 
     result = []
     for art in articles:
         if art:
             art["topic"] = topic_name
+            art["published_at"] = dates.get(art["url"])
             result.append(art)
 
     return result
 
 
+async def refresh_topic(session: aiohttp.ClientSession, topic_name: str, search_query: str, lang: str = "ru") -> int:
+    """Прогреть тему: свежие статьи кладём в хранилище (вызывается фоновым планировщиком)"""
+    articles = await fetch_articles_for_topic(session, topic_name, search_query, None, lang)
+    await save_articles(articles, topic_name, lang)
+    if articles:
+        await mark_topic_refreshed(topic_name, lang)
+    return len(articles)
+
+
+async def get_topic_articles(
+    session: aiohttp.ClientSession,
+    topic_name: str,
+    search_query: str,
+    since: datetime = None,
+    lang: str = "ru",
+    match_stored: bool = False,
+) -> list[dict]:
+    """Статьи по теме: из прогретого хранилища, по FTS среди уже загруженных, иначе — живой поиск"""
+    now = datetime.now(timezone.utc)
+    since_db = to_db_timestamp(since) if since else None
+
+    refreshed_at = await get_topic_refreshed_at(topic_name, lang)
+    if refreshed_at and refreshed_at > to_db_timestamp(now - timedelta(seconds=WARM_TOPIC_TTL)):
+        topic_sources["warm"] += 1
+        stored = await get_recent_articles(topic_name, lang, since_db, MAX_SEARCH_RESULTS_PER_TOPIC)
+        return [dict(art, topic=topic_name) for art in stored]
+
+    # Кастомная тема могла уже встретиться в текстах других тем — это бесплатно
+    if match_stored:
+        window = since_db or to_db_timestamp(now - timedelta(seconds=STORED_MATCH_WINDOW))
+        words = [w for w in topic_name.split() if any(c.isalnum() for c in w)]
+        found = await search_articles(" ".join(words), window, MAX_SEARCH_RESULTS_PER_TOPIC)
+        if len(found) >= MAX_SEARCH_RESULTS_PER_TOPIC:
+            topic_sources["stored"] += 1
+            return [dict(art, topic=topic_name) for art in found]
+
+    topic_sources["live"] += 1
+    articles = await fetch_articles_for_topic(session, topic_name, search_query, since, lang)
+    await save_articles(articles, topic_name, lang)
+    return articles
+
+
 def build_search_queries(enabled_topics: list, custom_topics: list, lang: str = "ru") -> list[tuple[str, str]]:
     """Строим поисковые запросы из тем пользователя"""
     queries = []
@@ -134,28 +396,75 @@ def build_search_queries(enabled_topics: list, custom_topics: list, lang: str =
     return queries
 
 
+def article_hashes(art: dict) -> list[int]:
+    """64-битные хэши URL статьи и склеенных с ней дублей — ключи в seen_articles"""
+    urls = [art["url"], *art.get("extra_sources", [])]
+    return [
+        int.from_bytes(hashlib.blake2b(url.split("#")[0].rstrip("/").encode(), digest_size=8).digest(), "big", signed=True)
+        for url in urls
+    ]
+
+
+async def skip_seen(user_ids: list[int], articles: list[dict]) -> list[dict]:
+    """Убрать новости, которые уже получали все user_ids: хватает любого источника из кластера.
+
+    Статьи без даты фильтр по времени пропускает, поэтому повторы ловятся здесь.
+    Для группы рассылки новость остаётся, если её не видел хотя бы один получатель.
+    """
+    hashes = {art["url"]: article_hashes(art) for art in articles}
+    all_hashes = [h for group in hashes.values() for h in group]
+    seen = [await get_seen_articles(user_id, all_hashes) for user_id in user_ids]
+    fresh = [art for art in articles if not all(s.intersection(hashes[art["url"]]) for s in seen)]
+    skipped = len(articles) - len(fresh)
+    if skipped:
+        metrics.inc("news_seen_skipped_total", skipped)
+        note("seen_skipped", skipped)
+    return fresh
+
+
+def delivered_articles(articles: list[dict], digest: str) -> list[dict]:
+    """Статьи, которые дошли до пользователя: ссылка на них (или на склеенный дубль) есть в тексте.
+
+    Так не считаются показанными статьи упавшей секции, срезанные под время чтения
+    или упаковкой промпта, и те, что модель сама не включила.
+    """
+    return [
+        art for art in articles
+        if any(url in digest or html.escape(url) in digest for url in [art["url"], *art.get("extra_sources", [])])
+    ]
+
+
+async def remember_delivered(user_id: int | None, articles: list[dict], digest: str):
+    """Отметить показанными статьи, попавшие в текст дайджеста"""
+    if user_id is None or not SEEN_ARTICLES_ENABLED or not articles:
+        return
+    delivered = delivered_articles(articles, digest)
+    try:
+        await mark_articles_seen(user_id, [h for art in delivered for h in article_hashes(art)])
+    except Exception as e:
+        logger.warning(f"Не удалось запомнить показанные статьи: {e}")
+
+
 async def collect_all_news(
     enabled_topics: list,
     custom_topics: list,
     lang: str = "ru",
     since: datetime = None,
+    user_ids: list[int] | None = None,
 ) -> list[dict]:
-    """Собрать все новости по всем темам"""
+    """Собрать все новости по всем темам; с user_ids — без уже показанных им"""
     queries = build_search_queries(enabled_topics, custom_topics, lang)
 
     if not queries:
         return []
 
-    connector = aiohttp.TCPConnector(limit=10, ssl=False)
-    async with aiohttp.ClientSession(
-        connector=connector,
-        headers={"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
-    ) as session:
-        tasks = [
-            fetch_articles_for_topic(session, topic_name, query, since)
-            for topic_name, query in queries
-        ]
-        results = await asyncio.gather(*tasks)
+    custom = set(custom_topics)
+    session = get_session()
+    tasks = [
+        get_topic_articles(session, topic_name, query, since, lang, match_stored=topic_name in custom)
+        for topic_name, query in queries
+    ]
+    results = await asyncio.gather(*tasks)
 
     # Объединяем все статьи
     all_articles = []
@@ -170,9 +479,37 @@ async def collect_all_news(
             seen_urls.add(art["url"])
             unique.append(art)
 
+    # Одна новость из разных изданий — одна статья со списком источников
+    if DEDUP_ENABLED:
+        with span("dedup"):
+            clustered = cluster_articles(unique)
+        logger.info(f"Склейка дублей: {len(unique)} → {len(clustered)} статей")
+        unique = clustered
+    if user_ids and SEEN_ARTICLES_ENABLED:
+        unique = await skip_seen(user_ids, unique)
+    note("articles", len(unique))
+
+    logger.info(
+        f"Кэш статей: {article_cache.stats()}, кэш поиска: {search_cache.stats()}, "
+        f"источники тем: {dict(topic_sources)}, HTTP: {fetch_stats.stats()}, "
+        f"домены: {domain_guard.stats(top=5)}, медленные темы: {topic_fetch_stats()}, "
+        f"отменено загрузок: {dict(fetch_cancelled)}"
+    )
     return unique
 
 
+def article_block(index: int, art: dict, with_topic: bool = True) -> str:
+    """Статья в том виде, в каком она уходит в промпт"""
+    lines = [f"\n--- Статья {index} ---"]
+    if with_topic:
+        lines.append(f"Тема: {art['topic']}")
+    lines += [f"Заголовок: {art['title']}", f"Источник: {art['source']}", f"URL: {art['url']}"]
+    if art.get("extra_sources"):
+        lines.append(f"Другие источники: {', '.join(art['extra_sources'])}")
+    lines.append(f"Текст: {art['text']}\n")
+    return "\n".join(lines)
+
+
 def build_prompt(
     articles: list[dict],
     language_level: str,
@@ -187,15 +524,12 @@ def build_prompt(
 
     lang_instruction = "Отвечай на русском языке." if digest_lang == "ru" else "Respond in English."
 
-    # Собираем тексты статей
-    articles_text = ""
-    for i, art in enumerate(articles, 1):
-        articles_text += f"\n--- Статья {i} ---\n"
-        articles_text += f"Тема: {art['topic']}\n"
-        articles_text += f"Заголовок: {art['title']}\n"
-        articles_text += f"Источник: {art['source']}\n"
-        articles_text += f"URL: {art['url']}\n"
-        articles_text += f"Текст: {art['text']}\n"
+    # Статьи ужимаем под бюджет токенов, пропорциональный времени чтения
+    packed = pack_articles(
+        articles, prompt_budget(reading_time),
+        overhead=lambda art: estimate_tokens(article_block(0, {**art, "text": ""})),
+    )
+    articles_text = "".join(article_block(i, art) for i, art in enumerate(packed, 1))
 
     important_instruction = ""
     if important_only:
@@ -242,6 +576,261 @@ def build_prompt(
     return prompt
 
 
+SYSTEM_PROMPT = "Ты профессиональный новостной редактор. Твои дайджесты точные, структурированные и без воды."
+NO_NEWS_TEXT = "😕 Не удалось найти новости по выбранным темам. Попробуй позже или добавь больше тем."
+
+
+def group_by_topic(articles: list[dict]) -> dict[str, list[dict]]:
+    """Статьи по темам в порядке первого появления"""
+    groups: dict[str, list[dict]] = {}
+    for art in articles:
+        groups.setdefault(art["topic"], []).append(art)
+    return groups
+
+
+def articles_hash(articles: list[dict]) -> str:
+    """Хэш набора статей — одинаковый у всех, кому достались те же URL"""
+    return hashlib.sha1("\n".join(sorted(art["url"] for art in articles)).encode()).hexdigest()
+
+
+def count_words(text: str) -> int:
+    return len(re.sub(r"<[^>]+>", " ", text).split())
+
+
+def build_topic_prompt(topic: str, articles: list[dict], language_level: str, digest_lang: str) -> str:
+    """Промпт для секции одной темы (этап 1 двухэтапного пайплайна)"""
+    level_prompt = LANGUAGE_LEVELS.get(language_level, LANGUAGE_LEVELS["medium"])["prompt"]
+    lang_instruction = "Отвечай на русском языке." if digest_lang == "ru" else "Respond in English."
+
+    articles_text = "".join(article_block(i, art, with_topic=False) for i, art in enumerate(articles, 1))
+
+    return f"""Ты — профессиональный новостной редактор. Сделай раздел дайджеста по теме «{topic}».
+
+ПРАВИЛА:
+1. Включай ТОЛЬКО подтверждённые факты. Если информация есть только в одном источнике и выглядит сомнительно — отметь это.
+2. Убери всю "воду": мнения, спекуляции, кликбейт, рекламу.
+3. Каждая новость: заголовок + суть в 2-3 предложениях + источник (URL).
+4. Если несколько источников пишут об одном — объедини и укажи все источники.
+5. Самые важные новости — первыми.
+
+СТИЛЬ: {level_prompt}
+ЯЗЫК: {lang_instruction}
+
+ФОРМАТ ОТВЕТА (HTML, без заголовка темы, только список новостей):
+
+▸ <b>Заголовок новости</b>
+Краткое описание сути. Что произошло, почему важно.
+🔗 <a href="URL">Источник</a>
+
+ВОТ СТАТЬИ:
+{articles_text}"""
+
+
+def record_response(kind: str, seconds: float, prompt: str, response):
+    """Метрики ответа LLM: токены из usage, а если API его не прислал — наша оценка"""
+    usage = getattr(response, "usage", None)
+    if usage:
+        record_llm(kind, seconds, usage.prompt_tokens, usage.completion_tokens)
+    else:
+        answer = response.choices[0].message.content or ""
+        record_llm(kind, seconds, estimate_tokens(prompt), estimate_tokens(answer))
+
+
+async def summarize_topic(topic: str, articles: list[dict], language_level: str, digest_lang: str) -> str | None:
+    """Секция дайджеста по одной теме; общая для всех пользователей с теми же статьями и настройками"""
+    key = (topic.lower(), articles_hash(articles), language_level, digest_lang)
+    section = section_cache.get(key)
+    if section is not None:
+        return section
+
+    async def do_summarize():
+        prompt = build_topic_prompt(topic, articles, language_level, digest_lang)
+        async with section_semaphore:
+            start = time.perf_counter()
+            try:
+                with span("llm"):
+                    response = await client.chat.completions.create(
+                        model=DEEPSEEK_MODEL,
+                        messages=[
+                            {"role": "system", "content": SYSTEM_PROMPT},
+                            {"role": "user", "content": prompt},
+                        ],
+                        temperature=0.3,
+                        max_tokens=SECTION_MAX_TOKENS,
+                    )
+            except Exception as e:
+                metrics.inc("news_llm_errors_total", kind="section")
+                logger.error(f"Ошибка DeepSeek API для темы «{topic}»: {e}")
+                return None  # ошибки не кэшируем
+            record_response("section", time.perf_counter() - start, prompt, response)
+        section = (response.choices[0].message.content or "").strip()
+        if section:
+            section_cache.set(key, section)
+        return section or None
+
+    return await section_flight.do(key, do_summarize)
+
+
+def trim_section(topic: str, section: str, max_words: float, measure=count_words) -> tuple[str, int]:
+    """Заголовок темы + столько новостей секции, сколько влезает в max_words (минимум одна).
+
+    measure — чем мерить объём: словами для читателя или токенами для промпта.
+    """
+    items = [item.strip() for item in re.split(r"\n\s*(?=▸)", section) if item.strip()]
+    header = f"<b>📌 {topic.upper()}</b>"
+    kept, used = [], measure(header)
+    for item in items:
+        words = measure(item)
+        if kept and used + words > max_words:
+            break
+        kept.append(item)
+        used += words
+    return header + "\n\n" + "\n\n".join(kept), used
+
+
+async def stream_sections_digest(
+    articles: list[dict],
+    language_level: str,
+    reading_time: int,
+    digest_lang: str,
+) -> AsyncIterator[str]:
+    """Двухэтапный дайджест: секции по темам из кэша (или LLM), затем склейка и обрезка под время чтения"""
+    groups = group_by_topic(articles)
+    tasks = [
+        asyncio.ensure_future(summarize_topic(topic, arts, language_level, digest_lang))
+        for topic, arts in groups.items()
+    ]
+    budget = reading_time * WORDS_PER_MINUTE
+    produced = 0
+    try:
+        for i, (topic, task) in enumerate(zip(groups, tasks)):
+            section = await task
+            if not section:
+                continue
+            # Поровну на оставшиеся темы: недобор коротких секций достаётся следующим
+            text, used = trim_section(topic, section, budget / (len(tasks) - i))
+            budget -= used
+            yield ("\n\n" if produced else "") + text
+            produced += 1
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    if not produced:
+        yield "❌ Ошибка генерации дайджеста: ни одна тема не обработана"
+
+
+def use_sections(important_only: bool) -> bool:
+    # «Только важное» требует сравнить новости всех тем между собой — это один проход LLM
+    return SECTION_CACHE_ENABLED and not important_only
+
+
+def use_map_reduce(articles: list[dict]) -> bool:
+    """Слишком много статей для одного вызова: модель читает медленно и обрезает ответ"""
+    if len(articles) >= MAPREDUCE_MIN_ARTICLES:
+        return True
+    return sum(estimate_tokens(art["text"]) for art in articles) >= MAPREDUCE_MIN_TOKENS
+
+
+def build_reduce_prompt(
+    sections: list[tuple[str, str]],
+    language_level: str,
+    reading_time: int,
+    digest_lang: str,
+    important_only: bool = False,
+    importance_level: str = "medium",
+) -> str:
+    """Промпт reduce-этапа: из готовых секций по темам собрать один дайджест"""
+    target_words = reading_time * WORDS_PER_MINUTE
+    level_prompt = LANGUAGE_LEVELS.get(language_level, LANGUAGE_LEVELS["medium"])["prompt"]
+    lang_instruction = "Отвечай на русском языке." if digest_lang == "ru" else "Respond in English."
+
+    # Секции делят бюджет промпта поровну, лишние новости срезаются с конца секции
+    shares = allocate([estimate_tokens(section) for _, section in sections], prompt_budget(reading_time))
+    sections_text = "\n\n".join(
+        trim_section(topic, section, share, measure=estimate_tokens)[0]
+        for (topic, section), share in zip(sections, shares)
+    )
+
+    if important_only:
+        level_map = {
+            "low": "Оставь все более-менее значимые новости (10-15 штук).",
+            "medium": "Оставь только действительно важные новости (5-7 штук).",
+            "high": "Оставь только самые критичные, топовые новости дня (3-5 штук).",
+        }
+        selection = f"""РЕЖИМ "ТОЛЬКО ВАЖНОЕ": {level_map.get(importance_level, level_map["medium"])}
+Отбирай новости по реальной значимости и влиянию на мир/отрасль, сравнивая все темы между собой."""
+    else:
+        selection = "Сохрани все темы, в каждой — самые важные новости."
+
+    return f"""Ты — профессиональный новостной редактор. Ниже — черновые разделы дайджеста по темам, уже очищенные от воды.
+Собери из них итоговый дайджест.
+
+ПРАВИЛА:
+1. {selection}
+2. Не добавляй фактов, которых нет в разделах. Ссылки на источники сохраняй как есть.
+3. Если одна новость попала в несколько тем — оставь её один раз, в самой подходящей теме.
+
+СТИЛЬ: {level_prompt}
+ЯЗЫК: {lang_instruction}
+ОБЪЁМ: примерно {target_words} слов (чтение ~{reading_time} минут).
+
+ФОРМАТ ОТВЕТА:
+Используй такой формат (Telegram MarkdownV2 НЕ используй, используй HTML):
+
+<b>📌 НАЗВАНИЕ ТЕМЫ</b>
+
+▸ <b>Заголовок новости</b>
+Краткое описание сути. Что произошло, почему важно.
+🔗 <a href="URL">Источник</a>
+
+---
+
+ВОТ РАЗДЕЛЫ:
+{sections_text}
+
+Создай дайджест:"""
+
+
+async def map_reduce_prompt(
+    articles: list[dict],
+    language_level: str,
+    reading_time: int,
+    digest_lang: str,
+    important_only: bool = False,
+    importance_level: str = "medium",
+) -> str | None:
+    """Map: секции по темам параллельно (через кэш секций); None — ни одна тема не обработана"""
+    groups = group_by_topic(articles)
+    results = await asyncio.gather(*[
+        summarize_topic(topic, arts, language_level, digest_lang) for topic, arts in groups.items()
+    ])
+    sections = [(topic, section) for topic, section in zip(groups, results) if section]
+    logger.info(f"Map-reduce: {len(articles)} статей, секций {len(sections)} из {len(groups)}")
+    if not sections:
+        return None
+    with span("prompt"):
+        return build_reduce_prompt(
+            sections, language_level, reading_time, digest_lang, important_only, importance_level
+        )
+
+
+async def digest_prompt(
+    articles: list[dict],
+    language_level: str,
+    reading_time: int,
+    digest_lang: str,
+    important_only: bool = False,
+    importance_level: str = "medium",
+) -> str | None:
+    """Промпт итогового вызова: все статьи сразу или, для больших наборов, свёртка секций"""
+    args = (articles, language_level, reading_time, digest_lang, important_only, importance_level)
+    if use_map_reduce(articles):
+        return await map_reduce_prompt(*args)
+    with span("prompt"):
+        return build_prompt(*args)
+
+
 async def generate_digest(
     articles: list[dict],
     language_level: str,
@@ -252,37 +841,103 @@ async def generate_digest(
 ) -> str:
     """Генерация дайджеста через DeepSeek"""
     if not articles:
-        return "😕 Не удалось найти новости по выбранным темам. Попробуй позже или добавь больше тем."
+        return NO_NEWS_TEXT
+
+    if use_sections(important_only):
+        return "".join([
+            chunk async for chunk in stream_sections_digest(articles, language_level, reading_time, digest_lang)
+        ])
 
-    prompt = build_prompt(articles, language_level, reading_time, digest_lang, important_only, importance_level)
+    prompt = await digest_prompt(articles, language_level, reading_time, digest_lang, important_only, importance_level)
+    if prompt is None:
+        return "❌ Ошибка генерации дайджеста: ни одна тема не обработана"
 
+    start = time.perf_counter()
     try:
-        response = await client.chat.completions.create(
-            model=DEEPSEEK_MODEL,
-            messages=[
-                {"role": "system", "content": "Ты профессиональный новостной редактор. Твои дайджесты точные, структурированные и без воды."},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.3,
-            max_tokens=4000,
-        )
-        return response.choices[0].message.content
+        with span("llm"):
+            response = await client.chat.completions.create(
+                model=DEEPSEEK_MODEL,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt},
+                ],
+                temperature=0.3,
+                max_tokens=output_budget(reading_time),
+            )
     except Exception as e:
+        metrics.inc("news_llm_errors_total", kind="digest")
         logger.error(f"Ошибка DeepSeek API: {e}")
         return f"❌ Ошибка генерации дайджеста: {e}"
+    record_response("digest", time.perf_counter() - start, prompt, response)
+    return response.choices[0].message.content
 
 
-async def get_news_digest(
+async def stream_digest(
+    articles: list[dict],
+    language_level: str,
+    reading_time: int,
+    digest_lang: str,
+    important_only: bool = False,
+    importance_level: str = "medium",
+) -> AsyncIterator[str]:
+    """Генерация дайджеста через DeepSeek по кускам, по мере прихода ответа (stream=True)"""
+    if not articles:
+        yield NO_NEWS_TEXT
+        return
+
+    if use_sections(important_only):
+        async for chunk in stream_sections_digest(articles, language_level, reading_time, digest_lang):
+            yield chunk
+        return
+
+    prompt = await digest_prompt(articles, language_level, reading_time, digest_lang, important_only, importance_level)
+    if prompt is None:
+        yield "❌ Ошибка генерации дайджеста: ни одна тема не обработана"
+        return
+
+    start = time.perf_counter()
+    usage, parts = None, []
+    try:
+        with span("llm"):
+            stream = await client.chat.completions.create(
+                model=DEEPSEEK_MODEL,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt},
+                ],
+                temperature=0.3,
+                max_tokens=output_budget(reading_time),
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+            async for chunk in stream:
+                usage = chunk.usage or usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if not parts:
+                        metrics.observe("news_llm_first_token_seconds", time.perf_counter() - start)
+                    parts.append(chunk.choices[0].delta.content)
+                    yield parts[-1]
+    except Exception as e:
+        metrics.inc("news_llm_errors_total", kind="digest")
+        logger.error(f"Ошибка DeepSeek API: {e}")
+        yield f"\n\n❌ Ошибка генерации дайджеста: {e}"
+        return
+    record_llm(
+        "digest",
+        time.perf_counter() - start,
+        usage.prompt_tokens if usage else estimate_tokens(prompt),
+        usage.completion_tokens if usage else estimate_tokens("".join(parts)),
+    )
+
+
+async def collect_for_digest(
     enabled_topics: list,
     custom_topics: list,
-    language_level: str = "medium",
-    reading_time: int = 7,
     digest_lang: str = "ru",
-    important_only: bool = False,
-    importance_level: str = "medium",
     last_viewed_at: str = None,
-) -> str:
-    """Полный пайплайн: поиск → парсинг → дайджест"""
+    user_ids: list[int] | None = None,
+) -> list[dict]:
+    """Статьи для дайджеста с учётом времени последнего просмотра и уже показанных статей"""
     # Парсим дату последнего просмотра
     since = None
     if last_viewed_at:
@@ -291,15 +946,107 @@ async def get_news_digest(
         except Exception:
             pass
 
-    articles = await collect_all_news(enabled_topics, custom_topics, digest_lang, since)
+    return await collect_all_news(enabled_topics, custom_topics, digest_lang, since, user_ids)
 
-    digest = await generate_digest(
-        articles=articles,
-        language_level=language_level,
-        reading_time=reading_time,
-        digest_lang=digest_lang,
-        important_only=important_only,
-        importance_level=importance_level,
-    )
+
+async def get_news_digest(
+    enabled_topics: list,
+    custom_topics: list,
+    language_level: str = "medium",
+    reading_time: int = 7,
+    digest_lang: str = "ru",
+    important_only: bool = False,
+    importance_level: str = "medium",
+    last_viewed_at: str = None,
+    user_id: int | None = None,
+) -> str:
+    """Полный пайплайн: поиск → парсинг → дайджест; с user_id статьи запоминаются как показанные"""
+    with digest_trace(
+        mode="plain", topics=len(enabled_topics), custom=len(custom_topics),
+        reading_time=reading_time, lang=digest_lang, important_only=important_only,
+    ):
+        with span("collect"):
+            articles = await collect_for_digest(
+                enabled_topics, custom_topics, digest_lang, last_viewed_at,
+                [user_id] if user_id is not None else None,
+            )
+
+        digest = await generate_digest(
+            articles=articles,
+            language_level=language_level,
+            reading_time=reading_time,
+            digest_lang=digest_lang,
+            important_only=important_only,
+            importance_level=importance_level,
+        )
+        await remember_delivered(user_id, articles, digest)
 
     return digest
+
+
+async def get_group_digest(
+    user_ids: list[int],
+    enabled_topics: list,
+    custom_topics: list,
+    language_level: str = "medium",
+    reading_time: int = 7,
+    digest_lang: str = "ru",
+    last_viewed_at: str = None,
+) -> tuple[str, list[dict]]:
+    """Один дайджест на группу рассылки: без статей, которые уже видели все её получатели.
+
+    Вместе с текстом возвращает собранные статьи: показанными их отмечает рассылка
+    (remember_delivered) для каждого, кому сообщение действительно ушло.
+    """
+    with digest_trace(
+        mode="push", topics=len(enabled_topics), custom=len(custom_topics),
+        reading_time=reading_time, lang=digest_lang, important_only=False, users=len(user_ids),
+    ):
+        with span("collect"):
+            articles = await collect_for_digest(enabled_topics, custom_topics, digest_lang, last_viewed_at, user_ids)
+
+        digest = await generate_digest(
+            articles=articles,
+            language_level=language_level,
+            reading_time=reading_time,
+            digest_lang=digest_lang,
+        )
+
+    return digest, articles
+
+
+async def stream_news_digest(
+    enabled_topics: list,
+    custom_topics: list,
+    language_level: str = "medium",
+    reading_time: int = 7,
+    digest_lang: str = "ru",
+    important_only: bool = False,
+    importance_level: str = "medium",
+    last_viewed_at: str = None,
+    user_id: int | None = None,
+) -> AsyncIterator[str]:
+    """Тот же пайплайн, но дайджест отдаётся кусками по мере генерации"""
+    with digest_trace(
+        mode="stream", topics=len(enabled_topics), custom=len(custom_topics),
+        reading_time=reading_time, lang=digest_lang, important_only=important_only,
+    ):
+        with span("collect"):
+            articles = await collect_for_digest(
+                enabled_topics, custom_topics, digest_lang, last_viewed_at,
+                [user_id] if user_id is not None else None,
+            )
+
+        parts = []
+        async for chunk in stream_digest(
+            articles=articles,
+            language_level=language_level,
+            reading_time=reading_time,
+            digest_lang=digest_lang,
+            important_only=important_only,
+            importance_level=importance_level,
+        ):
+            parts.append(chunk)
+            yield chunk
+        # Сюда доходим, только если стрим дочитали до конца
+        await remember_delivered(user_id, articles, "".join(parts))
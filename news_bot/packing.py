@@ -0,0 +1,113 @@
+"""Упаковка статей в промпт под бюджет токенов
+
+Токены оцениваются по длине текста (кириллица «дороже» латиницы), бюджет делится
+между темами поровну — как и время чтения, — а статьи обрезаются по границе предложения.
+"""
+
+import re
+from collections.abc import Callable
+
+from config import (
+    WORDS_PER_MINUTE, PROMPT_TOKENS_PER_MINUTE, PROMPT_MAX_TOKENS, PROMPT_MIN_ARTICLE_TOKENS,
+    DIGEST_TOKENS_PER_WORD, DIGEST_MIN_TOKENS, DIGEST_MAX_TOKENS,
+)
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?…])\s+")
+
+# Символов на токен для BPE-токенизаторов DeepSeek/OpenAI
+CHARS_PER_TOKEN_CYRILLIC = 2.5
+CHARS_PER_TOKEN_OTHER = 4.0
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка числа токенов без токенизатора"""
+    # Кириллица в UTF-8 занимает два байта — разница длин считается в C и почти бесплатна
+    cyrillic = len(text.encode()) - len(text)
+    return int(cyrillic / CHARS_PER_TOKEN_CYRILLIC + (len(text) - cyrillic) / CHARS_PER_TOKEN_OTHER) + 1
+
+
+def prompt_budget(reading_time: int) -> int:
+    """Сколько токенов статей отправлять в LLM при данном времени чтения"""
+    return min(reading_time * PROMPT_TOKENS_PER_MINUTE, PROMPT_MAX_TOKENS)
+
+
+def output_budget(reading_time: int) -> int:
+    """max_tokens ответа: объём дайджеста в словах плюс HTML-разметка и ссылки"""
+    tokens = int(reading_time * WORDS_PER_MINUTE * DIGEST_TOKENS_PER_WORD)
+    return max(DIGEST_MIN_TOKENS, min(tokens, DIGEST_MAX_TOKENS))
+
+
+def allocate(demands: list[int], budget: int) -> list[int]:
+    """Делит бюджет поровну, но не больше запрошенного; недобор скромных достаётся остальным"""
+    shares = [0] * len(demands)
+    left, remaining = budget, len(demands)
+    for i in sorted(range(len(demands)), key=demands.__getitem__):
+        shares[i] = min(demands[i], left // remaining)
+        left -= shares[i]
+        remaining -= 1
+    return shares
+
+
+def trim_to_tokens(text: str, max_tokens: int) -> str:
+    """Начало текста, целыми предложениями влезающее в max_tokens"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    kept, used = [], 0
+    for sentence in _SENTENCE_RE.split(text):
+        tokens = estimate_tokens(sentence) + 1
+        if used + tokens > max_tokens:
+            break
+        kept.append(sentence)
+        used += tokens
+    if kept:
+        return " ".join(kept)
+    # Первое предложение само не влезает — режем по словам
+    words = text.split()
+    kept_words, used = [], 0
+    for word in words:
+        tokens = estimate_tokens(word)
+        if used + tokens > max_tokens:
+            break
+        kept_words.append(word)
+        used += tokens
+    return " ".join(kept_words) + "…"
+
+
+def pack_topic(articles: list[dict], budget: int, overheads: list[int]) -> list[dict]:
+    """Статьи одной темы в пределах budget; overheads — токены служебных строк каждой статьи"""
+    demands = [overhead + estimate_tokens(art["text"]) for art, overhead in zip(articles, overheads)]
+    # Статьи, которым не хватает даже на минимальный текст, отбрасываем с конца (они ниже в выдаче)
+    count, shares = len(articles), []
+    while count:
+        shares = allocate(demands[:count], budget)
+        if all(share - overhead >= min(PROMPT_MIN_ARTICLE_TOKENS, demand - overhead)
+               for share, overhead, demand in zip(shares, overheads, demands)):
+            break
+        count -= 1
+
+    packed = []
+    for art, share, overhead, demand in zip(articles[:count], shares, overheads, demands):
+        if share < demand:
+            art = {**art, "text": trim_to_tokens(art["text"], share - overhead)}
+        packed.append(art)
+    return packed
+
+
+def pack_articles(articles: list[dict], budget: int, overhead: Callable[[dict], int]) -> list[dict]:
+    """Статьи всех тем под общий бюджет токенов; порядок тем и статей сохраняется.
+
+    overhead(art) — токены всего, кроме текста статьи (заголовок, источник, URL).
+    """
+    groups: dict[str, list[dict]] = {}
+    for art in articles:
+        groups.setdefault(art["topic"], []).append(art)
+
+    overheads = {topic: [overhead(art) for art in arts] for topic, arts in groups.items()}
+    demands = [
+        sum(overheads[topic]) + sum(estimate_tokens(art["text"]) for art in arts)
+        for topic, arts in groups.items()
+    ]
+    packed = []
+    for (topic, arts), share in zip(groups.items(), allocate(demands, budget)):
+        packed.extend(pack_topic(arts, share, overheads[topic]))
+    return packed
@@ -0,0 +1,116 @@
+"""Фоновый прогрев тем: периодический поиск и парсинг пресетов и популярных кастомных тем"""
+
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta, timezone
+
+from config import (
+    PRESET_TOPICS, PREFETCH_INTERVAL, PREFETCH_INTERVALS, PREFETCH_JITTER,
+    PREFETCH_CONCURRENCY, PREFETCH_LANGS, PREFETCH_CUSTOM_LIMIT, PREFETCH_CUSTOM_MIN_USERS,
+    ARTICLE_STORE_DAYS, FEEDS_ENABLED,
+)
+from database import get_popular_custom_topics, prune_articles, to_db_timestamp
+from feeds import has_feeds
+from fetcher import get_session
+from news_engine import build_search_queries, refresh_topic, article_cache
+
+logger = logging.getLogger(__name__)
+
+
+class PrefetchScheduler:
+    """Держит темы прогретыми, чтобы get_news_digest делал только шаг с LLM.
+
+    Каждая тема обновляется в своём цикле со своим интервалом и джиттером,
+    общее число одновременных обновлений ограничено семафором.
+    Чистка хранилища (start_maintenance) запускается отдельно: она нужна и с выключенным прогревом.
+    """
+
+    def __init__(
+        self,
+        intervals: dict[str, int] = PREFETCH_INTERVALS,
+        default_interval: int = PREFETCH_INTERVAL,
+        jitter: float = PREFETCH_JITTER,
+        concurrency: int = PREFETCH_CONCURRENCY,
+        langs: list[str] = PREFETCH_LANGS,
+    ):
+        self.intervals = intervals
+        self.default_interval = default_interval
+        self.jitter = jitter
+        self.langs = langs
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks: list[asyncio.Task] = []
+        self._maintenance: asyncio.Task | None = None
+        self.refreshed = 0
+        self.failed = 0
+
+    def _sleep_time(self, interval: float) -> float:
+        return interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    async def _refresh(self, topic_ids: list[str], custom: list[str], lang: str):
+        # Запрос строим заново при каждом обновлении — в нём есть текущий месяц
+        for topic_name, query in build_search_queries(topic_ids, custom, lang):
+            async with self._semaphore:
+                try:
+                    count = await refresh_topic(get_session(), topic_name, query, lang)
+                    self.refreshed += 1
+                    logger.debug(f"Прогрев «{topic_name}» ({lang}): {count} статей")
+                except Exception as e:
+                    self.failed += 1
+                    logger.warning(f"Ошибка прогрева «{topic_name}»: {e}")
+
+    async def _topic_loop(self, topic_id: str, lang: str):
+        interval = self.intervals.get(topic_id, self.default_interval)
+        # Разносим первый запуск, чтобы все темы не стартовали одновременно
+        await asyncio.sleep(random.uniform(0, interval * self.jitter))
+        while True:
+            await self._refresh([topic_id], [], lang)
+            await asyncio.sleep(self._sleep_time(interval))
+
+    async def _custom_loop(self, lang: str):
+        while True:
+            try:
+                custom = await get_popular_custom_topics(PREFETCH_CUSTOM_LIMIT, PREFETCH_CUSTOM_MIN_USERS)
+            except Exception as e:
+                logger.warning(f"Не удалось получить популярные темы: {e}")
+                custom = []
+            if custom:
+                await self._refresh([], custom, lang)
+            await asyncio.sleep(self._sleep_time(self.default_interval))
+
+    async def _maintenance_loop(self):
+        """Раз в час чистим старые статьи, записи лент и показанных статей, просроченный кэш"""
+        while True:
+            await asyncio.sleep(60 * 60)
+            try:
+                cutoff = datetime.now(timezone.utc) - timedelta(days=ARTICLE_STORE_DAYS)
+                await prune_articles(to_db_timestamp(cutoff))
+                await article_cache.purge_expired()
+            except Exception as e:
+                logger.warning(f"Ошибка очистки хранилища статей: {e}")
+
+    def start(self):
+        if self._tasks:
+            return
+        for lang in self.langs:
+            for topic_id in PRESET_TOPICS:
+                if FEEDS_ENABLED and has_feeds(topic_id, lang):
+                    continue  # тему держит свежей опрос лент
+                self._tasks.append(asyncio.create_task(self._topic_loop(topic_id, lang)))
+            self._tasks.append(asyncio.create_task(self._custom_loop(lang)))
+        logger.info(f"Прогрев тем запущен: {len(self._tasks)} циклов")
+
+    def start_maintenance(self):
+        if self._maintenance is None:
+            self._maintenance = asyncio.create_task(self._maintenance_loop())
+
+    async def stop(self):
+        tasks = [t for t in (*self._tasks, self._maintenance) if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._maintenance = None
+
+    def stats(self) -> dict:
+        return {"loops": len(self._tasks), "refreshed": self.refreshed, "failed": self.failed}
@@ -0,0 +1,146 @@
+"""Рассылка дайджестов по расписанию: пользователи группируются по интервалам времени и настройкам"""
+
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timedelta
+
+from config import PUSH_BUCKET_MINUTES, PUSH_CONCURRENCY
+from database import get_due_users, mark_pushed, to_db_timestamp
+from news_engine import get_group_digest, remember_delivered, NO_NEWS_TEXT
+from ratelimit import Clock
+
+logger = logging.getLogger(__name__)
+
+
+def settings_key(user: dict) -> tuple:
+    """Пользователи с одинаковым ключом получают один и тот же дайджест"""
+    return (
+        tuple(sorted(user["enabled_topics"])),
+        tuple(sorted(topic.lower() for topic in user["custom_topics"])),
+        user["language_level"],
+        user["reading_time"],
+        user["digest_lang"],
+    )
+
+
+class PushScheduler:
+    """Раз в bucket_minutes берёт пользователей, у которых наступило время рассылки,
+    генерирует каждый уникальный дайджест один раз и рассылает его всей группе.
+
+    send(chat_id, text) отвечает за отправку и лимиты Telegram, generate — за дайджест
+    и статьи, собранные для него; вместе с FakeClock это позволяет проверять расписание без сети.
+    Статьи дайджеста отмечаются показанными только у тех, кому отправка удалась.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[int, str], Awaitable[None]],
+        clock: Clock | None = None,
+        bucket_minutes: int = PUSH_BUCKET_MINUTES,
+        concurrency: int = PUSH_CONCURRENCY,
+        generate: Callable[..., Awaitable[tuple[str, list[dict]]]] = get_group_digest,
+    ):
+        self.send = send
+        self.clock = clock or Clock()
+        self.bucket_minutes = bucket_minutes
+        self.generate = generate
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._task: asyncio.Task | None = None
+        self._running: set[asyncio.Task] = set()
+        self.generated = 0
+        self.delivered = 0
+        self.failed = 0
+
+    async def run_bucket(self, bucket_start: datetime) -> int:
+        """Разослать дайджесты пользователям интервала [bucket_start, bucket_start + bucket_minutes)"""
+        start_minute = bucket_start.hour * 60 + bucket_start.minute
+        # Защита от повторной отправки, если интервал обработается дважды
+        pushed_before = to_db_timestamp(bucket_start - timedelta(hours=12))
+        users = await get_due_users(start_minute, start_minute + self.bucket_minutes, pushed_before)
+
+        groups: dict[tuple, list[dict]] = {}
+        for user in users:
+            if user["enabled_topics"] or user["custom_topics"]:
+                groups.setdefault(settings_key(user), []).append(user)
+
+        if groups:
+            logger.info(f"Рассылка {bucket_start:%H:%M}: {len(users)} пользователей, {len(groups)} дайджестов")
+        delivered = await asyncio.gather(*[self._deliver_group(group) for group in groups.values()])
+        return sum(delivered)
+
+    async def _deliver_group(self, users: list[dict]) -> int:
+        first = users[0]
+        # Берём самый ранний просмотр в группе, чтобы никто не пропустил новости
+        viewed = [user["last_viewed_at"] for user in users]
+        since = None if None in viewed else min(viewed)
+
+        async with self._semaphore:
+            try:
+                digest, articles = await self.generate(
+                    user_ids=[user["user_id"] for user in users],
+                    enabled_topics=first["enabled_topics"],
+                    custom_topics=first["custom_topics"],
+                    language_level=first["language_level"],
+                    reading_time=first["reading_time"],
+                    digest_lang=first["digest_lang"],
+                    last_viewed_at=since,
+                )
+            except Exception as e:
+                self.failed += len(users)
+                logger.error(f"Ошибка генерации дайджеста для рассылки: {e}")
+                return 0
+        self.generated += 1
+
+        if digest.startswith("❌"):
+            self.failed += len(users)
+            return 0
+
+        delivered = []
+        if digest != NO_NEWS_TEXT:  # пустой дайджест по расписанию не шлём
+            for user in users:
+                try:
+                    await self.send(user["user_id"], digest)
+                    delivered.append(user["user_id"])
+                    await remember_delivered(user["user_id"], articles, digest)
+                except Exception as e:
+                    self.failed += 1
+                    logger.warning(f"Не удалось отправить рассылку {user['user_id']}: {e}")
+        else:
+            delivered = [user["user_id"] for user in users]
+
+        await mark_pushed(delivered, to_db_timestamp(self.clock.now()))
+        self.delivered += len(delivered)
+        return len(delivered)
+
+    async def _loop(self):
+        bucket = timedelta(minutes=self.bucket_minutes)
+        while True:
+            now = self.clock.now()
+            start = now.replace(minute=now.minute - now.minute % self.bucket_minutes, second=0, microsecond=0)
+            next_start = start + bucket
+            await self.clock.sleep((next_start - now).total_seconds())
+            # Интервал обрабатываем в фоне, чтобы долгая генерация не сдвигала следующий
+            task = asyncio.create_task(self._run_safe(next_start))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run_safe(self, bucket_start: datetime):
+        try:
+            await self.run_bucket(bucket_start)
+        except Exception as e:
+            logger.error(f"Ошибка рассылки {bucket_start:%H:%M}: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        tasks = [t for t in (self._task, *self._running) if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+
+    def stats(self) -> dict:
+        return {"generated": self.generated, "delivered": self.delivered, "failed": self.failed}
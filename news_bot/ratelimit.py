@@ -0,0 +1,89 @@
+"""Ограничение частоты: часы (настоящие и фейковые для тестов), token bucket, лимиты отправки в Telegram"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+
+class Clock:
+    """Настоящее время"""
+
+    def now(self) -> datetime:
+        return datetime.now(timezone.utc)
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    async def sleep(self, seconds: float):
+        await asyncio.sleep(seconds)
+
+
+class FakeClock(Clock):
+    """Часы для офлайн-тестов: sleep не ждёт, а сдвигает время вперёд"""
+
+    def __init__(self, start: datetime):
+        self.current = start
+        self._offset = 0.0
+
+    def now(self) -> datetime:
+        return self.current
+
+    def monotonic(self) -> float:
+        return self._offset
+
+    def advance(self, seconds: float):
+        self.current += timedelta(seconds=seconds)
+        self._offset += seconds
+
+    async def sleep(self, seconds: float):
+        self.advance(max(seconds, 0))
+        await asyncio.sleep(0)
+
+
+class TokenBucket:
+    """Не больше rate операций в секунду, всплески до capacity"""
+
+    def __init__(self, rate: float, capacity: float | None = None, clock: Clock | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.clock = clock or Clock()
+        self.tokens = self.capacity
+        self._updated = self.clock.monotonic()
+
+    def _refill(self):
+        now = self.clock.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    async def acquire(self, tokens: float = 1):
+        while not self.try_acquire(tokens):
+            await self.clock.sleep((tokens - self.tokens) / self.rate)
+
+
+class SendRateLimiter:
+    """Лимиты Telegram на отправку: общий на бота и не чаще раза в interval в один чат"""
+
+    def __init__(self, global_rate: float, per_chat_interval: float, clock: Clock | None = None):
+        self.clock = clock or Clock()
+        self.global_bucket = TokenBucket(global_rate, clock=self.clock)
+        self.per_chat_interval = per_chat_interval
+        self._next_at: dict[int, float] = {}
+
+    async def acquire(self, chat_id: int):
+        now = self.clock.monotonic()
+        # Резервируем слот сразу, чтобы параллельные отправки в один чат шли по очереди
+        slot = max(now, self._next_at.get(chat_id, 0.0))
+        self._next_at[chat_id] = slot + self.per_chat_interval
+        if len(self._next_at) > 10000:
+            self._next_at = {k: v for k, v in self._next_at.items() if v > now}
+
+        if slot > now:
+            await self.clock.sleep(slot - now)
+        await self.global_bucket.acquire()
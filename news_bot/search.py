@@ -0,0 +1,166 @@
+"""Поисковые бэкенды новостей с общим асинхронным интерфейсом
+
+- ThreadedDDGBackend — синхронная duckduckgo_search в своём ограниченном пуле потоков
+  (не в пуле по умолчанию, который делят aiosqlite и прочие run_in_executor);
+- AsyncDDGBackend — тот же протокол DuckDuckGo (vqd + news.js) напрямую через aiohttp;
+- FakeSearchBackend — детерминированная выдача без сети для тестов и бенчмарков.
+
+Результат у всех одинаковый: список словарей date/title/body/url/image/source, как у DDGS.news.
+"""
+
+import asyncio
+import hashlib
+import logging
+import re
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from html import unescape
+from urllib.parse import unquote
+
+import aiohttp
+from duckduckgo_search import DDGS
+
+from config import SEARCH_BACKEND, SEARCH_THREADS, REQUEST_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+_TAG_RE = re.compile(r"<.*?>")
+
+
+class SearchBackend(ABC):
+    """Интерфейс поиска: news() асинхронный и пробрасывает ошибки наверх"""
+
+    name = "base"
+
+    @abstractmethod
+    async def news(self, query: str, max_results: int, region: str = "wt-wt") -> list[dict]:
+        ...
+
+    async def close(self):
+        pass
+
+
+class ThreadedDDGBackend(SearchBackend):
+    """duckduckgo_search в отдельном пуле из workers потоков"""
+
+    name = "ddg-thread"
+
+    def __init__(self, workers: int = SEARCH_THREADS):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ddg")
+
+    @staticmethod
+    def _search(query: str, max_results: int, region: str) -> list[dict]:
+        with DDGS() as ddgs:
+            return list(ddgs.news(query, max_results=max_results, region=region))
+
+    async def news(self, query: str, max_results: int, region: str = "wt-wt") -> list[dict]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._search, query, max_results, region)
+
+    async def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class AsyncDDGBackend(SearchBackend):
+    """Новости DuckDuckGo через aiohttp: токен vqd со страницы поиска, затем news.js постранично"""
+
+    name = "ddg-async"
+    BASE_URL = "https://duckduckgo.com"
+
+    def __init__(self, max_pages: int = 3):
+        self.max_pages = max_pages
+        self._session: aiohttp.ClientSession | None = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                headers={"Referer": self.BASE_URL + "/", "User-Agent": "Mozilla/5.0"},
+                timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+            )
+        return self._session
+
+    async def _vqd(self, query: str) -> str:
+        async with self._get_session().get(self.BASE_URL, params={"q": query}) as resp:
+            resp.raise_for_status()
+            html = await resp.read()
+        for start, end in ((b'vqd="', b'"'), (b"vqd=", b"&"), (b"vqd='", b"'")):
+            i = html.find(start)
+            if i != -1:
+                j = html.find(end, i + len(start))
+                if j != -1:
+                    return html[i + len(start):j].decode()
+        raise RuntimeError(f"DuckDuckGo не вернул vqd для '{query}'")
+
+    async def news(self, query: str, max_results: int, region: str = "wt-wt") -> list[dict]:
+        params = {"l": region, "o": "json", "noamp": "1", "q": query, "vqd": await self._vqd(query), "p": "-1"}
+        results, seen = [], set()
+        for _ in range(self.max_pages):
+            async with self._get_session().get(self.BASE_URL + "/news.js", params=params) as resp:
+                resp.raise_for_status()
+                data = await resp.json(content_type=None)
+            for row in data.get("results", []):
+                url = unquote(row["url"]).replace(" ", "+")
+                if url in seen:
+                    continue
+                seen.add(url)
+                results.append({
+                    "date": datetime.fromtimestamp(row["date"], timezone.utc).isoformat(),
+                    "title": row["title"],
+                    "body": unescape(_TAG_RE.sub("", row.get("excerpt") or "")),
+                    "url": url,
+                    "image": unquote(row.get("image") or ""),
+                    "source": row.get("source", ""),
+                })
+                if len(results) >= max_results:
+                    return results
+            next_page = data.get("next")
+            if not next_page:
+                break
+            params["s"] = next_page.split("s=")[-1].split("&")[0]
+        return results
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class FakeSearchBackend(SearchBackend):
+    """Выдача без сети: на каждый запрос одни и те же max_results ссылок на base_url.
+
+    base_url обычно указывает на локальный сервер с HTML-фикстурами; latency — задержка ответа.
+    """
+
+    name = "fake"
+
+    def __init__(self, base_url: str = "http://127.0.0.1:8082", latency: float = 0.0, pages: int = 50):
+        self.base_url = base_url.rstrip("/")
+        self.latency = latency
+        self.pages = pages
+        self.calls = 0
+
+    async def news(self, query: str, max_results: int, region: str = "wt-wt") -> list[dict]:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        seed = int(hashlib.sha1(query.encode()).hexdigest()[:8], 16)
+        now = datetime.now(timezone.utc)
+        return [
+            {
+                "date": (now - timedelta(minutes=10 * i)).isoformat(),
+                "title": f"{query}: новость {i}",
+                "body": "",
+                "url": f"{self.base_url}/article/{(seed + i) % self.pages}?q={seed}",
+                "image": "",
+                "source": "fake",
+            }
+            for i in range(max_results)
+        ]
+
+
+def create_backend(name: str = SEARCH_BACKEND) -> SearchBackend:
+    backends = {"ddg-thread": ThreadedDDGBackend, "ddg-async": AsyncDDGBackend, "fake": FakeSearchBackend}
+    if name not in backends:
+        raise ValueError(f"Неизвестный поисковый бэкенд: {name}")
+    return backends[name]()
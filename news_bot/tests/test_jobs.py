@@ -0,0 +1,195 @@
+"""Очередь дайджестов с фейковым движком: задачи — корутины, которые ждут команды теста
+
+Запуск: python -m unittest discover -s tests (из каталога news_bot)
+"""
+
+import asyncio
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import database  # noqa: E402
+from database import init_db, close_db, claim_job, finish_job  # noqa: E402
+from jobs import AlreadyQueued, DigestQueue, QueueFull, SQLiteDigestQueue  # noqa: E402
+
+
+class FakeEngine:
+    """Дайджест пользователя «генерируется», пока тест не вызовет finish(user_id)"""
+
+    def __init__(self):
+        self.running: set[int] = set()
+        self.max_running = 0
+        self.done: list[int] = []
+        self._release: dict[int, asyncio.Event] = {}
+
+    def job(self, user_id: int, fail: bool = False):
+        self._release[user_id] = asyncio.Event()
+
+        async def run():
+            self.running.add(user_id)
+            self.max_running = max(self.max_running, len(self.running))
+            try:
+                await self._release[user_id].wait()
+                if fail:
+                    raise RuntimeError("LLM недоступен")
+                self.done.append(user_id)
+            finally:
+                self.running.discard(user_id)
+
+        return run
+
+    def finish(self, user_id: int):
+        self._release[user_id].set()
+
+
+async def settle():
+    """Дать воркерам очереди забрать задачи и отработать"""
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+class DigestQueueTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.engine = FakeEngine()
+        self.queue = DigestQueue(workers=2, max_pending=3)
+        self.queue.start()
+
+    async def asyncTearDown(self):
+        await self.queue.stop()
+
+    async def test_runs_at_most_workers_at_once(self):
+        for user_id in range(5):
+            await self.queue.submit(user_id, self.engine.job(user_id))
+            await settle()
+        self.assertEqual(self.engine.running, {0, 1})
+
+        for user_id in range(5):
+            self.engine.finish(user_id)
+            await settle()
+        self.assertEqual(self.engine.done, [0, 1, 2, 3, 4])
+        self.assertEqual(self.engine.max_running, 2)
+        self.assertEqual(self.queue.stats()["completed"], 5)
+
+    async def test_one_digest_per_user(self):
+        await self.queue.submit(1, self.engine.job(1))
+        with self.assertRaises(AlreadyQueued):
+            await self.queue.submit(1, self.engine.job(1))
+
+        # После завершения пользователь может заказать дайджест снова
+        self.engine.finish(1)
+        await settle()
+        self.assertEqual(await self.queue.submit(1, self.engine.job(1)), 0)
+
+    async def test_rejects_when_full(self):
+        for user_id in range(2 + 3):
+            await self.queue.submit(user_id, self.engine.job(user_id))
+            await settle()
+        with self.assertRaises(QueueFull):
+            await self.queue.submit(99, self.engine.job(99))
+        self.assertEqual(self.queue.stats()["rejected"], 1)
+
+    async def test_reports_queue_position(self):
+        positions: list[int] = []
+
+        async def on_position(position: int):
+            positions.append(position)
+
+        for user_id in (1, 2):
+            self.assertEqual(await self.queue.submit(user_id, self.engine.job(user_id)), 0)
+        self.assertEqual(await self.queue.submit(3, self.engine.job(3), on_position), 1)
+        self.assertEqual(self.queue.position(3), 1)
+
+        await settle()
+        self.assertEqual(positions, [1])
+
+        # Задача началась — обновлений места больше нет
+        self.engine.finish(1)
+        await settle()
+        self.assertEqual(positions, [1])
+        self.assertEqual(self.engine.running, {2, 3})
+
+    async def test_job_starts_after_position_is_shown(self):
+        events: list[str] = []
+        shown = asyncio.Event()
+
+        async def on_position(position: int):
+            await shown.wait()
+            events.append(f"место {position}")
+
+        async def run():
+            events.append("старт")
+
+        await self.queue.submit(1, self.engine.job(1))
+        await self.queue.submit(2, self.engine.job(2))
+        await self.queue.submit(3, run, on_position)
+        await settle()
+        self.engine.finish(1)
+        await settle()
+        self.assertEqual(events, [])
+
+        # Правка места ещё идёт — воркер ждёт её и только потом выводит дайджест
+        shown.set()
+        await settle()
+        self.assertEqual(events, ["место 1", "старт"])
+
+    async def test_failed_job_frees_user(self):
+        await self.queue.submit(1, self.engine.job(1, fail=True))
+        with self.assertLogs("jobs", "ERROR"):
+            self.engine.finish(1)
+            await settle()
+
+        self.assertEqual(self.queue.stats()["failed"], 1)
+        await self.queue.submit(1, self.engine.job(1))
+
+
+class SQLiteDigestQueueTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        database.DB_PATH = Path(self.tmp.name) / "bot.db"
+        await init_db()
+        self.queue = SQLiteDigestQueue(processes=1, workers=1, max_pending=3)
+
+    async def asyncTearDown(self):
+        await close_db()
+        self.tmp.cleanup()
+
+    async def test_dedup_and_positions(self):
+        self.assertEqual(await self.queue.submit(1, 1, 10, {}), 0)
+        self.assertEqual(await self.queue.submit(2, 2, 20, {}), 1)
+        with self.assertRaises(AlreadyQueued):
+            await self.queue.submit(1, 1, 11, {})
+
+        # Воркер взял и закончил дайджест — пользователь снова может встать в очередь
+        job = await claim_job("worker")
+        self.assertEqual(job["user_id"], 1)
+        await finish_job(job["id"])
+        self.assertEqual(await self.queue.submit(1, 1, 12, {}), 1)
+
+        self.assertEqual(await self.queue.submit(3, 3, 30, {}), 2)
+        with self.assertRaises(QueueFull):
+            await self.queue.submit(4, 4, 40, {})
+
+    async def test_position_is_shown_before_job_is_visible(self):
+        await self.queue.submit(1, 1, 10, {})
+        claimed: list = []
+
+        async def on_position(position: int):
+            # Воркер не должен увидеть задачу, пока место в очереди не показано
+            claimed.append((position, await claim_job("worker")))
+
+        await self.queue.submit(2, 2, 20, {}, on_position)
+        self.assertEqual(claimed[0][0], 1)
+        self.assertEqual(claimed[0][1]["user_id"], 1)
+        self.assertEqual((await claim_job("worker"))["user_id"], 2)
+
+        # Дубль не показывает место в чужом сообщении
+        with self.assertRaises(AlreadyQueued):
+            await self.queue.submit(2, 2, 21, {}, on_position)
+        self.assertEqual(len(claimed), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+"""Рассылка по расписанию без сети: фейковые часы, фейковая генерация и отправка
+
+Запуск: python -m unittest discover -s tests (из каталога news_bot)
+"""
+
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import database  # noqa: E402
+from database import (  # noqa: E402
+    init_db, close_db, ensure_user, update_enabled_topics, update_delivery_time, get_seen_articles,
+)
+from news_engine import NO_NEWS_TEXT, article_hashes  # noqa: E402
+from push import PushScheduler  # noqa: E402
+from ratelimit import FakeClock, SendRateLimiter  # noqa: E402
+
+MOSCOW = 180
+YEKATERINBURG = 300
+
+
+class FakeEngine:
+    """Вместо get_group_digest: запоминает запросы и отдаёт дайджест по темам со ссылкой на статью"""
+
+    def __init__(self, text: str | None = None):
+        self.text = text
+        self.calls: list[dict] = []
+
+    async def __call__(self, **kwargs) -> tuple[str, list[dict]]:
+        self.calls.append(kwargs)
+        article = {"url": f"https://example.com/{'-'.join(kwargs['enabled_topics'])}"}
+        if self.text is not None:
+            return self.text, []
+        return f"дайджест: <a href=\"{article['url']}\">Источник</a>", [article]
+
+
+class PushSchedulerTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        database.DB_PATH = Path(self.tmp.name) / "bot.db"
+        database._users.clear()
+        await init_db()
+        # 08:00 по Москве — 05:00 UTC
+        self.clock = FakeClock(datetime(2026, 10, 17, 5, 0, tzinfo=timezone.utc))
+        self.sent: list[tuple[int, str]] = []
+
+    async def asyncTearDown(self):
+        await close_db()
+        self.tmp.cleanup()
+
+    async def add_user(self, user_id: int, topics: list[str], delivery_time: str, utc_offset: int = MOSCOW):
+        await ensure_user(user_id)
+        await update_enabled_topics(user_id, topics)
+        await update_delivery_time(user_id, delivery_time, utc_offset)
+
+    async def send(self, chat_id: int, text: str):
+        self.sent.append((chat_id, text))
+
+    def scheduler(self, engine: FakeEngine) -> PushScheduler:
+        return PushScheduler(self.send, clock=self.clock, bucket_minutes=5, generate=engine)
+
+    async def test_one_digest_per_settings_group(self):
+        await self.add_user(1, ["it", "science"], "08:00")
+        await self.add_user(2, ["science", "it"], "08:00")
+        await self.add_user(3, ["sport"], "08:00")
+        await self.add_user(4, ["it", "science"], "09:00")
+        engine = FakeEngine()
+
+        delivered = await self.scheduler(engine).run_bucket(self.clock.now())
+
+        self.assertEqual(delivered, 3)
+        self.assertEqual(len(engine.calls), 2)
+        self.assertEqual(sorted(chat_id for chat_id, _ in self.sent), [1, 2, 3])
+        self.assertEqual(dict(self.sent)[1], dict(self.sent)[2])
+
+    async def test_pushed_articles_are_marked_seen(self):
+        await self.add_user(1, ["it"], "08:00")
+        await self.add_user(2, ["it"], "08:00")
+        engine = FakeEngine()
+        scheduler = self.scheduler(engine)
+
+        async def send(chat_id: int, text: str):
+            if chat_id == 2:
+                raise RuntimeError("бот заблокирован")
+        scheduler.send = send
+
+        await scheduler.run_bucket(self.clock.now())
+
+        hashes = article_hashes({"url": "https://example.com/it"})
+        self.assertEqual(sorted(engine.calls[0]["user_ids"]), [1, 2])
+        self.assertEqual(await get_seen_articles(1, hashes), set(hashes))
+        self.assertEqual(await get_seen_articles(2, hashes), set())
+
+    async def test_bucket_is_not_sent_twice(self):
+        await self.add_user(1, ["it"], "08:00")
+        scheduler = self.scheduler(FakeEngine())
+
+        self.assertEqual(await scheduler.run_bucket(self.clock.now()), 1)
+        self.clock.advance(60)
+        self.assertEqual(await scheduler.run_bucket(self.clock.now()), 0)
+        self.assertEqual(len(self.sent), 1)
+
+    async def test_delivery_time_follows_utc_offset(self):
+        # 08:00 в Екатеринбурге — 03:00 UTC, на два часа раньше московского
+        await self.add_user(1, ["it"], "08:00", YEKATERINBURG)
+        scheduler = self.scheduler(FakeEngine())
+
+        self.assertEqual(await scheduler.run_bucket(self.clock.now()), 0)
+        self.assertEqual(await scheduler.run_bucket(datetime(2026, 10, 17, 3, 0, tzinfo=timezone.utc)), 1)
+
+    async def test_changing_offset_keeps_local_time(self):
+        await self.add_user(1, ["it"], "08:00", YEKATERINBURG)
+        await update_delivery_time(1, "08:00", MOSCOW)
+
+        self.assertEqual(await self.scheduler(FakeEngine()).run_bucket(self.clock.now()), 1)
+
+    async def test_empty_digest_is_not_sent(self):
+        await self.add_user(1, ["it"], "08:00")
+        scheduler = self.scheduler(FakeEngine(NO_NEWS_TEXT))
+
+        self.assertEqual(await scheduler.run_bucket(self.clock.now()), 1)
+        self.assertEqual(self.sent, [])
+
+    async def test_users_without_topics_are_skipped(self):
+        await self.add_user(1, [], "08:00")
+        engine = FakeEngine()
+
+        self.assertEqual(await self.scheduler(engine).run_bucket(self.clock.now()), 0)
+        self.assertEqual(engine.calls, [])
+
+
+class SendRateLimiterTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.clock = FakeClock(datetime(2026, 10, 17, tzinfo=timezone.utc))
+
+    async def test_per_chat_interval(self):
+        limiter = SendRateLimiter(global_rate=100, per_chat_interval=1.0, clock=self.clock)
+        for _ in range(3):
+            await limiter.acquire(1)
+        self.assertAlmostEqual(self.clock.monotonic(), 2.0)
+
+    async def test_global_rate(self):
+        limiter = SendRateLimiter(global_rate=2, per_chat_interval=1.0, clock=self.clock)
+        for chat_id in range(4):
+            await limiter.acquire(chat_id)
+        # Два сообщения уходят сразу, остальные — по одному в полсекунды
+        self.assertAlmostEqual(self.clock.monotonic(), 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+"""Режим вебхука: aiohttp-приложение принимает апдейты, дайджесты собирают процессы-воркеры
+
+Запуск: BOT_TOKEN=... WEBHOOK_URL=https://bot.example.com python webhook.py
+Процесс вебхука отвечает на кнопки и ставит дайджесты в очередь в SQLite (digest_jobs);
+поиск, парсинг и LLM идут в WORKER_PROCESSES процессах worker.py — каждый на своём ядре.
+С WORKER_PROCESSES=0 дайджесты собираются здесь же, как в python bot.py.
+
+Локально без Telegram: python bench/fake_telegram.py (см. описание в нём).
+"""
+
+import logging
+import multiprocessing
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+import bot as telegram_bot
+from bot import BOT_COMMANDS, create_bot, create_dispatcher, start_background, start_metrics, close_resources
+from config import WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT, WORKER_PROCESSES
+from database import init_db
+from fetcher import init_http
+from jobs import SQLiteDigestQueue
+from metrics import metrics
+from worker import run_worker
+
+logger = logging.getLogger(__name__)
+
+
+def create_app(bot: Bot, worker_processes: int = WORKER_PROCESSES) -> web.Application:
+    dp = create_dispatcher()
+
+    async def on_startup(app: web.Application):
+        await init_db()
+        init_http()
+        await bot.set_my_commands(BOT_COMMANDS)
+        if WEBHOOK_URL:
+            await bot.set_webhook(WEBHOOK_URL + WEBHOOK_PATH, secret_token=WEBHOOK_SECRET or None)
+
+        if worker_processes:
+            telegram_bot.worker_queue = SQLiteDigestQueue(processes=worker_processes)
+            metrics.register_gauges("news_queue", telegram_bot.worker_queue.stats)
+            app["stop_background"] = None
+        else:
+            telegram_bot.digest_queue.start()
+            metrics.register_gauges("news_queue", telegram_bot.digest_queue.stats)
+            app["stop_background"] = await start_background(bot)
+        app["metrics_runner"] = await start_metrics()
+        logger.info(f"🚀 Вебхук слушает {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}, воркеров: {worker_processes}")
+
+    async def on_cleanup(app: web.Application):
+        if app["metrics_runner"] is not None:
+            await app["metrics_runner"].cleanup()
+        if app["stop_background"] is not None:
+            await app["stop_background"]()
+        await telegram_bot.digest_queue.stop()
+        await bot.session.close()
+        await close_resources()
+
+    app = web.Application()
+    app.on_startup.append(on_startup)
+    # Апдейт обрабатывается в фоне: Telegram сразу получает 200 и не шлёт его повторно
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=WEBHOOK_SECRET or None).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+def start_workers(count: int) -> list[multiprocessing.Process]:
+    """spawn, а не fork: у воркера свои event loop, соединение с БД и пул парсинга"""
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=run_worker, args=(index,), name=f"digest-worker-{index}")
+        for index in range(count)
+    ]
+    for process in processes:
+        process.start()
+    return processes
+
+
+def stop_workers(processes: list[multiprocessing.Process], timeout: float = 30):
+    """SIGTERM: воркер прерывает задачи и возвращает их в очередь"""
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+    for process in processes:
+        process.join(timeout)
+        if process.is_alive():
+            process.kill()
+
+
+def main():
+    processes = start_workers(WORKER_PROCESSES)
+    try:
+        web.run_app(create_app(create_bot()), host=WEBHOOK_HOST, port=WEBHOOK_PORT, print=None)
+    finally:
+        stop_workers(processes)
+
+
+if __name__ == "__main__":
+    main()
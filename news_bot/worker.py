@@ -0,0 +1,165 @@
+"""Процесс-воркер: забирает дайджесты из общей очереди в SQLite и выводит их в Telegram
+
+Запускается из webhook.py (WORKER_PROCESSES процессов) или отдельно: python worker.py [номер]
+Воркер №0 также ведёт фоновые задачи: прогрев тем, опрос лент и рассылку.
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import sys
+from datetime import datetime, timedelta, timezone
+
+from aiogram import Bot
+from aiogram.types import Chat, Message
+
+from bot import create_bot, deliver_digest, start_background, start_metrics, close_resources
+from config import DIGEST_WORKERS, WORKER_POLL_INTERVAL, WORKER_JOB_TIMEOUT, WORKER_MAX_ATTEMPTS
+from database import (
+    init_db, claim_job, finish_job, release_jobs, recover_stale_jobs, get_last_viewed, to_db_timestamp,
+)
+from fetcher import init_http
+from metrics import metrics
+from news_engine import extractor_pool
+
+logger = logging.getLogger(__name__)
+
+RECOVER_INTERVAL = 60  # секунд между проверками задач упавших воркеров
+
+
+class DigestWorker:
+    """Берёт из очереди до concurrency задач сразу; остановка возвращает незаконченные в очередь"""
+
+    def __init__(
+        self,
+        bot: Bot,
+        name: str,
+        concurrency: int = DIGEST_WORKERS,
+        poll_interval: float = WORKER_POLL_INTERVAL,
+    ):
+        self.bot = bot
+        self.name = name
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._tasks: set[asyncio.Task] = set()
+        self._stopping = asyncio.Event()
+        self._wakeup = asyncio.Event()
+        self.completed = 0
+        self.failed = 0
+        self.recovered_dropped = 0
+
+    def status_message(self, job: dict) -> Message:
+        """Сообщение статуса из задачи: edit_text и answer идут через бота этого процесса"""
+        return Message(
+            message_id=job["message_id"],
+            date=datetime.now(timezone.utc),
+            chat=Chat(id=job["chat_id"], type="private"),
+        ).as_(self.bot)
+
+    async def _run_job(self, job: dict):
+        payload = job["payload"]
+        # Время просмотра — из БД: его обновляют воркеры, а не процесс, поставивший задачу
+        digest_args = dict(payload["digest_args"], last_viewed_at=await get_last_viewed(job["user_id"]))
+        try:
+            await deliver_digest(self.status_message(job), job["user_id"], payload["status_text"], digest_args)
+            self.completed += 1
+        except Exception as e:
+            # Сообщение удалено, чат недоступен и т.п. — повтор не поможет
+            self.failed += 1
+            logger.error(f"Задача {job['id']} (пользователь {job['user_id']}) упала: {e}")
+        await finish_job(job["id"])
+
+    def _on_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        self._wakeup.set()
+
+    async def _recover(self):
+        started_before = to_db_timestamp(datetime.now(timezone.utc) - timedelta(seconds=WORKER_JOB_TIMEOUT))
+        dropped = await recover_stale_jobs(started_before, WORKER_MAX_ATTEMPTS)
+        if dropped:
+            self.recovered_dropped += dropped
+            logger.warning(f"Удалено {dropped} задач, исчерпавших попытки")
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        last_recover = 0.0
+        logger.info(f"Воркер {self.name} запущен: до {self.concurrency} дайджестов одновременно")
+        while not self._stopping.is_set():
+            self._wakeup.clear()
+            try:
+                if loop.time() - last_recover > RECOVER_INTERVAL:
+                    last_recover = loop.time()
+                    await self._recover()
+                if len(self._tasks) < self.concurrency:
+                    job = await claim_job(self.name)
+                    if job is not None:
+                        task = asyncio.create_task(self._run_job(job))
+                        self._tasks.add(task)
+                        task.add_done_callback(self._on_done)
+                        continue
+            except Exception as e:
+                # Например, database is locked дольше busy_timeout — попробуем на следующем круге
+                logger.warning(f"Воркер {self.name}: ошибка очереди: {e}")
+            # Ждём освободившегося места, новой задачи (опрос) или остановки
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except TimeoutError:
+                pass
+
+    def request_stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+
+    async def stop(self):
+        """Прервать задачи и вернуть их в очередь — их доделает другой воркер"""
+        self.request_stop()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await release_jobs(self.name)
+
+    def stats(self) -> dict:
+        return {
+            "running": len(self._tasks),
+            "completed": self.completed,
+            "failed": self.failed,
+            "dropped": self.recovered_dropped,
+        }
+
+
+async def worker_main(index: int):
+    await init_db()
+    init_http()
+
+    bot = create_bot()
+    await extractor_pool.warm_up()
+    worker = DigestWorker(bot, f"{index}:{os.getpid()}")
+    metrics.register_gauges("news_worker", worker.stats)
+    stop_background = await start_background(bot) if index == 0 else None
+    metrics_runner = await start_metrics(index + 1)
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, worker.request_stop)
+
+    try:
+        await worker.run()
+    finally:
+        await worker.stop()
+        if stop_background is not None:
+            await stop_background()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await bot.session.close()
+        await close_resources()
+        logger.info(f"Воркер {worker.name} остановлен")
+
+
+def run_worker(index: int):
+    """Точка входа процесса-воркера (multiprocessing, метод spawn)"""
+    asyncio.run(worker_main(index))
+
+
+if __name__ == "__main__":
+    run_worker(int(sys.argv[1]) if len(sys.argv) > 1 else 0)